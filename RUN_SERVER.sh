@@ -32,4 +32,9 @@ echo ""
 echo "Press CTRL+C to stop the server"
 echo ""
 
+# Queue workers run bulk uploads; stop them together with the server
+python -m backend.workers.worker &
+WORKER_PID=$!
+trap "kill $WORKER_PID 2>/dev/null" EXIT
+
 uvicorn backend.main:app --reload --host 0.0.0.0 --port 8000
@@ -23,8 +23,9 @@ logging.basicConfig(
 logger = logging.getLogger("clearoid")
 
 # Database setup
-from database.connection import Base, engine
+from database.connection import Base, engine, SessionLocal
 from database.models import Title, BulkUploadRun
+from database.migrations import run_migrations
 
 # Create temp directory for uploads
 temp_dir = Path(__file__).parent.parent / "temp" / "uploads"
@@ -35,9 +36,14 @@ from backend.routes.title_routes import router as title_router
 from backend.routes.excel_routes import router as excel_router
 from backend.routes.admin_routes import router as admin_router
 from backend.routes.auth_routes import router as auth_router
+from backend.routes.job_routes import router as job_router
+from backend.services.vector_index import get_vector_index
+from backend.services.embedding_pool import shutdown_embedding_pool
+from backend.services.cluster_service import backfill_clusters
 
 # Ensure all model metadata (including auth User) is registered before table creation.
 Base.metadata.create_all(bind=engine)
+run_migrations(engine)
 
 # FastAPI app
 app = FastAPI(
@@ -55,6 +61,34 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Load the in-memory embedding index once per process
+@app.on_event("startup")
+def load_vector_index():
+    db = SessionLocal()
+    try:
+        get_vector_index().load(db)
+    finally:
+        db.close()
+
+# Build the clusters table once for databases that predate it
+@app.on_event("startup")
+def load_clusters():
+    db = SessionLocal()
+    try:
+        built = backfill_clusters(db)
+        if built:
+            logger.info("Built %d clusters from existing titles", built)
+    finally:
+        db.close()
+
+@app.on_event("shutdown")
+def save_vector_index():
+    get_vector_index().save()
+
+@app.on_event("shutdown")
+def stop_embedding_pool():
+    shutdown_embedding_pool()
+
 # Global error handler
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
@@ -78,6 +112,7 @@ app.include_router(title_router)
 app.include_router(excel_router)
 app.include_router(admin_router, prefix="/admin", tags=["Admin"])
 app.include_router(auth_router)
+app.include_router(job_router)
 
 # Root redirect
 @app.get("/")
@@ -0,0 +1,139 @@
+"""
+Maintenance commands.
+
+Usage:
+    python -m backend.manage normalize-embeddings [--batch-size N]
+    python -m backend.manage rebuild-clusters
+    python -m backend.manage recluster [--threshold T]
+    python -m backend.manage reconcile-counters
+"""
+import argparse
+import logging
+import sys
+from pathlib import Path
+
+import numpy as np
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from database.connection import Base, engine, SessionLocal
+from database.models import Title
+from database.migrations import run_migrations
+from backend.services.embedding_service import l2_normalize
+from backend.services.cluster_service import rebuild_clusters
+from backend.services.counter_service import reconcile_counters
+from backend.services.recluster_service import recluster_titles
+from backend.services.title_service import SIMILARITY_THRESHOLD
+
+logger = logging.getLogger("clearoid.manage")
+
+
+def normalize_embeddings(db: Session, batch_size: int = 1000) -> int:
+    """
+    One-time migration for NORMALIZE_EMBEDDINGS=true: rewrites every stored
+    embedding as a unit-length float32 vector. Safe to re-run; rows that
+    are already unit length are skipped. Returns the number of rows updated.
+    """
+    updated = 0
+    last_id = 0
+
+    while True:
+        rows = (
+            db.query(Title.id, Title.embedding)
+            .filter(Title.id > last_id)
+            .order_by(Title.id.asc())
+            .limit(batch_size)
+            .all()
+        )
+        if not rows:
+            break
+
+        changes = []
+        for title_id, blob in rows:
+            if not blob:
+                continue
+            vec = np.frombuffer(blob, dtype=np.float32)
+            if abs(float(np.linalg.norm(vec)) - 1.0) <= 1e-6:
+                continue
+            changes.append({"id": title_id, "embedding": l2_normalize(vec).tobytes()})
+
+        if changes:
+            db.execute(update(Title), changes)
+            db.commit()
+            updated += len(changes)
+
+        last_id = rows[-1][0]
+        logger.info("normalize-embeddings: up to id %d, %d rows updated", last_id, updated)
+
+    return updated
+
+
+def main(argv=None) -> int:
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s | %(levelname)s | %(name)s | %(message)s",
+    )
+
+    parser = argparse.ArgumentParser(prog="python -m backend.manage")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    normalize = commands.add_parser(
+        "normalize-embeddings",
+        help="Rewrite stored embeddings as unit vectors",
+    )
+    normalize.add_argument("--batch-size", type=int, default=1000)
+
+    commands.add_parser(
+        "rebuild-clusters",
+        help="Recompute the clusters table and primary flags from titles",
+    )
+
+    recluster = commands.add_parser(
+        "recluster",
+        help="Re-cluster every title from its embedding (similarity graph)",
+    )
+    recluster.add_argument("--threshold", type=float, default=SIMILARITY_THRESHOLD)
+
+    reconcile = commands.add_parser(
+        "reconcile-counters",
+        help="Recompute the stats counters from the tables",
+    )
+    reconcile.add_argument(
+        "--rebuild-clusters",
+        action="store_true",
+        help="Rebuild the clusters table first (it feeds the cluster counters)",
+    )
+
+    args = parser.parse_args(argv)
+
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+    db = SessionLocal()
+    try:
+        if args.command == "normalize-embeddings":
+            count = normalize_embeddings(db, batch_size=args.batch_size)
+            print(f"Normalized {count} embeddings")
+        elif args.command == "rebuild-clusters":
+            count = rebuild_clusters(db)
+            print(f"Rebuilt {count} clusters")
+        elif args.command == "recluster":
+            def report(phase, done=None, total=None):
+                logger.info("recluster: %s %s/%s", phase, done, total)
+
+            print(recluster_titles(db, args.threshold, progress=report))
+        elif args.command == "reconcile-counters":
+            if args.rebuild_clusters:
+                rebuild_clusters(db)
+            for name, value in reconcile_counters(db).items():
+                print(f"{name}: {value}")
+    finally:
+        db.close()
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
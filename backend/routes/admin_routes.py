@@ -1,58 +1,48 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from sqlalchemy import func
 
 from database.connection import get_db
-from database.models import Title, BulkUploadRun
+from database.models import Title, Job, Cluster
+from backend.services.embedding_cache import get_embedding_cache
+from backend.services.title_service import SIMILARITY_THRESHOLD
+from backend.services import counter_service as counters
+from backend.workers.queue import enqueue, job_to_dict
 
 router = APIRouter()
 
 
 @router.get("/stats")
 def stats(db: Session = Depends(get_db)):
-    total = db.query(func.count(Title.id)).scalar()
+    values = counters.read_counters(db)
 
-    dup_count = (
-        db.query(func.count(Title.id))
-        .filter(Title.is_duplicate == 1)
-        .scalar()
-    )
-
-    unique = total - dup_count
-
-    avg_len = db.query(func.avg(func.length(Title.title))).scalar() or 0
+    # One primary (unique) title per cluster; the rest are duplicates.
+    total = values[counters.TITLES]
+    unique = values[counters.CLUSTERS]
+    avg_len = values[counters.TITLE_LENGTH] / total if total else 0
 
+    # Both served by indexes: clusters by member_count, titles by created_at.
     top_norm = (
-        db.query(
-            Title.normalized_title,
-            func.count(Title.id).label("cnt")
-        )
-        .group_by(Title.normalized_title)
-        .order_by(func.count(Title.id).desc())
+        db.query(Cluster.canonical_key, Cluster.member_count)
+        .order_by(Cluster.member_count.desc())
         .limit(10)
         .all()
     )
 
     recent = (
         db.query(Title)
-        .order_by(Title.created_at.desc())
+        .order_by(Title.created_at.desc(), Title.id.desc())
         .limit(10)
         .all()
     )
 
-    total_uploads = db.query(func.count(BulkUploadRun.id)).scalar() or 0
-    total_processed = db.query(func.coalesce(func.sum(BulkUploadRun.processed), 0)).scalar() or 0
-    total_saved = db.query(func.coalesce(func.sum(BulkUploadRun.saved), 0)).scalar() or 0
-    total_upload_duplicates = db.query(func.coalesce(func.sum(BulkUploadRun.duplicates), 0)).scalar() or 0
-
     return {
         "total": total,
-        "duplicates": dup_count,
+        "duplicates": total - unique,
         "unique": unique,
-        "total_uploads": total_uploads,
-        "total_processed": int(total_processed),
-        "total_saved": int(total_saved),
-        "total_upload_duplicates": int(total_upload_duplicates),
+        "total_uploads": values[counters.UPLOADS],
+        "total_processed": values[counters.UPLOADS_PROCESSED],
+        "total_saved": values[counters.UPLOADS_SAVED],
+        "total_upload_duplicates": values[counters.UPLOADS_DUPLICATES],
         "avg_title_length": float(avg_len),
         "top_normalized": [
             {"normalized": n, "count": c}
@@ -66,4 +56,28 @@ def stats(db: Session = Depends(get_db)):
             }
             for r in recent
         ],
+        "embedding_cache": get_embedding_cache().stats(),
     }
+
+
+@router.post("/recluster")
+def recluster(
+    threshold: float = Query(SIMILARITY_THRESHOLD, gt=0.0, le=1.0),
+    db: Session = Depends(get_db),
+):
+    """
+    Queues a full re-clustering of the titles table at the given cosine
+    threshold. Progress is on GET /jobs/{id} (phase, progress_done,
+    progress_total).
+    """
+    running = (
+        db.query(Job)
+        .filter(Job.kind == "recluster", Job.status.in_(("queued", "running")))
+        .first()
+    )
+    if running is not None:
+        raise HTTPException(status_code=409, detail=f"Re-clustering already queued as job {running.id}")
+
+    job = enqueue(db, "recluster", {"threshold": threshold}, max_attempts=1)
+    db.commit()
+    return job_to_dict(job)
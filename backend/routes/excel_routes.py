@@ -1,116 +1,65 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, BackgroundTasks, Query
-import pandas as pd
-import numpy as np
+from fastapi import APIRouter, UploadFile, File, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+import asyncio
 import hashlib
+import json
+import os
 import uuid
+from datetime import datetime
 from pathlib import Path
+from typing import Optional
 
 from database.connection import SessionLocal
-from database.models import Title, BulkUploadRun
-from backend.services.excel_deduper import dedupe_excel
-from backend.services.embedding_service import get_embedding
+from database.models import BulkUploadRun
+from backend.workers.queue import enqueue
+from backend.services.counter_service import bump, UPLOADS
 
 router = APIRouter(prefix="/excel", tags=["Excel"])
 
 TEMP_DIR = Path(__file__).parent.parent.parent / "temp" / "uploads"
 TEMP_DIR.mkdir(parents=True, exist_ok=True)
 
+# Bytes copied from the request body to disk per read.
+UPLOAD_CHUNK_SIZE = 1024 * 1024
 
-def hash_file(path: str) -> str:
-    h = hashlib.sha256()
-    with open(path, "rb") as f:
-        for chunk in iter(lambda: f.read(8192), b""):
-            h.update(chunk)
-    return h.hexdigest()
+# Seconds between progress checks on the job event stream, and between
+# keep-alive comments when nothing changed.
+JOB_EVENTS_INTERVAL = float(os.getenv("JOB_EVENTS_INTERVAL", "0.5"))
+JOB_EVENTS_KEEPALIVE = 15.0
 
+FINISHED_STATUSES = ("completed", "failed")
 
-def process_file_bulk_bg(file_path: str, filename: str, skip_hash_check: bool = False):
-    db = SessionLocal()
-    try:
-        file_hash = hash_file(file_path)
 
-        existing_run = (
-            db.query(BulkUploadRun)
-            .filter(BulkUploadRun.file_hash == file_hash)
-            .first()
-        )
+def _job_payload(run: BulkUploadRun) -> dict:
+    end = run.finished_at or run.updated_at
+    elapsed = (end - run.started_at).total_seconds() if run.started_at and end else 0.0
 
-        if existing_run and not skip_hash_check:
-            print("Duplicate file upload skipped:", filename)
-            return
-
-        file_ext = Path(file_path).suffix.lower()
-        if file_ext == ".csv":
-            df = pd.read_csv(file_path)
-        else:
-            df = pd.read_excel(file_path)
-        
-        # Get first column and remove NaN/empty values
-        first_col = df.columns[0]
-        df = df[[first_col]].dropna()
-        df = df[df[first_col].astype(str).str.strip() != '']
-        df = df[df[first_col].astype(str).str.lower() != 'nan']
-
-        unique_df, clusters = dedupe_excel(
-            df,
-            column=None,
-            ignore_numbers=True
-        )
-
-        existing_norms = {
-            r[0] for r in db.query(Title.normalized_title).all()
-        }
-
-        saved = 0
-
-        for _, row in unique_df.iterrows():
-            normalized = row["normalized"]
-            
-            # Skip empty or nan normalized values
-            if not normalized or normalized == 'nan' or pd.isna(normalized):
-                continue
-
-            if normalized in existing_norms:
-                continue
-
-            vec = get_embedding(normalized)
-            vec_bytes = np.array(vec, dtype=np.float32).tobytes()
-
-            db.add(
-                Title(
-                    title=row[first_col],
-                    normalized_title=normalized,
-                    embedding=vec_bytes,
-                    is_duplicate=0
-                )
-            )
-
-            existing_norms.add(normalized)
-            saved += 1
-
-        run_hash = file_hash
-        if skip_hash_check:
-            run_hash = f"{file_hash}:{uuid.uuid4().hex[:8]}"
-
-        run = BulkUploadRun(
-            filename=filename,
-            file_hash=run_hash,
-            processed=len(df),
-            saved=saved,
-            duplicates=len(df) - saved,
-        )
-
-        db.add(run)
-        db.commit()
+    return {
+        "job_id": run.id,
+        "filename": run.filename,
+        "status": run.status,
+        "phase": run.phase,
+        "rows_total": run.rows_total,
+        "rows_done": run.rows_done,
+        "checkpoint_offset": run.checkpoint_offset,
+        "processed": run.processed,
+        "saved": run.saved,
+        "duplicates": run.duplicates,
+        "error": run.error,
+        "created_at": run.created_at.isoformat() if run.created_at else None,
+        "started_at": run.started_at.isoformat() if run.started_at else None,
+        "finished_at": run.finished_at.isoformat() if run.finished_at else None,
+        "elapsed_seconds": round(elapsed, 3),
+        "rows_per_second": round(run.rows_done / elapsed, 1) if elapsed else None,
+    }
 
-        print({
-            "file": filename,
-            "processed": len(df),
-            "saved": saved,
-            "duplicates": len(df) - saved,
-            "clusters": {k: v for k, v in clusters.items() if len(v) > 1}
-        })
 
+def _load_job_payload(job_id: int) -> Optional[dict]:
+    db = SessionLocal()
+    try:
+        run = db.get(BulkUploadRun, job_id)
+        return _job_payload(run) if run else None
     finally:
         db.close()
 
@@ -119,7 +68,6 @@ def process_file_bulk_bg(file_path: str, filename: str, skip_hash_check: bool =
 async def bulk_upload(
     file: UploadFile = File(...),
     force_reprocess: bool = Query(False),
-    background_tasks: BackgroundTasks = BackgroundTasks(),
 ):
     if not file.filename.lower().endswith((".xlsx", ".xls", ".csv")):
         raise HTTPException(
@@ -127,13 +75,22 @@ async def bulk_upload(
             detail="Only spreadsheet files (.xlsx, .xls, .csv) are allowed"
         )
 
-    temp_path = TEMP_DIR / file.filename
+    # Copy to disk in fixed-size chunks, hashing as we go, so memory use
+    # does not grow with the upload.
+    partial_path = TEMP_DIR / f"{uuid.uuid4().hex}.part"
+    h = hashlib.sha256()
+    with open(partial_path, "wb") as f:
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            h.update(chunk)
+            f.write(chunk)
 
-    file_bytes = await file.read()
-    with open(temp_path, "wb") as f:
-        f.write(file_bytes)
+    file_hash = h.hexdigest()
+
+    # One file per upload, never shared between runs: the run that
+    # ingests it deletes it, and no other run or request touches it.
+    temp_path = partial_path.with_suffix(Path(file.filename).suffix.lower())
+    os.replace(partial_path, temp_path)
 
-    file_hash = hashlib.sha256(file_bytes).hexdigest()
     db = SessionLocal()
     try:
         existing_run = (
@@ -141,29 +98,112 @@ async def bulk_upload(
             .filter(BulkUploadRun.file_hash == file_hash)
             .first()
         )
+
+        if existing_run and not force_reprocess and existing_run.status != "failed":
+            # Nothing to queue; this request's copy is not needed.
+            temp_path.unlink(missing_ok=True)
+
+            if existing_run.status == "completed":
+                return {
+                    "status": "already_processed",
+                    "job_id": existing_run.id,
+                    "filename": file.filename,
+                    "processed": existing_run.processed,
+                    "saved": existing_run.saved,
+                    "duplicates": existing_run.duplicates,
+                    "created_at": existing_run.created_at.isoformat() if existing_run.created_at else None,
+                    "message": "This file was already processed. Use force_reprocess=true to process it again."
+                }
+
+            return {
+                "status": "processing",
+                "job_id": existing_run.id,
+                "filename": file.filename,
+                "message": "This file is already being processed."
+            }
+
+        if existing_run and not force_reprocess:
+            # A failed run is retried in place.
+            run = existing_run
+            run.status = "queued"
+            run.filename = file.filename
+        else:
+            run_hash = file_hash
+            if force_reprocess:
+                run_hash = f"{file_hash}:{uuid.uuid4().hex[:8]}"
+            run = BulkUploadRun(filename=file.filename, file_hash=run_hash, status="queued")
+            db.add(run)
+            bump(db, **{UPLOADS: 1})
+
+        run.phase = "queued"
+        run.updated_at = datetime.utcnow()
+        db.flush()
+
+        # Run and queue entry commit together; a worker picks it up.
+        queued = enqueue(db, "bulk_upload", {
+            "run_id": run.id,
+            "file_path": str(temp_path),
+            "file_hash": file_hash,
+        })
+        db.commit()
+        job_id, queue_job_id = run.id, queued.id
     finally:
         db.close()
 
-    if existing_run and not force_reprocess:
-        return {
-            "status": "already_processed",
-            "filename": file.filename,
-            "processed": existing_run.processed,
-            "saved": existing_run.saved,
-            "duplicates": existing_run.duplicates,
-            "created_at": existing_run.created_at.isoformat() if existing_run.created_at else None,
-            "message": "This file was already processed. Use force_reprocess=true to process it again."
-        }
-
-    background_tasks.add_task(
-        process_file_bulk_bg,
-        str(temp_path),
-        file.filename,
-        force_reprocess
-    )
-
     return {
         "status": "processing",
+        "job_id": job_id,
+        "queue_job_id": queue_job_id,
         "filename": file.filename,
+        "events": f"/excel/jobs/{job_id}/events",
         "message": "File accepted and queued for background processing."
     }
+
+
+@router.get("/jobs/{job_id}")
+def get_job(job_id: int):
+    payload = _load_job_payload(job_id)
+    if payload is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return payload
+
+
+@router.get("/jobs/{job_id}/events")
+async def job_events(job_id: int, request: Request):
+    """
+    Server-sent events for one bulk upload job: a "progress" event each
+    time the job's row changes, then the stream closes once the job has
+    finished.
+    """
+    if await run_in_threadpool(_load_job_payload, job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def stream():
+        last = None
+        quiet = 0.0
+
+        while not await request.is_disconnected():
+            payload = await run_in_threadpool(_load_job_payload, job_id)
+            if payload is None:
+                yield "event: error\ndata: {\"detail\": \"Job not found\"}\n\n"
+                return
+
+            if payload != last:
+                yield f"event: progress\ndata: {json.dumps(payload)}\n\n"
+                last = payload
+                quiet = 0.0
+            elif quiet >= JOB_EVENTS_KEEPALIVE:
+                yield ": keep-alive\n\n"
+                quiet = 0.0
+
+            if payload["status"] in FINISHED_STATUSES:
+                return
+
+            await asyncio.sleep(JOB_EVENTS_INTERVAL)
+            quiet += JOB_EVENTS_INTERVAL
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,38 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+
+from database.connection import get_db
+from database.models import Job
+from backend.workers.queue import job_to_dict
+
+router = APIRouter(prefix="/jobs", tags=["Jobs"])
+
+
+@router.get("")
+def list_jobs(
+    status: Optional[str] = Query(None),
+    kind: Optional[str] = Query(None),
+    limit: int = Query(50, ge=1, le=500),
+    db: Session = Depends(get_db),
+):
+    """
+    Most recent queue jobs first, optionally filtered by status / kind.
+    """
+    query = db.query(Job)
+    if status:
+        query = query.filter(Job.status == status)
+    if kind:
+        query = query.filter(Job.kind == kind)
+
+    jobs = query.order_by(Job.id.desc()).limit(limit).all()
+    return {"data": [job_to_dict(job) for job in jobs]}
+
+
+@router.get("/{job_id}")
+def get_job(job_id: int, db: Session = Depends(get_db)):
+    job = db.get(Job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_to_dict(job)
@@ -1,45 +1,43 @@
+import base64
 import io
+import json
 from datetime import datetime
 
 import numpy as np
 import pandas as pd
 from fastapi import APIRouter, Depends, HTTPException, Query
 from fastapi.responses import StreamingResponse
-from sklearn.metrics.pairwise import cosine_similarity
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import and_, func, or_
 
-from database.connection import get_db
-from backend.schemas.title_schema import TitleCreate, TitleOut, TitleUpdate
+from database.connection import get_db, SessionLocal
+from backend.schemas.title_schema import TitleBatch, TitleCreate, TitleOut, TitleUpdate
 from backend.utils.text_cleaner import clean_text
 from backend.services.embedding_service import get_embedding
 from backend.services.title_service import (
     save_title,
     check_duplicate,
+    check_duplicates_batch,
     find_similar_titles,
     count_duplicates,
+    _find_best_match,
+    SIMILAR_THRESHOLD,
+    SIMILAR_TITLES_K,
+    SIMILAR_TITLES_MAX_K,
 )
+from backend.services.vector_index import get_vector_index
+from backend.services.search_service import search_titles
+from backend.services.cluster_service import clear_clusters, move_member, remove_members
+from backend.services.counter_service import read_counters, titles_changed, TITLES, CLUSTERS, MULTI_CLUSTERS
 from database.models import Title
 
 router = APIRouter(prefix="/api", tags=["Titles"])
 SIMILARITY_THRESHOLD = 0.85
+MAX_BATCH_TITLES = 1000
 
 
 def _best_match_excluding(db: Session, vec: np.ndarray, exclude_id: int):
-    best_score = 0.0
-    best_row = None
-    for row in db.query(Title).filter(Title.id != exclude_id).all():
-        if not row.embedding:
-            continue
-        try:
-            stored = np.frombuffer(row.embedding, dtype=np.float32)
-            score = float(cosine_similarity([vec], [stored])[0][0])
-        except Exception:
-            continue
-        if score > best_score:
-            best_score = score
-            best_row = row
-    return best_row, best_score
+    return _find_best_match(db, vec, exclude_id=exclude_id)
 
 
 @router.post("/submit", response_model=TitleOut)
@@ -52,9 +50,29 @@ def check_duplicate_route(item: TitleCreate, db: Session = Depends(get_db)):
     return check_duplicate(db, item)
 
 
+@router.post("/check-duplicate/batch")
+def check_duplicate_batch_route(payload: TitleBatch, db: Session = Depends(get_db)):
+    if not payload.titles:
+        raise HTTPException(status_code=400, detail="titles cannot be empty")
+
+    if len(payload.titles) > MAX_BATCH_TITLES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {MAX_BATCH_TITLES} titles per request"
+        )
+
+    items = [TitleCreate(title=t) for t in payload.titles]
+    return {"results": check_duplicates_batch(db, items)}
+
+
 @router.post("/similar-titles")
-def similar_titles(item: TitleCreate, db: Session = Depends(get_db)):
-    return {"results": find_similar_titles(db, item)}
+def similar_titles(
+    item: TitleCreate,
+    k: int = Query(SIMILAR_TITLES_K, ge=1, le=SIMILAR_TITLES_MAX_K),
+    threshold: float = Query(SIMILAR_THRESHOLD, ge=0.0, le=1.0),
+    db: Session = Depends(get_db),
+):
+    return {"results": find_similar_titles(db, item, threshold=threshold, k=k)}
 
 
 @router.get("/duplicate-count")
@@ -80,52 +98,122 @@ def clusters(db: Session = Depends(get_db)):
     ]
 
 
-@router.get("/history")
-def history(db: Session = Depends(get_db)):
-    rows = (
-        db.query(Title)
-        .order_by(Title.created_at.desc())
-        .all()
+HISTORY_PAGE_SIZE = 100
+HISTORY_MAX_PAGE_SIZE = 1000
+HISTORY_STREAM_BATCH = 1000
+
+
+def _encode_cursor(created_at: datetime, title_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{title_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def _decode_cursor(cursor: str):
+    try:
+        created_at, title_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), int(title_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _history_query(db: Session, cursor: str | None = None):
+    # Only the listed columns: the embedding BLOB is never loaded.
+    query = (
+        db.query(Title.id, Title.title, Title.normalized_title, Title.is_duplicate, Title.created_at)
+        .order_by(Title.created_at.desc(), Title.id.desc())
     )
+    if cursor:
+        created_at, title_id = _decode_cursor(cursor)
+        query = query.filter(or_(
+            Title.created_at < created_at,
+            and_(Title.created_at == created_at, Title.id < title_id),
+        ))
+    return query
 
-    data = []
-    for r in rows:
-        data.append({
-            "id": r.id,
-            "title": r.title,
-            "normalized": r.normalized_title,
-            "status": "duplicate" if r.is_duplicate else "unique",
-            "cluster": r.normalized_title,
-            "created_at": r.created_at.isoformat()
-        })
 
+def _history_row(r) -> dict:
     return {
-        "total": len(data),
-        "unique": sum(1 for d in data if d["status"] == "unique"),
-        "duplicates": sum(1 for d in data if d["status"] == "duplicate"),
-        "clusters": len(set(d["cluster"] for d in data)),
-        "data": data
+        "id": r.id,
+        "title": r.title,
+        "normalized": r.normalized_title,
+        "status": "duplicate" if r.is_duplicate else "unique",
+        "cluster": r.normalized_title,
+        "created_at": r.created_at.isoformat()
     }
 
 
+@router.get("/history")
+def history(
+    limit: int = Query(HISTORY_PAGE_SIZE, ge=1, le=HISTORY_MAX_PAGE_SIZE),
+    cursor: str | None = Query(None),
+    db: Session = Depends(get_db),
+):
+    """
+    Newest titles first, one page at a time. Pass next_cursor back as
+    cursor for the following page; it is null on the last page. Pages
+    are keyed on (created_at, id), so each one is an index range scan
+    however deep it is. Summary counts come from the stats counters.
+    """
+    rows = _history_query(db, cursor).limit(limit + 1).all()
+    page = rows[:limit]
+
+    next_cursor = None
+    if len(rows) > limit:
+        last = page[-1]
+        next_cursor = _encode_cursor(last.created_at, last.id)
+
+    counters = read_counters(db)
+    total = counters[TITLES]
+    unique = counters[CLUSTERS]
+
+    return {
+        "total": total,
+        "unique": unique,
+        "duplicates": total - unique,
+        "clusters": unique,
+        "data": [_history_row(r) for r in page],
+        "limit": limit,
+        "next_cursor": next_cursor,
+    }
+
+
+@router.get("/history/stream")
+def history_stream():
+    """
+    Every title as newline-delimited JSON, newest first, for exports and
+    scripts. Rows are fetched yield_per in batches, so memory stays flat.
+    """
+    def rows():
+        # Own session: the response outlives request-scoped dependencies.
+        db = SessionLocal()
+        try:
+            lines = []
+            for r in _history_query(db).yield_per(HISTORY_STREAM_BATCH):
+                lines.append(json.dumps(_history_row(r)))
+                if len(lines) >= HISTORY_STREAM_BATCH:
+                    yield "\n".join(lines) + "\n"
+                    lines = []
+            if lines:
+                yield "\n".join(lines) + "\n"
+        finally:
+            db.close()
+
+    return StreamingResponse(rows(), media_type="application/x-ndjson")
+
+
 @router.get("/stats")
 def get_stats(db: Session = Depends(get_db)):
-    total = db.query(Title).count()
-    duplicates = db.query(Title).filter(Title.is_duplicate == 1).count()
-    unique = total - duplicates
-    
-    clusters = (
-        db.query(Title.normalized_title)
-        .group_by(Title.normalized_title)
-        .having(func.count(Title.id) > 1)
-        .count()
-    )
-    
+    counters = read_counters(db)
+
+    # One primary (unique) title per cluster; the rest are duplicates.
+    total = counters[TITLES]
+    unique = counters[CLUSTERS]
+
     return {
         "total": total,
         "unique": unique,
-        "duplicates": duplicates,
-        "clusters": clusters
+        "duplicates": total - unique,
+        "clusters": counters[MULTI_CLUSTERS]
     }
 
 
@@ -137,19 +225,18 @@ def get_titles(
     duplicates: bool | None = None,
     db: Session = Depends(get_db),
 ):
-    query = db.query(Title)
+    offset = (page - 1) * limit
 
     if search:
-        query = query.filter(
-            (Title.title.ilike(f"%{search}%")) |
-            (Title.normalized_title.ilike(f"%{search}%"))
-        )
-
-    if duplicates is not None:
-        query = query.filter(Title.is_duplicate == (1 if duplicates else 0))
+        # Indexed and ranked best match first (see search_service).
+        total, rows = search_titles(db, search, duplicates, offset, limit)
+    else:
+        query = db.query(Title)
+        if duplicates is not None:
+            query = query.filter(Title.is_duplicate == (1 if duplicates else 0))
 
-    total = query.count()
-    rows = query.offset((page - 1) * limit).limit(limit).all()
+        total = query.count()
+        rows = query.offset(offset).limit(limit).all()
 
     return {
         "total": total,
@@ -172,8 +259,15 @@ def delete_title(title_id: int, db: Session = Depends(get_db)):
     if not row:
         raise HTTPException(status_code=404, detail="Title not found")
 
+    key = row.normalized_title
+    length = len(row.title)
     db.delete(row)
+    db.flush()
+    remove_members(db, [(title_id, key)])
+    titles_changed(db, -1, -length)
     db.commit()
+
+    get_vector_index().remove(title_id)
     return {"deleted": 1, "id": title_id}
 
 
@@ -194,18 +288,22 @@ def update_title(title_id: int, payload: TitleUpdate, db: Session = Depends(get_
     vec = np.array(get_embedding(cleaned), dtype=np.float32)
     best_row, best_score = _best_match_excluding(db, vec, title_id)
 
+    old_key = row.normalized_title
+    titles_changed(db, 0, len(raw) - len(row.title))
     if best_row and best_score >= SIMILARITY_THRESHOLD:
         row.normalized_title = best_row.normalized_title
-        row.is_duplicate = 1
     else:
         row.normalized_title = cleaned
-        row.is_duplicate = 0
 
     row.title = raw
     row.embedding = vec.tobytes()
 
+    # Sets is_duplicate from the (possibly new) cluster's primary.
+    move_member(db, row, old_key)
     db.commit()
     db.refresh(row)
+
+    get_vector_index().add(row.id, vec)
     return {
         "id": row.id,
         "title": row.title,
@@ -239,8 +337,18 @@ def delete_titles(
         elif scope != "all":
             raise HTTPException(status_code=400, detail="Invalid scope")
 
+    deleted_rows = query.with_entities(Title.id, Title.normalized_title, func.length(Title.title)).all()
+    deleted_ids = [r[0] for r in deleted_rows]
     deleted = query.delete(synchronize_session=False)
+
+    if not ids and scope == "all":
+        clear_clusters(db)
+    else:
+        remove_members(db, [(r[0], r[1]) for r in deleted_rows])
+    titles_changed(db, -len(deleted_rows), -sum(r[2] or 0 for r in deleted_rows))
     db.commit()
+
+    get_vector_index().remove_many(deleted_ids)
     return {"deleted": int(deleted)}
 
 
@@ -1,6 +1,6 @@
 # schemas/title_schema.py
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 
 class TitleCreate(BaseModel):
@@ -10,6 +10,9 @@ class TitleCreate(BaseModel):
         "from_attributes": True
     }
 
+class TitleBatch(BaseModel):
+    titles: List[str]
+
 class TitleUpdate(BaseModel):
     title: Optional[str] = None
     normalized_title: Optional[str] = None
@@ -0,0 +1,546 @@
+# services/ann_index.py
+
+import logging
+import os
+from pathlib import Path
+from threading import Lock, Thread
+from typing import Iterable, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from database.connection import DATA_DIR, DB_STEM
+from database.models import Title
+from backend.services.vector_index import VectorIndex, best_matches_by_row, rows_after, top_k, _unit
+
+logger = logging.getLogger(__name__)
+
+# ==========================================================
+# Configuration
+# ==========================================================
+
+# IVF: number of inverted lists (0 = ~4*sqrt(N)) and lists probed per query.
+IVF_NLIST = int(os.getenv("IVF_NLIST", "0"))
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", "8"))
+IVF_MIN_TRAIN_SIZE = int(os.getenv("IVF_MIN_TRAIN_SIZE", "10000"))
+
+# HNSW: graph degree, build-time and query-time beam width.
+HNSW_M = int(os.getenv("HNSW_M", "16"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "200"))
+HNSW_EF = int(os.getenv("HNSW_EF", "64"))
+
+
+def default_index_path(backend: str) -> Path:
+    """
+    Index files live next to the SQLite database unless VECTOR_INDEX_PATH is set.
+    """
+    override = os.getenv("VECTOR_INDEX_PATH")
+    if override:
+        return Path(override)
+
+    return DATA_DIR / f"{DB_STEM}.{backend}.idx"
+
+
+def _corpus_fingerprint(db: Session) -> Tuple[int, int]:
+    count, max_id = db.query(func.count(Title.id), func.max(Title.id)).one()
+    return int(count or 0), int(max_id or 0)
+
+
+class _PersistentIndex:
+    """
+    Shared load/save plumbing for on-disk ANN indexes.
+
+    The file on disk is only trusted while it matches the titles table;
+    the first mutation after a save removes it, so a crash never leaves a
+    stale index behind. Callers save() on shutdown.
+    """
+
+    backend = None
+    needs_rescore = False
+
+    def __init__(self, path: Optional[Path] = None):
+        self._lock = Lock()
+        self.path = Path(path) if path else default_index_path(self.backend)
+        self.loaded = False
+        self._on_disk = False
+        self._synced_id = 0
+
+    def load(self, db: Session):
+        fingerprint = _corpus_fingerprint(db)
+
+        with self._lock:
+            if self.path.exists():
+                try:
+                    if self._restore(fingerprint):
+                        self._on_disk = True
+                        self._synced_id = fingerprint[1]
+                        self.loaded = True
+                        logger.info("Loaded %s index from %s", self.backend, self.path)
+                        return
+                except Exception:
+                    logger.exception("Could not read %s, rebuilding", self.path)
+
+            rows = db.query(Title.id, Title.embedding).yield_per(10_000)
+            self._build(
+                (title_id, np.frombuffer(blob, dtype=np.float32))
+                for title_id, blob in rows
+                if blob
+            )
+            self._fingerprint = fingerprint
+            self._synced_id = fingerprint[1]
+            self.loaded = True
+
+        logger.info("Built %s index with %d embeddings", self.backend, len(self))
+        self.save()
+
+    def ensure_loaded(self, db: Session):
+        if not self.loaded:
+            self.load(db)
+        else:
+            self.sync(db)
+
+    def sync(self, db: Session):
+        # Titles inserted by other processes (see VectorIndex.sync).
+        items = rows_after(db, self._synced_id)
+        if items:
+            self.add_many(items)
+
+    def save(self):
+        with self._lock:
+            if not self.loaded or self._on_disk or len(self) == 0:
+                return
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_name(self.path.name + ".tmp")
+            self._dump(tmp)
+            os.replace(tmp, self.path)
+            self._on_disk = True
+
+    def _touch(self):
+        if self._on_disk:
+            self.path.unlink(missing_ok=True)
+            self._on_disk = False
+
+    # --------------------------
+    # Mutations
+    # --------------------------
+    def add(self, title_id: int, vec):
+        self.add_many([(title_id, vec)])
+
+    def add_many(self, items: Iterable[Tuple[int, object]]):
+        with self._lock:
+            self._touch()
+            for title_id, vec in items:
+                count, max_id = self._fingerprint
+                if title_id not in self:
+                    count += 1
+                self._fingerprint = (count, max(max_id, title_id))
+                self._synced_id = max(self._synced_id, title_id)
+                self._add(title_id, _unit(vec))
+        self._after_add()
+
+    def _after_add(self):
+        # Hook for work that must not run under the lock.
+        pass
+
+    def remove(self, title_id: int):
+        self.remove_many([title_id])
+
+    def remove_many(self, title_ids: Iterable[int]):
+        with self._lock:
+            self._touch()
+            for title_id in title_ids:
+                if title_id in self:
+                    count, max_id = self._fingerprint
+                    self._fingerprint = (count - 1, max_id)
+                self._remove(title_id)
+
+    # --------------------------
+    # Queries
+    # --------------------------
+    def best_match(self, vec, exclude_id: Optional[int] = None) -> Tuple[Optional[int], float]:
+        ids, scores = self.search(vec, k=2)
+
+        for title_id, score in zip(ids.tolist(), scores.tolist()):
+            if title_id == exclude_id:
+                continue
+            if score <= 0.0:
+                break
+            return title_id, score
+
+        return None, 0.0
+
+    def best_matches(self, vectors):
+        return best_matches_by_row(self, vectors)
+
+
+# ==========================================================
+# IVF (inverted lists over k-means centroids)
+# ==========================================================
+
+class IVFIndex(_PersistentIndex):
+    """
+    Inverted-file index: vectors are bucketed by their nearest k-means
+    centroid and a query only scans the IVF_NPROBE closest buckets.
+    Below IVF_MIN_TRAIN_SIZE everything lives in one bucket (exact search).
+
+    Retraining as the corpus grows runs on a background thread; the
+    lock is only held to copy the vectors and to swap in the new lists,
+    so inserts and queries are not blocked by k-means.
+    """
+
+    backend = "ivf"
+
+    def __init__(self, path: Optional[Path] = None, nlist: int = IVF_NLIST, nprobe: int = IVF_NPROBE):
+        super().__init__(path)
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self._trainer = None
+        self._reset()
+
+    def __len__(self):
+        return len(self._assignments)
+
+    def __contains__(self, title_id):
+        return title_id in self._assignments
+
+    def _reset(self):
+        self._centroids = None
+        self._lists = [VectorIndex()]
+        self._assignments = {}
+        self._trained_size = 0
+        self._retrain_due = False
+        self._fingerprint = (0, 0)
+
+    def _build(self, items):
+        self._reset()
+        for title_id, vec in items:
+            self._lists[0].add(title_id, vec)
+            self._assignments[title_id] = 0
+        self._maybe_train()
+
+    def _snapshot(self):
+        snapshots = [bucket.snapshot() for bucket in self._lists]
+        buckets = np.concatenate(
+            [np.full(len(s[0]), b, dtype=np.int64) for b, s in enumerate(snapshots)]
+        )
+        non_empty = [s for s in snapshots if len(s[0])]
+        if not non_empty:
+            return buckets, np.empty(0, dtype=np.int64), np.empty((0, 0), dtype=np.float32)
+        ids = np.concatenate([s[0] for s in non_empty])
+        vectors = np.concatenate([s[1] for s in non_empty])
+        return buckets, ids, vectors
+
+    def _add(self, title_id: int, vec: np.ndarray):
+        self._remove(title_id)
+
+        bucket = 0
+        if self._centroids is not None:
+            if vec.shape[0] != self._centroids.shape[1]:
+                return
+            bucket = int(np.argmax(self._centroids @ vec))
+
+        self._lists[bucket].add(title_id, vec)
+        self._assignments[title_id] = bucket
+
+        # Retrain once the corpus has outgrown the current centroids.
+        if len(self._assignments) >= max(IVF_MIN_TRAIN_SIZE, 8 * self._trained_size):
+            self._retrain_due = True
+
+    def _after_add(self):
+        with self._lock:
+            if not self._retrain_due or self._trainer is not None:
+                return
+            self._retrain_due = False
+            trainer = self._trainer = Thread(target=self._retrain, name="ivf-retrain", daemon=True)
+
+        trainer.start()
+
+    def _retrain(self):
+        """
+        Trains new centroids on a copy of the vectors without holding the
+        lock, then swaps them in under it. Vectors added meanwhile are
+        assigned to their nearest new centroid during the swap.
+        """
+        try:
+            with self._lock:
+                _, ids, vectors = self._snapshot()
+
+            centroids = self._train(vectors)
+            if centroids is None:
+                return
+            assigned = dict(zip(ids.tolist(), self._nearest(centroids, vectors).tolist()))
+
+            with self._lock:
+                _, ids, vectors = self._snapshot()
+                buckets = np.array([assigned.get(i, -1) for i in ids.tolist()], dtype=np.int64)
+                new = buckets < 0
+                if new.any():
+                    buckets[new] = self._nearest(centroids, vectors[new])
+
+                self._assign_all(centroids, ids, vectors, buckets)
+                self._trained_size = len(ids)
+                self._retrain_due = False
+
+            logger.info("Trained IVF index: %d lists over %d vectors", len(centroids), len(ids))
+        except Exception:
+            logger.exception("IVF retraining failed")
+        finally:
+            with self._lock:
+                self._trainer = None
+
+    def wait_for_training(self, timeout: Optional[float] = None):
+        """Blocks until a background retrain, if one is running, finishes."""
+        trainer = self._trainer
+        if trainer is not None:
+            trainer.join(timeout)
+
+    def _remove(self, title_id: int):
+        bucket = self._assignments.pop(title_id, None)
+        if bucket is not None:
+            self._lists[bucket].remove(title_id)
+
+    def _maybe_train(self):
+        # Synchronous training while building; the caller holds the lock.
+        _, ids, vectors = self._snapshot()
+        centroids = self._train(vectors)
+        if centroids is None:
+            return
+
+        self._assign_all(centroids, ids, vectors)
+        self._trained_size = len(ids)
+        logger.info("Trained IVF index: %d lists over %d vectors", len(centroids), len(ids))
+
+    def _train(self, vectors: np.ndarray) -> Optional[np.ndarray]:
+        size = len(vectors)
+        if size < IVF_MIN_TRAIN_SIZE:
+            return None
+
+        from sklearn.cluster import MiniBatchKMeans
+
+        nlist = self.nlist or int(4 * np.sqrt(size))
+        nlist = max(1, min(nlist, size))
+
+        rng = np.random.default_rng(0)
+        sample = vectors[rng.choice(size, size=min(size, nlist * 256), replace=False)]
+
+        kmeans = MiniBatchKMeans(n_clusters=nlist, batch_size=4096, n_init=3, random_state=0)
+        kmeans.fit(sample)
+
+        centroids = kmeans.cluster_centers_.astype(np.float32)
+        centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+        return centroids
+
+    @staticmethod
+    def _nearest(centroids: np.ndarray, vectors: np.ndarray) -> np.ndarray:
+        buckets = np.empty(len(vectors), dtype=np.int64)
+        for start in range(0, len(vectors), 65_536):
+            block = vectors[start:start + 65_536]
+            buckets[start:start + 65_536] = np.argmax(block @ centroids.T, axis=1)
+        return buckets
+
+    def _assign_all(self, centroids, ids, vectors, buckets=None):
+        if buckets is None:
+            buckets = self._nearest(centroids, vectors)
+
+        self._centroids = centroids
+        self._lists = [VectorIndex() for _ in range(len(centroids))]
+        self._assignments = {}
+
+        order = np.argsort(buckets, kind="stable")
+        bounds = np.searchsorted(buckets[order], np.arange(len(centroids) + 1))
+        for bucket in range(len(centroids)):
+            members = order[bounds[bucket]:bounds[bucket + 1]]
+            self._lists[bucket].add_many(zip(ids[members].tolist(), vectors[members]))
+            for title_id in ids[members].tolist():
+                self._assignments[title_id] = bucket
+
+    def search(self, vec, k: Optional[int] = None, threshold: Optional[float] = None):
+        query = _unit(vec)
+
+        with self._lock:
+            if self._centroids is None:
+                probe = [0]
+            elif query.shape[0] != self._centroids.shape[1]:
+                probe = []
+            else:
+                nprobe = min(self.nprobe, len(self._lists))
+                probe = np.argpartition(-(self._centroids @ query), nprobe - 1)[:nprobe]
+
+            parts = [self._lists[int(b)].scores(query) for b in probe]
+
+        if not parts:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        ids = np.concatenate([p[0] for p in parts])
+        scores = np.concatenate([p[1] for p in parts])
+        return top_k(ids, scores, k, threshold)
+
+    def _dump(self, path: Path):
+        buckets, ids, vectors = self._snapshot()
+
+        with open(path, "wb") as f:
+            np.savez(
+                f,
+                ids=ids,
+                vectors=vectors,
+                buckets=buckets,
+                centroids=self._centroids if self._centroids is not None else np.empty((0, 0), np.float32),
+                meta=np.array([*self._fingerprint, self._trained_size], dtype=np.int64),
+            )
+
+    def _restore(self, fingerprint) -> bool:
+        with np.load(self.path) as data:
+            count, max_id, trained_size = data["meta"].tolist()
+            if (count, max_id) != fingerprint:
+                return False
+
+            self._reset()
+            ids, vectors, buckets = data["ids"], data["vectors"], data["buckets"]
+            if data["centroids"].size:
+                self._assign_all(data["centroids"], ids, vectors, buckets)
+            else:
+                self._lists[0].add_many(zip(ids.tolist(), vectors))
+                self._assignments = dict.fromkeys(ids.tolist(), 0)
+
+        self._trained_size = trained_size
+        self._fingerprint = fingerprint
+        return True
+
+
+# ==========================================================
+# HNSW (optional, requires hnswlib)
+# ==========================================================
+
+def _import_hnswlib():
+    try:
+        import hnswlib
+    except ImportError as e:
+        raise RuntimeError(
+            "VECTOR_INDEX_BACKEND=hnsw requires the hnswlib package"
+        ) from e
+    return hnswlib
+
+
+class HNSWIndex(_PersistentIndex):
+    """
+    Hierarchical navigable small-world graph via hnswlib.
+    Title ids are used directly as graph labels; deletes are soft
+    (mark_deleted) and their slots are reused by later inserts.
+    """
+
+    backend = "hnsw"
+
+    def __init__(self, path: Optional[Path] = None, m: int = HNSW_M,
+                 ef_construction: int = HNSW_EF_CONSTRUCTION, ef: int = HNSW_EF):
+        super().__init__(path)
+        self.m = m
+        self.ef_construction = ef_construction
+        self.ef = ef
+        self._graph = None
+        self._labels = set()
+        self._fingerprint = (0, 0)
+
+    def __len__(self):
+        return len(self._labels)
+
+    def __contains__(self, title_id):
+        return title_id in self._labels
+
+    def _new_graph(self, dim: int, capacity: int):
+        hnswlib = _import_hnswlib()
+        graph = hnswlib.Index(space="cosine", dim=dim)
+        graph.init_index(
+            max_elements=max(capacity, 1024),
+            ef_construction=self.ef_construction,
+            M=self.m,
+            allow_replace_deleted=True,
+        )
+        graph.set_ef(self.ef)
+        return graph
+
+    def _build(self, items):
+        self._graph = None
+        self._labels = set()
+        for title_id, vec in items:
+            self._add(title_id, _unit(vec))
+
+    def _add(self, title_id: int, vec: np.ndarray):
+        if self._graph is None:
+            self._graph = self._new_graph(vec.shape[0], 1024)
+        elif vec.shape[0] != self._graph.dim:
+            return
+
+        if title_id not in self._labels:
+            if self._graph.get_current_count() >= self._graph.get_max_elements():
+                self._graph.resize_index(self._graph.get_max_elements() * 2)
+
+        self._graph.add_items(vec[None, :], [title_id], replace_deleted=title_id not in self._labels)
+        self._labels.add(title_id)
+
+    def _remove(self, title_id: int):
+        if title_id in self._labels:
+            self._graph.mark_deleted(title_id)
+            self._labels.discard(title_id)
+
+    def search(self, vec, k: Optional[int] = None, threshold: Optional[float] = None):
+        query = _unit(vec)
+
+        with self._lock:
+            if not self._labels or query.shape[0] != self._graph.dim:
+                return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+            size = len(self._labels)
+            if k is not None:
+                ids, scores = self._knn(query, min(k, size))
+            elif threshold is None:
+                ids, scores = self._knn(query, size)
+            else:
+                # Everything above threshold: widen the search until the
+                # weakest hit falls below it or the whole graph is returned.
+                k = min(self.ef, size)
+                while True:
+                    ids, scores = self._knn(query, k)
+                    if k >= size or scores[-1] < threshold:
+                        break
+                    k = min(k * 2, size)
+
+        return top_k(ids, scores, None, threshold)
+
+    def _knn(self, query: np.ndarray, k: int):
+        self._graph.set_ef(max(self.ef, k))
+        labels, distances = self._graph.knn_query(query, k=k)
+        return labels[0].astype(np.int64), (1.0 - distances[0]).astype(np.float32)
+
+    def _meta_path(self) -> Path:
+        return self.path.with_name(self.path.name + ".meta")
+
+    def _dump(self, path: Path):
+        self._graph.save_index(str(path))
+        with open(self._meta_path(), "wb") as f:
+            np.savez(
+                f,
+                labels=np.fromiter(self._labels, dtype=np.int64),
+                meta=np.array([*self._fingerprint, self._graph.dim], dtype=np.int64),
+            )
+
+    def _restore(self, fingerprint) -> bool:
+        meta_path = self._meta_path()
+        if not meta_path.exists():
+            return False
+
+        with np.load(meta_path) as data:
+            count, max_id, dim = data["meta"].tolist()
+            if (count, max_id) != fingerprint:
+                return False
+            labels = set(data["labels"].tolist())
+
+        hnswlib = _import_hnswlib()
+        graph = hnswlib.Index(space="cosine", dim=dim)
+        graph.load_index(str(self.path), allow_replace_deleted=True)
+        graph.set_ef(self.ef)
+
+        self._graph = graph
+        self._labels = labels
+        self._fingerprint = fingerprint
+        return True
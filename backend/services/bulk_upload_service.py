@@ -0,0 +1,274 @@
+# services/bulk_upload_service.py
+
+import os
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from database.connection import SessionLocal
+from database.models import Title, BulkUploadRun
+from backend.services.excel_deduper import SemanticState, dedupe_excel
+from backend.services.spreadsheet_reader import iter_title_chunks, estimate_rows, READ_CHUNK_SIZE
+from backend.services.embedding_service import get_embeddings, l2_normalize, EMBED_CHUNK_SIZE
+from backend.services.title_writer import insert_titles
+from backend.services.cluster_service import add_members
+from backend.services.counter_service import (
+    bump,
+    titles_changed,
+    UPLOADS_DUPLICATES,
+    UPLOADS_PROCESSED,
+    UPLOADS_SAVED,
+)
+from backend.services.vector_index import VECTOR_INDEX_BACKEND, get_vector_index
+
+# Also merge near-duplicate titles within the file before embedding them
+# for insert (see dedupe_excel's semantic mode). Chunks share one
+# SemanticState, so pairs split across chunks are merged too.
+BULK_SEMANTIC_DEDUPE = os.getenv("BULK_SEMANTIC_DEDUPE", "false").lower() == "true"
+
+
+def _set_phase(db, run: BulkUploadRun, phase: str):
+    run.phase = phase
+    run.updated_at = datetime.utcnow()
+    db.commit()
+
+
+def run_bulk_upload(
+    run_id: int,
+    file_path: str,
+    file_hash: Optional[str] = None,
+    final_attempt: bool = True,
+):
+    """
+    Ingests one uploaded spreadsheet for its BulkUploadRun. Runs on a queue
+    worker (task "bulk_upload"). On error the run is marked failed, or
+    queued again when the queue will retry, and the error is re-raised.
+
+    Every chunk commits together with the run's checkpoint, so a retry of
+    the same file (queue retry, reclaimed lease or re-upload of a failed
+    run) continues after the last committed chunk.
+    """
+    db = SessionLocal()
+    try:
+        run = db.get(BulkUploadRun, run_id)
+        if run is None:
+            return
+
+        # The route hashed the file while receiving it; it is not read
+        # again here. Forced reprocessing runs store "{sha256}:{tag}".
+        file_hash = file_hash or run.file_hash.split(":", 1)[0]
+
+        if run.checkpoint_hash != file_hash:
+            bump(db, **{
+                UPLOADS_PROCESSED: -(run.processed or 0),
+                UPLOADS_SAVED: -(run.saved or 0),
+                UPLOADS_DUPLICATES: -(run.duplicates or 0),
+            })
+            run.checkpoint_hash = file_hash
+            run.checkpoint_offset = 0
+            run.processed = run.saved = run.duplicates = 0
+
+        run.status = "processing"
+        if not run.checkpoint_offset or run.started_at is None:
+            run.started_at = datetime.utcnow()
+        run.finished_at = None
+        run.error = None
+        run.rows_total = estimate_rows(file_path)
+        run.rows_done = run.checkpoint_offset
+        _set_phase(db, run, "reading")
+
+        try:
+            cluster_sizes = _ingest_file(db, run, file_path)
+        except Exception as e:
+            db.rollback()
+            run.error = str(e)[:500]
+            if final_attempt:
+                run.status = "failed"
+                run.finished_at = datetime.utcnow()
+                _set_phase(db, run, "failed")
+                # A re-upload brings its own copy of the file.
+                Path(file_path).unlink(missing_ok=True)
+            else:
+                run.status = "queued"
+                _set_phase(db, run, "retrying")
+            raise
+
+        run.status = "completed"
+        run.finished_at = datetime.utcnow()
+        _set_phase(db, run, "done")
+
+        # The file belongs to this run alone.
+        Path(file_path).unlink(missing_ok=True)
+
+        print({
+            "file": run.filename,
+            "processed": run.processed,
+            "saved": run.saved,
+            "duplicates": run.duplicates,
+            "clusters": {k: v for k, v in cluster_sizes.items() if v > 1}
+        })
+
+    finally:
+        db.close()
+
+
+# Keys per IN list when checking a chunk against stored titles.
+_KEYS_PER_QUERY = 500
+
+
+def _stored_keys(db, keys: list) -> set:
+    """The subset of keys some stored title already has as normalized_title."""
+    stored = set()
+    for start in range(0, len(keys), _KEYS_PER_QUERY):
+        batch = keys[start:start + _KEYS_PER_QUERY]
+        stored.update(
+            key for (key,) in
+            db.query(Title.normalized_title).filter(Title.normalized_title.in_(batch)).distinct()
+        )
+    return stored
+
+
+def _title_rows(df: pd.DataFrame) -> pd.DataFrame:
+    # Get first column and remove NaN/empty values
+    first_col = df.columns[0]
+    df = df[[first_col]].dropna()
+    df = df[df[first_col].astype(str).str.strip() != '']
+    return df[df[first_col].astype(str).str.lower() != 'nan']
+
+
+def _resume_semantic_state(db, file_path: str, rows: int) -> SemanticState:
+    """
+    SemanticState for a run resuming after its first `rows` rows: the
+    stored titles those rows were saved as, found by their normalized
+    keys. Chunk by chunk, so memory is bounded as during ingestion.
+    """
+    state = SemanticState()
+    done = 0
+
+    for df in iter_title_chunks(file_path, READ_CHUNK_SIZE):
+        if done >= rows:
+            break
+        df = df.iloc[:rows - done]
+        done += len(df)
+        df = _title_rows(df)
+        if df.empty:
+            continue
+
+        unique_df, _ = dedupe_excel(df, column=None, ignore_numbers=True)
+        keys = [key for key in unique_df["normalized"].tolist() if isinstance(key, str) and key]
+
+        for start in range(0, len(keys), _KEYS_PER_QUERY):
+            stored = [
+                (key, np.frombuffer(blob, dtype=np.float32))
+                for key, blob in db.query(Title.normalized_title, Title.embedding)
+                .filter(Title.normalized_title.in_(keys[start:start + _KEYS_PER_QUERY]))
+                if blob
+            ]
+            if stored:
+                state.add(l2_normalize(np.stack([vec for _, vec in stored])), [key for key, _ in stored])
+
+    return state
+
+
+def _ingest_file(db, run: BulkUploadRun, file_path: str) -> Counter:
+    # This runs on a queue worker, which never searches the index. Only the
+    # memmap store is shared with the API process; the other backends would
+    # just hold every ingested vector here, and the API process picks new
+    # rows up through sync anyway.
+    index = get_vector_index() if VECTOR_INDEX_BACKEND == "mmap" else None
+    cluster_sizes = Counter()
+    semantic_state = None
+    if BULK_SEMANTIC_DEDUPE:
+        # Rows before the checkpoint must still catch near-duplicates
+        # further down the file.
+        semantic_state = (
+            _resume_semantic_state(db, file_path, run.checkpoint_offset)
+            if run.checkpoint_offset else SemanticState()
+        )
+
+    # Each chunk runs clean -> dedupe -> embed -> insert on its own,
+    # so memory is bounded by the chunk size, not the file size. Rows
+    # before the checkpoint were committed by an earlier attempt.
+    for df in iter_title_chunks(file_path, READ_CHUNK_SIZE, skip_rows=run.checkpoint_offset):
+        rows_read = len(df)
+        df = _title_rows(df)
+        first_col = df.columns[0]
+
+        pending = []
+
+        if not df.empty:
+            unique_df, clusters = dedupe_excel(
+                df,
+                column=None,
+                ignore_numbers=True,
+                semantic=BULK_SEMANTIC_DEDUPE,
+                state=semantic_state,
+            )
+
+            for normalized, originals in clusters.items():
+                cluster_sizes[normalized] += len(originals)
+
+            # Only this chunk's keys are looked up; earlier chunks are
+            # committed by now, so they are found the same way.
+            existing_norms = _stored_keys(db, [
+                key for key in unique_df["normalized"].tolist() if isinstance(key, str) and key
+            ])
+
+            for title, normalized in zip(unique_df[first_col], unique_df["normalized"]):
+                # Skip empty or nan normalized values
+                if not normalized or normalized == 'nan' or pd.isna(normalized):
+                    continue
+
+                if normalized in existing_norms:
+                    continue
+
+                pending.append((title, normalized))
+                existing_norms.add(normalized)
+
+        if pending:
+            _set_phase(db, run, "embedding")
+
+        inserted = []
+
+        for start in range(0, len(pending), EMBED_CHUNK_SIZE):
+            batch = pending[start:start + EMBED_CHUNK_SIZE]
+            vectors = get_embeddings([normalized for _, normalized in batch])
+
+            # Every row opens a new cluster (its normalized title is not
+            # in the table yet) as its primary.
+            ids = insert_titles(db, [
+                {
+                    "title": title,
+                    "normalized_title": normalized,
+                    "embedding": vec.tobytes(),
+                    "is_duplicate": 0,
+                }
+                for (title, normalized), vec in zip(batch, vectors)
+            ])
+            add_members(db, [(title_id, normalized, 0) for title_id, (_, normalized) in zip(ids, batch)])
+            titles_changed(db, len(ids), sum(len(title) for title, _ in batch))
+            inserted.extend(zip(ids, vectors))
+
+        # One transaction per chunk: the rows, the run's progress and
+        # the checkpoint.
+        run.checkpoint_offset += rows_read
+        run.rows_done = run.checkpoint_offset
+        duplicates = len(df) - len(inserted)
+        run.processed += len(df)
+        run.saved += len(inserted)
+        run.duplicates = run.processed - run.saved
+        bump(db, **{
+            UPLOADS_PROCESSED: len(df),
+            UPLOADS_SAVED: len(inserted),
+            UPLOADS_DUPLICATES: duplicates,
+        })
+        _set_phase(db, run, "reading")
+
+        if index is not None:
+            index.add_many(inserted)
+
+    return cluster_sizes
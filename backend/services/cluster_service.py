@@ -0,0 +1,289 @@
+# services/cluster_service.py
+
+from datetime import datetime
+from typing import Iterable, List, Optional, Tuple
+
+from sqlalchemy import DateTime, case, delete, func, insert, literal, select, update
+from sqlalchemy.orm import Session
+
+from database.models import Cluster, Title
+from backend.services.title_writer import refresh_primaries
+from backend.services.counter_service import (
+    CLUSTERS,
+    MULTI_CLUSTERS,
+    bump,
+    cluster_resized,
+    reconcile_counters,
+    set_counters,
+)
+
+# Keys or ids per IN list; well under SQLite's bound-parameter limit.
+_PER_STATEMENT = 500
+
+
+def _batches(values: list):
+    for start in range(0, len(values), _PER_STATEMENT):
+        yield values[start:start + _PER_STATEMENT]
+
+
+def _oldest(db: Session, key: str) -> Optional[int]:
+    # One seek on ix_titles_cluster_order.
+    return db.execute(
+        select(Title.id)
+        .where(Title.normalized_title == key)
+        .order_by(Title.created_at.asc(), Title.id.asc())
+        .limit(1)
+    ).scalar()
+
+
+def _get(db: Session, key: str) -> Optional[Cluster]:
+    return db.query(Cluster).filter(Cluster.canonical_key == key).first()
+
+
+def heal_cluster(db: Session, key: str, cluster: Optional[Cluster] = None) -> Optional[Cluster]:
+    """
+    Recomputes one cluster from its titles: member count, primary and
+    every member's is_duplicate flag. Used when the row is missing or
+    points at a title that no longer belongs to it. No commit.
+    """
+    db.flush()
+    if cluster is None:
+        cluster = _get(db, key)
+    before = cluster.member_count if cluster is not None else 0
+
+    count = db.query(func.count(Title.id)).filter(Title.normalized_title == key).scalar()
+    cluster_resized(db, before, count)
+    if not count:
+        if cluster is not None:
+            db.delete(cluster)
+        return None
+
+    refresh_primaries(db, [key])
+
+    if cluster is None:
+        cluster = Cluster(canonical_key=key)
+        db.add(cluster)
+
+    cluster.primary_title_id = _oldest(db, key)
+    cluster.member_count = count
+    cluster.updated_at = datetime.utcnow()
+    return cluster
+
+
+def add_member(db: Session, title: Title):
+    """
+    Registers a flushed title with the cluster of its normalized_title and
+    sets its is_duplicate flag. Only the current primary is compared, so
+    the cost does not depend on the cluster's size. No commit.
+    """
+    key = title.normalized_title
+    cluster = _get(db, key)
+    primary = db.get(Title, cluster.primary_title_id) if cluster and cluster.primary_title_id else None
+
+    if primary is None or primary.normalized_title != key:
+        cluster = heal_cluster(db, key, cluster)
+        title.is_duplicate = int(cluster.primary_title_id != title.id)
+        return
+
+    cluster_resized(db, cluster.member_count, cluster.member_count + 1)
+    cluster.member_count += 1
+    cluster.updated_at = datetime.utcnow()
+
+    if (title.created_at, title.id) < (primary.created_at, primary.id):
+        primary.is_duplicate = 1
+        title.is_duplicate = 0
+        cluster.primary_title_id = title.id
+    else:
+        title.is_duplicate = 1
+
+
+def add_members(db: Session, members: List[Tuple[int, str, int]]):
+    """
+    Bulk add_member for rows just inserted in one batch (newer than every
+    stored row, in id order). members: (id, normalized_title, is_duplicate)
+    as inserted; flags that disagree with the clusters are corrected.
+    A handful of statements per batch of keys, no commit.
+    """
+    by_key = {}
+    for title_id, key, flag in members:
+        by_key.setdefault(key, []).append((title_id, flag))
+
+    keys = list(by_key)
+    clusters = {}
+    counts = {}
+    for batch in _batches(keys):
+        clusters.update(
+            (c.canonical_key, c)
+            for c in db.query(Cluster).filter(Cluster.canonical_key.in_(batch))
+        )
+        counts.update(
+            db.query(Title.normalized_title, func.count(Title.id))
+            .filter(Title.normalized_title.in_([k for k in batch if k not in clusters]))
+            .group_by(Title.normalized_title)
+            .all()
+        )
+
+    primary_ids = [c.primary_title_id for c in clusters.values() if c.primary_title_id]
+    alive = {}
+    for batch in _batches(primary_ids):
+        alive.update(db.query(Title.id, Title.normalized_title).filter(Title.id.in_(batch)).all())
+
+    now = datetime.utcnow()
+    new_clusters = []
+    corrections = {0: [], 1: []}
+    stale = []
+    grown = {CLUSTERS: 0, MULTI_CLUSTERS: 0}
+
+    for key, rows in by_key.items():
+        cluster = clusters.get(key)
+
+        if cluster is None:
+            if counts.get(key) != len(rows):
+                stale.append(key)    # members predate the cluster table
+                continue
+            new_clusters.append({
+                "canonical_key": key,
+                "primary_title_id": rows[0][0],
+                "member_count": len(rows),
+                "updated_at": now,
+            })
+            wanted = [0] + [1] * (len(rows) - 1)
+            grown[CLUSTERS] += 1
+            grown[MULTI_CLUSTERS] += len(rows) > 1
+        elif alive.get(cluster.primary_title_id) != key:
+            stale.append(key)
+            continue
+        else:
+            grown[MULTI_CLUSTERS] += cluster.member_count <= 1
+            cluster.member_count += len(rows)
+            cluster.updated_at = now
+            wanted = [1] * len(rows)
+
+        for (title_id, flag), want in zip(rows, wanted):
+            if flag != want:
+                corrections[want].append(title_id)
+
+    if new_clusters:
+        db.execute(insert(Cluster), new_clusters)
+    bump(db, **grown)
+
+    for want, ids in corrections.items():
+        for batch in _batches(ids):
+            db.execute(
+                update(Title)
+                .where(Title.id.in_(batch))
+                .values(is_duplicate=want)
+                .execution_options(synchronize_session=False)
+            )
+
+    for key in stale:
+        heal_cluster(db, key, clusters.get(key))
+
+
+def remove_members(db: Session, removed: Iterable[Tuple[int, str]]):
+    """
+    Updates clusters after titles left them (deleted, or moved to another
+    key), given (id, former normalized_title) pairs. The rows must already
+    be gone from the key (flushed). A removed primary is replaced by the
+    next-oldest member via one index seek. No commit.
+    """
+    by_key = {}
+    for title_id, key in removed:
+        by_key.setdefault(key, set()).add(title_id)
+
+    now = datetime.utcnow()
+
+    for key, ids in by_key.items():
+        cluster = _get(db, key)
+        if cluster is None:
+            continue
+
+        before = cluster.member_count
+        after = before - len(ids)
+
+        if after <= 0 or cluster.primary_title_id in ids:
+            next_id = _oldest(db, key)
+            if next_id is None:
+                cluster_resized(db, before, 0)
+                db.delete(cluster)
+                continue
+            if after <= 0:
+                # Members remain although the count says none do.
+                heal_cluster(db, key, cluster)
+                continue
+
+            db.get(Title, next_id).is_duplicate = 0
+            cluster.primary_title_id = next_id
+
+        cluster_resized(db, before, after)
+        cluster.member_count = after
+        cluster.updated_at = now
+
+
+def move_member(db: Session, title: Title, old_key: str):
+    """
+    Cluster bookkeeping for an edited title whose normalized_title may have
+    changed from old_key. Sets the title's is_duplicate flag. No commit.
+    """
+    db.flush()
+
+    if title.normalized_title != old_key:
+        remove_members(db, [(title.id, old_key)])
+        add_member(db, title)
+        return
+
+    cluster = _get(db, old_key)
+    if cluster is None or cluster.primary_title_id is None:
+        cluster = heal_cluster(db, old_key, cluster)
+    title.is_duplicate = int(cluster.primary_title_id != title.id)
+
+
+def clear_clusters(db: Session):
+    """Drops every cluster row (all titles were deleted). No commit."""
+    db.execute(delete(Cluster))
+    set_counters(db, **{CLUSTERS: 0, MULTI_CLUSTERS: 0})
+
+
+def rebuild_clusters(db: Session) -> int:
+    """
+    Rebuilds the whole clusters table from titles, resets every
+    is_duplicate flag to match it and reconciles the stats counters.
+    Returns the number of clusters. Commits.
+    """
+    db.execute(delete(Cluster))
+
+    first = select(Title.id).where(
+        Title.normalized_title == Cluster.canonical_key
+    ).order_by(Title.created_at.asc(), Title.id.asc()).limit(1)
+
+    db.execute(
+        insert(Cluster).from_select(
+            ["canonical_key", "member_count", "updated_at"],
+            select(Title.normalized_title, func.count(Title.id), literal(datetime.utcnow(), DateTime))
+            .group_by(Title.normalized_title),
+        )
+    )
+    db.execute(update(Cluster).values(primary_title_id=first.scalar_subquery()))
+
+    primary_id = (
+        select(Cluster.primary_title_id)
+        .where(Cluster.canonical_key == Title.normalized_title)
+        .scalar_subquery()
+    )
+    db.execute(
+        update(Title)
+        .values(is_duplicate=case((Title.id == primary_id, 0), else_=1))
+        .execution_options(synchronize_session=False)
+    )
+
+    return reconcile_counters(db)[CLUSTERS]
+
+
+def backfill_clusters(db: Session) -> int:
+    """
+    Builds the clusters table on first start against an existing titles
+    table. Returns the number of clusters built (0 when nothing to do).
+    """
+    if db.query(Cluster.id).first() is not None or db.query(Title.id).first() is None:
+        return 0
+    return rebuild_clusters(db)
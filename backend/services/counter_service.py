@@ -0,0 +1,112 @@
+# services/counter_service.py
+
+from typing import Dict
+
+from sqlalchemy import func, insert, update
+from sqlalchemy.orm import Session
+
+from database.models import BulkUploadRun, Cluster, StatCounter, Title
+
+# Counter names. Duplicates are not stored: every cluster has exactly one
+# primary, so duplicates = titles - clusters.
+TITLES = "titles"
+TITLE_LENGTH = "title_length"            # sum of len(Title.title)
+CLUSTERS = "clusters"
+MULTI_CLUSTERS = "multi_clusters"        # clusters with more than one member
+UPLOADS = "uploads"
+UPLOADS_PROCESSED = "uploads_processed"
+UPLOADS_SAVED = "uploads_saved"
+UPLOADS_DUPLICATES = "uploads_duplicates"
+
+COUNTER_NAMES = (
+    TITLES, TITLE_LENGTH, CLUSTERS, MULTI_CLUSTERS,
+    UPLOADS, UPLOADS_PROCESSED, UPLOADS_SAVED, UPLOADS_DUPLICATES,
+)
+
+
+def bump(db: Session, **deltas: int):
+    """
+    Adds deltas to counters inside the caller's transaction, so they
+    commit or roll back with the write they describe. No commit.
+    """
+    for name, delta in deltas.items():
+        if delta:
+            db.execute(
+                update(StatCounter)
+                .where(StatCounter.name == name)
+                .values(value=StatCounter.value + int(delta))
+            )
+
+
+def set_counters(db: Session, **values: int):
+    """Overwrites counters with absolute values. No commit."""
+    for name, value in values.items():
+        db.execute(
+            update(StatCounter)
+            .where(StatCounter.name == name)
+            .values(value=int(value))
+        )
+
+
+def titles_changed(db: Session, count: int, length: int):
+    bump(db, **{TITLES: count, TITLE_LENGTH: length})
+
+
+def cluster_resized(db: Session, before: int, after: int):
+    """Counter deltas for one cluster going from before to after members."""
+    bump(db, **{
+        CLUSTERS: (after > 0) - (before > 0),
+        MULTI_CLUSTERS: (after > 1) - (before > 1),
+    })
+
+
+def reconcile_counters(db: Session) -> Dict[str, int]:
+    """
+    Recomputes every counter from the tables (titles, clusters, bulk
+    upload runs) and stores the result. Cluster counts are read from the
+    clusters table; rebuild it first if it may be stale. Commits.
+    """
+    titles, length = db.query(
+        func.count(Title.id),
+        func.coalesce(func.sum(func.length(Title.title)), 0),
+    ).one()
+    clusters = db.query(func.count(Cluster.id)).scalar()
+    multi = db.query(func.count(Cluster.id)).filter(Cluster.member_count > 1).scalar()
+    uploads, processed, saved, duplicates = db.query(
+        func.count(BulkUploadRun.id),
+        func.coalesce(func.sum(BulkUploadRun.processed), 0),
+        func.coalesce(func.sum(BulkUploadRun.saved), 0),
+        func.coalesce(func.sum(BulkUploadRun.duplicates), 0),
+    ).one()
+
+    values = {
+        TITLES: titles,
+        TITLE_LENGTH: length,
+        CLUSTERS: clusters,
+        MULTI_CLUSTERS: multi,
+        UPLOADS: uploads,
+        UPLOADS_PROCESSED: processed,
+        UPLOADS_SAVED: saved,
+        UPLOADS_DUPLICATES: duplicates,
+    }
+    values = {name: int(value or 0) for name, value in values.items()}
+
+    existing = {name for (name,) in db.query(StatCounter.name)}
+    missing = [{"name": n, "value": v} for n, v in values.items() if n not in existing]
+    if missing:
+        db.execute(insert(StatCounter), missing)
+    set_counters(db, **{n: v for n, v in values.items() if n in existing})
+
+    db.commit()
+    return values
+
+
+def read_counters(db: Session) -> Dict[str, int]:
+    """
+    All counters in one primary-key read. A database without the rows
+    yet (new table) is reconciled once first.
+    """
+    values = dict(db.query(StatCounter.name, StatCounter.value))
+    if any(name not in values for name in COUNTER_NAMES):
+        return reconcile_counters(db)
+    return {name: int(values[name]) for name in COUNTER_NAMES}
@@ -0,0 +1,95 @@
+# services/embedding_batcher.py
+
+import logging
+import queue
+import time
+from concurrent.futures import Future
+from threading import Lock, Thread
+from typing import Callable, List
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingBatcher:
+    """
+    Coalesces concurrent single-text embedding requests.
+
+    The first queued request opens a window of max_wait_ms; everything
+    that arrives before it closes (up to max_batch texts) is encoded in
+    one batched call and each caller gets its own row back.
+    """
+
+    def __init__(
+        self,
+        encode: Callable[[List[str]], np.ndarray],
+        max_batch: int = 32,
+        max_wait_ms: float = 3.0,
+    ):
+        self.encode = encode
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+
+        self._queue = queue.Queue()
+        self._lock = Lock()
+        self._thread = None
+
+        self.batches = 0
+        self.requests = 0
+
+    def submit(self, text: str) -> Future:
+        self._ensure_started()
+
+        future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def embed(self, text: str) -> np.ndarray:
+        return self.submit(text).result()
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = Thread(
+                        target=self._run,
+                        name="embedding-batcher",
+                        daemon=True,
+                    )
+                    self._thread.start()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            texts = list(dict.fromkeys(text for text, _ in batch))
+
+            try:
+                vectors = self.encode(texts)
+            except Exception as e:
+                logger.exception("Batched embedding failed")
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            rows = dict(zip(texts, vectors))
+            for text, future in batch:
+                future.set_result(rows[text])
+
+            self.batches += 1
+            self.requests += len(batch)
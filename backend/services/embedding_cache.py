@@ -0,0 +1,254 @@
+# services/embedding_cache.py
+
+import hashlib
+import logging
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from pathlib import Path
+from threading import Lock
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from database.connection import DATA_DIR
+
+logger = logging.getLogger(__name__)
+
+# ==========================================================
+# Configuration
+# ==========================================================
+
+# In-process LRU size (entries). 0 disables the memory layer.
+EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", "20000"))
+
+# Persistent store; set EMBED_CACHE_PATH to an empty string to disable it.
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH", str(DATA_DIR / "embedding_cache.db"))
+EMBED_CACHE_DISK_MAX_ROWS = int(os.getenv("EMBED_CACHE_DISK_MAX_ROWS", "2000000"))
+
+# How many disk writes between eviction sweeps.
+_EVICT_EVERY = 1000
+
+
+def cache_key(model: str, text: str) -> str:
+    """
+    Content address for an embedding: model name + cleaned text.
+    """
+    return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Two-level embedding cache: a bounded in-process LRU in front of a
+    SQLite file that survives restarts. Both levels are keyed by
+    cache_key(model, text) and store float32 vectors.
+    """
+
+    def __init__(
+        self,
+        max_items: int = EMBED_CACHE_SIZE,
+        path: Optional[str] = EMBED_CACHE_PATH,
+        max_disk_rows: int = EMBED_CACHE_DISK_MAX_ROWS,
+    ):
+        self.max_items = max_items
+        self.max_disk_rows = max_disk_rows
+
+        self._lock = Lock()
+        self._memory = OrderedDict()
+        self._disk = self._open(path) if path else None
+        self._writes = 0
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _open(self, path: str):
+        try:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " key TEXT PRIMARY KEY,"
+                " vector BLOB NOT NULL,"
+                " last_used REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_embeddings_last_used ON embeddings (last_used)"
+            )
+            return conn
+        except sqlite3.Error as e:
+            logger.warning("Embedding disk cache disabled (%s): %s", path, e)
+            return None
+
+    # --------------------------
+    # Lookups
+    # --------------------------
+    def get(self, model: str, text: str) -> Optional[np.ndarray]:
+        key = cache_key(model, text)
+
+        with self._lock:
+            vec = self._memory.get(key)
+            if vec is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return vec
+
+            if self._disk is not None:
+                row = self._disk.execute(
+                    "SELECT vector FROM embeddings WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    self._disk.execute(
+                        "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                        (time.time(), key),
+                    )
+                    vec = np.frombuffer(row[0], dtype=np.float32)
+                    self._remember(key, vec)
+                    self.disk_hits += 1
+                    return vec
+
+            self.misses += 1
+            return None
+
+    def get_many(self, model: str, texts: List[str]) -> Dict[str, np.ndarray]:
+        """
+        Returns {text: vector} for every text found in either layer.
+        """
+        keys = {cache_key(model, text): text for text in texts}
+        found = {}
+
+        with self._lock:
+            missing = []
+            for key, text in keys.items():
+                vec = self._memory.get(key)
+                if vec is not None:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    found[text] = vec
+                else:
+                    missing.append(key)
+
+            if self._disk is not None and missing:
+                now = time.time()
+                for start in range(0, len(missing), 500):
+                    chunk = missing[start:start + 500]
+                    placeholders = ",".join("?" * len(chunk))
+                    rows = self._disk.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                        chunk,
+                    ).fetchall()
+                    if rows:
+                        self._disk.executemany(
+                            "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                            [(now, key) for key, _ in rows],
+                        )
+                    for key, blob in rows:
+                        vec = np.frombuffer(blob, dtype=np.float32)
+                        self._remember(key, vec)
+                        found[keys[key]] = vec
+                    self.disk_hits += len(rows)
+
+            self.misses += len(keys) - len(found)
+
+        return found
+
+    def put_many(self, model: str, items: Dict[str, object]):
+        rows = []
+
+        with self._lock:
+            now = time.time()
+            for text, vec in items.items():
+                key = cache_key(model, text)
+                vec = np.asarray(vec, dtype=np.float32)
+                self._remember(key, vec)
+                rows.append((key, vec.tobytes(), now))
+
+            if self._disk is not None and rows:
+                self._disk.execute("BEGIN")
+                self._disk.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                    rows,
+                )
+                self._disk.execute("COMMIT")
+                before = self._writes
+                self._writes += len(rows)
+                if self._writes // _EVICT_EVERY != before // _EVICT_EVERY:
+                    self._evict_disk()
+
+    def put(self, model: str, text: str, vec):
+        key = cache_key(model, text)
+        vec = np.asarray(vec, dtype=np.float32)
+
+        with self._lock:
+            self._remember(key, vec)
+
+            if self._disk is not None:
+                self._disk.execute(
+                    "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                    (key, vec.tobytes(), time.time()),
+                )
+                self._writes += 1
+                if self._writes % _EVICT_EVERY == 0:
+                    self._evict_disk()
+
+    def _remember(self, key: str, vec: np.ndarray):
+        if self.max_items <= 0:
+            return
+
+        self._memory[key] = vec
+        self._memory.move_to_end(key)
+
+        while len(self._memory) > self.max_items:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def _evict_disk(self):
+        total = self._disk.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        excess = total - self.max_disk_rows
+        if excess <= 0:
+            return
+
+        self._disk.execute(
+            "DELETE FROM embeddings WHERE key IN ("
+            " SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+            (excess,),
+        )
+        self.evictions += excess
+
+    # --------------------------
+    # Introspection
+    # --------------------------
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_items": len(self._memory),
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round((lookups - self.misses) / lookups, 4) if lookups else 0.0,
+            }
+
+    def clear_memory(self):
+        with self._lock:
+            self._memory.clear()
+
+
+_embedding_cache = None
+_cache_lock = Lock()
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    global _embedding_cache
+
+    if _embedding_cache is None:
+        with _cache_lock:
+            if _embedding_cache is None:
+                _embedding_cache = EmbeddingCache()
+
+    return _embedding_cache
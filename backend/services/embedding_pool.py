@@ -0,0 +1,143 @@
+# services/embedding_pool.py
+
+import logging
+import math
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from threading import Lock
+from typing import Callable, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Worker processes for bulk MiniLM encoding (0 = encode in-process).
+EMBED_WORKERS = int(os.getenv("EMBED_WORKERS", "0"))
+
+# Torch intra-op threads per worker. Workers x threads should not exceed
+# the number of cores, or the processes just fight over them.
+EMBED_WORKER_THREADS = int(os.getenv("EMBED_WORKER_THREADS", "1"))
+
+# Smaller requests are cheaper to encode in-process than to ship around.
+EMBED_POOL_MIN_TEXTS = int(os.getenv("EMBED_POOL_MIN_TEXTS", "256"))
+
+
+def load_sentence_transformer(model_name: str):
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(model_name, device="cpu")
+
+
+# ==========================================================
+# Worker process side
+# ==========================================================
+
+_worker_model = None
+
+
+def _init_worker(model_name: str, threads: int, loader: Callable):
+    global _worker_model
+
+    # Must be set before torch spins up its thread pools.
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    os.environ["MKL_NUM_THREADS"] = str(threads)
+
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+    _worker_model = loader(model_name)
+
+
+def _encode_slice(texts: List[str], batch_size: int) -> np.ndarray:
+    vectors = _worker_model.encode(
+        texts,
+        batch_size=batch_size,
+        convert_to_numpy=True,
+        show_progress_bar=False
+    )
+    return np.asarray(vectors, dtype=np.float32)
+
+
+# ==========================================================
+# Pool
+# ==========================================================
+
+class EmbeddingPool:
+    """
+    Process pool for large embedding jobs.
+
+    Each worker loads the model once (in its initializer) and runs torch
+    with a fixed number of threads. encode() splits the texts into one
+    contiguous slice per worker and stitches the results back together
+    in input order. The pool stays up between jobs.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        workers: int = EMBED_WORKERS,
+        threads: int = EMBED_WORKER_THREADS,
+        loader: Callable = load_sentence_transformer,
+    ):
+        if workers < 1:
+            raise ValueError("EmbeddingPool needs at least one worker")
+
+        self.model_name = model_name
+        self.workers = workers
+        self.threads = threads
+
+        # spawn, not fork: torch's thread pools do not survive a fork.
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(model_name, threads, loader),
+        )
+
+    def encode(self, texts: List[str], batch_size: int = 64) -> np.ndarray:
+        texts = list(texts)
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+
+        # Whole forward batches per slice, spread evenly over the workers.
+        per_worker = math.ceil(len(texts) / self.workers)
+        step = max(batch_size, math.ceil(per_worker / batch_size) * batch_size)
+        slices = [texts[start:start + step] for start in range(0, len(texts), step)]
+
+        # map() yields results in submission order.
+        parts = self._executor.map(_encode_slice, slices, [batch_size] * len(slices))
+        return np.vstack(list(parts))
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+
+_pool: Optional[EmbeddingPool] = None
+_pool_lock = Lock()
+
+
+def get_embedding_pool(model_name: str) -> EmbeddingPool:
+    global _pool
+
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = EmbeddingPool(model_name)
+                logger.info(
+                    "Embedding pool started: %d workers x %d threads",
+                    _pool.workers, _pool.threads
+                )
+
+    return _pool
+
+
+def shutdown_embedding_pool():
+    global _pool
+
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
@@ -13,6 +13,14 @@ from threading import Lock
 import numpy as np
 from sentence_transformers import SentenceTransformer
 
+from backend.services.embedding_cache import get_embedding_cache
+from backend.services.embedding_batcher import EmbeddingBatcher
+from backend.services.embedding_pool import (
+    EMBED_WORKERS,
+    EMBED_POOL_MIN_TEXTS,
+    get_embedding_pool,
+)
+
 logger = logging.getLogger(__name__)
 
 # ==========================================================
@@ -22,6 +30,32 @@ logger = logging.getLogger(__name__)
 USE_OPENAI = os.getenv("USE_OPENAI", "false").lower() == "true"
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
+MINILM_MODEL_NAME = "all-MiniLM-L6-v2"
+OPENAI_MODEL_NAME = "text-embedding-3-small"
+
+# Texts per model forward pass, and texts per get_embeddings() call on bulk paths.
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+EMBED_CHUNK_SIZE = int(os.getenv("EMBED_CHUNK_SIZE", "2048"))
+
+# Coalesce concurrent single-text MiniLM calls into one forward pass.
+EMBED_COALESCE = os.getenv("EMBED_COALESCE", "true").lower() == "true"
+EMBED_COALESCE_MAX_BATCH = int(os.getenv("EMBED_COALESCE_MAX_BATCH", "32"))
+EMBED_COALESCE_MAX_WAIT_MS = float(os.getenv("EMBED_COALESCE_MAX_WAIT_MS", "3"))
+
+# Store unit-length vectors so similarity is a plain dot product.
+# Existing rows are converted with: python -m backend.manage normalize-embeddings
+NORMALIZE_EMBEDDINGS = os.getenv("NORMALIZE_EMBEDDINGS", "false").lower() == "true"
+
+
+def l2_normalize(vectors: np.ndarray) -> np.ndarray:
+    """
+    Row-wise L2 normalization (1-D input is treated as a single row).
+    Zero vectors are left as zeros, matching sklearn's cosine_similarity.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
 # ==========================================================
 # MiniLM (default, CPU-only, deterministic)
 # ==========================================================
@@ -37,17 +71,40 @@ def get_minilm_model():
         with _model_lock:
             if _minilm_model is None:
                 _minilm_model = SentenceTransformer(
-                    "all-MiniLM-L6-v2",
+                    MINILM_MODEL_NAME,
                     device="cpu"
                 )
 
     return _minilm_model
 
 
+_batcher = None
+_batcher_lock = Lock()
+
+
+def get_embedding_batcher() -> EmbeddingBatcher:
+    global _batcher
+
+    if _batcher is None:
+        with _batcher_lock:
+            if _batcher is None:
+                _batcher = EmbeddingBatcher(
+                    lambda texts: get_minilm_embeddings(texts),
+                    max_batch=EMBED_COALESCE_MAX_BATCH,
+                    max_wait_ms=EMBED_COALESCE_MAX_WAIT_MS,
+                )
+
+    return _batcher
+
+
 def get_minilm_embedding(text: str) -> List[float]:
+    if EMBED_COALESCE:
+        return get_embedding_batcher().embed(text).tolist()
+
     model = get_minilm_model()
 
-    # ❗ IMPORTANT: no normalize_embeddings here
+    # ❗ IMPORTANT: no normalize_embeddings here (the cache keeps raw model
+    # output; NORMALIZE_EMBEDDINGS is applied in get_embedding/get_embeddings)
     emb = model.encode(
         text,
         convert_to_numpy=True,
@@ -56,6 +113,21 @@ def get_minilm_embedding(text: str) -> List[float]:
 
     return emb.tolist()
 
+
+def get_minilm_embeddings(texts: List[str], batch_size: int = EMBED_BATCH_SIZE) -> np.ndarray:
+    # Large bulk batches are spread over the worker pool when enabled.
+    if EMBED_WORKERS > 0 and len(texts) >= EMBED_POOL_MIN_TEXTS:
+        return get_embedding_pool(MINILM_MODEL_NAME).encode(texts, batch_size=batch_size)
+
+    model = get_minilm_model()
+
+    return model.encode(
+        texts,
+        batch_size=batch_size,
+        convert_to_numpy=True,
+        show_progress_bar=False
+    )
+
 # ==========================================================
 # OpenAI (optional, guarded)
 # ==========================================================
@@ -79,31 +151,102 @@ def get_openai_embedding(text: str) -> List[float]:
     client = get_openai_client()
 
     response = client.embeddings.create(
-        model="text-embedding-3-small",
+        model=OPENAI_MODEL_NAME,
         input=text
     )
 
     return response.data[0].embedding
 
+
+def get_openai_embeddings(texts: List[str], batch_size: int = EMBED_BATCH_SIZE) -> np.ndarray:
+    client = get_openai_client()
+    vectors = []
+
+    for start in range(0, len(texts), batch_size):
+        response = client.embeddings.create(
+            model=OPENAI_MODEL_NAME,
+            input=texts[start:start + batch_size]
+        )
+        vectors.extend(d.embedding for d in sorted(response.data, key=lambda d: d.index))
+
+    return np.array(vectors, dtype=np.float32)
+
 # ==========================================================
 # Unified public API
 # ==========================================================
 
+def _cached_embedding(model_name: str, text: str, embed) -> List[float]:
+    cache = get_embedding_cache()
+
+    vec = cache.get(model_name, text)
+    if vec is None:
+        vec = embed(text)
+        cache.put(model_name, text, vec)
+
+    vec = np.asarray(vec, dtype=np.float32)
+    if NORMALIZE_EMBEDDINGS:
+        vec = l2_normalize(vec)
+
+    return vec.tolist()
+
+
 def get_embedding(text: str) -> List[float]:
     """
-    Returns an embedding for the given text.
+    Returns an embedding for the given text (callers pass clean_text output).
 
     Default: MiniLM
     Optional: OpenAI (only if USE_OPENAI=true)
+    Results are served from the embedding cache when possible.
     """
 
     if USE_OPENAI:
         try:
-            return get_openai_embedding(text)
+            return _cached_embedding(OPENAI_MODEL_NAME, text, get_openai_embedding)
+        except Exception as e:
+            logger.warning(
+                "OpenAI embedding failed, falling back to MiniLM: %s",
+                str(e)
+            )
+
+    return _cached_embedding(MINILM_MODEL_NAME, text, get_minilm_embedding)
+
+
+def _cached_embeddings(model_name: str, texts: List[str], embed, batch_size: int) -> np.ndarray:
+    cache = get_embedding_cache()
+
+    found = cache.get_many(model_name, texts)
+    missing = [t for t in dict.fromkeys(texts) if t not in found]
+
+    if missing:
+        computed = embed(missing, batch_size=batch_size)
+        fresh = dict(zip(missing, np.asarray(computed, dtype=np.float32)))
+        cache.put_many(model_name, fresh)
+        found.update(fresh)
+
+    vectors = np.vstack([found[t] for t in texts]).astype(np.float32, copy=False)
+    if NORMALIZE_EMBEDDINGS:
+        vectors = l2_normalize(vectors)
+
+    return vectors
+
+
+def get_embeddings(texts: List[str], batch_size: int = EMBED_BATCH_SIZE) -> np.ndarray:
+    """
+    Batched get_embedding: returns a (len(texts), dim) float32 matrix in
+    input order. Cached texts are skipped and repeated texts are encoded once.
+    """
+
+    texts = list(texts)
+    if not texts:
+        return np.empty((0, 0), dtype=np.float32)
+
+    if USE_OPENAI:
+        try:
+            return _cached_embeddings(OPENAI_MODEL_NAME, texts, get_openai_embeddings, batch_size)
         except Exception as e:
             logger.warning(
                 "OpenAI embedding failed, falling back to MiniLM: %s",
                 str(e)
             )
 
-    return get_minilm_embedding(text)
+    return _cached_embeddings(MINILM_MODEL_NAME, texts, get_minilm_embeddings, batch_size)
@@ -1,23 +1,29 @@
 # services/excel_deduper.py
 
+import os
 import pandas as pd
 import re
-from backend.utils.text_cleaner import clean_text
+import numpy as np
+from typing import Optional
+from backend.utils.text_cleaner import clean_series
+from backend.services.embedding_service import get_embeddings, l2_normalize, EMBED_CHUNK_SIZE
+from backend.services.similarity import cluster_rows
+from backend.services.vector_index import VectorIndex
 
+_STANDALONE_NUMBERS = re.compile(r"\b\d+\b")
+_SPACES = re.compile(r"\s+")
 
-def _remove_numbers(text: str) -> str:
-    """
-    Removes standalone numbers from text.
-    Example:
-      'sample title number 123' -> 'sample title number'
-    """
-    return re.sub(r"\b\d+\b", "", text).strip()
+# Cosine score at which semantic mode merges two normalized titles.
+SEMANTIC_THRESHOLD = float(os.getenv("SEMANTIC_DEDUPE_THRESHOLD", "0.85"))
 
 
 def dedupe_excel(
     df: pd.DataFrame,
     column: str = None,
     ignore_numbers: bool = True,
+    semantic: bool = False,
+    threshold: float = SEMANTIC_THRESHOLD,
+    state: Optional["SemanticState"] = None,
 ):
     """
     Deterministic Excel deduper.
@@ -28,6 +34,12 @@ def dedupe_excel(
     - ignore_numbers:
         True  -> 'Title 1', 'Title 2' are duplicates
         False -> treated as unique
+    - semantic: also merge different normalized titles whose embeddings
+      score >= threshold (transitively), keeping the first of each group
+    - threshold: cosine score for semantic mode
+    - state: SemanticState shared by the calls for one file read in
+      chunks; semantic mode then also merges titles into groups kept by
+      earlier calls (they are not returned again in unique_df)
 
     Returns:
     - unique_df: DataFrame with only unique rows
@@ -49,16 +61,18 @@ def dedupe_excel(
     # -------------------------------------------------
     # Step 1: normalize text (lowercase, punctuation)
     # -------------------------------------------------
-    df["normalized"] = df[column].apply(clean_text)
+    df["normalized"] = clean_series(df[column])
 
     # -------------------------------------------------
     # Step 2: optionally strip numbers
     # -------------------------------------------------
     if ignore_numbers:
-        df["normalized"] = df["normalized"].apply(_remove_numbers)
+        df["normalized"] = (
+            df["normalized"].str.replace(_STANDALONE_NUMBERS, "", regex=True).str.strip()
+        )
 
     # Final cleanup (collapse spaces after number removal)
-    df["normalized"] = df["normalized"].str.replace(r"\s+", " ", regex=True).str.strip()
+    df["normalized"] = df["normalized"].str.replace(_SPACES, " ", regex=True).str.strip()
 
     # -------------------------------------------------
     # Step 3: build clusters (DO NOT DELETE INFO)
@@ -75,4 +89,78 @@ def dedupe_excel(
     # -------------------------------------------------
     unique_df = df.drop_duplicates(subset="normalized", keep="first")
 
+    # -------------------------------------------------
+    # Step 5 (optional): semantic near-duplicates
+    # -------------------------------------------------
+    if semantic and (len(unique_df) > 1 or state is not None):
+        unique_df, clusters = _merge_semantic(unique_df, clusters, threshold, state)
+
     return unique_df, clusters
+
+
+class SemanticState:
+    """
+    Titles seen by earlier dedupe_excel calls on the same file: every
+    embedded title's unit vector and the key of the group it ended up in.
+    Memory grows with the distinct titles of the file (dim floats each).
+    """
+
+    def __init__(self):
+        self.index = VectorIndex()
+        self.keys = []
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add(self, units: np.ndarray, keys: list):
+        start = len(self.keys)
+        self.index.add_many(zip(range(start, start + len(keys)), units))
+        self.keys.extend(keys)
+
+
+def _merge_semantic(unique_df: pd.DataFrame, clusters: dict, threshold: float, state=None):
+    """
+    Embeds each distinct normalized title once, links pairs scoring at
+    least threshold (blocked, never N x N) and merges the linked groups
+    with union-find. A merged cluster is keyed by its first title.
+
+    With a state, each group whose members score at least threshold
+    against a title from an earlier call joins that title's group (the
+    best-scoring match wins), and this call's titles are added to it.
+    """
+    keys = unique_df["normalized"].tolist()
+
+    # Empty titles carry no meaning to compare; they stay on their own.
+    candidates = [i for i, key in enumerate(keys) if key]
+    texts = [keys[i] for i in candidates]
+
+    vectors = np.concatenate([
+        get_embeddings(texts[start:start + EMBED_CHUNK_SIZE])
+        for start in range(0, len(texts), EMBED_CHUNK_SIZE)
+    ]) if texts else np.zeros((0, 0), dtype=np.float32)
+
+    units = l2_normalize(vectors)
+    roots = np.arange(len(keys))
+    roots[candidates] = np.asarray(candidates)[cluster_rows(units, threshold)]
+
+    # Key each group is merged under: its first title, or a group kept
+    # by an earlier call.
+    group_keys = {root: keys[root] for root in set(roots.tolist())}
+
+    if state is not None and candidates:
+        if len(state):
+            best_ids, best_scores = state.index.best_matches(units)
+            top = {}
+            for i, best_id, score in zip(candidates, best_ids.tolist(), best_scores.tolist()):
+                root = int(roots[i])
+                if score >= threshold and score > top.get(root, 0.0):
+                    top[root] = score
+                    group_keys[root] = state.keys[best_id]
+        state.add(units, [group_keys[int(roots[i])] for i in candidates])
+
+    merged = {}
+    for key, root in zip(keys, roots.tolist()):
+        merged.setdefault(group_keys[root], []).extend(clusters[key])
+
+    kept = [root == i and group_keys[root] == keys[i] for i, root in enumerate(roots.tolist())]
+    return unique_df[np.asarray(kept, dtype=bool)], merged
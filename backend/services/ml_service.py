@@ -2,9 +2,8 @@
 
 import re
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
 
-from backend.services.embedding_service import get_embedding
+from backend.services.embedding_service import get_embedding, l2_normalize
 
 
 # --------------------------
@@ -49,9 +48,9 @@ def find_duplicates(new_title: str, threshold: float = 0.80):
         if not embeddings:
             return None, 0.0
 
-        embeddings = np.vstack(embeddings)
+        embeddings = l2_normalize(np.vstack(embeddings))
 
-        similarities = cosine_similarity([new_embedding], embeddings)[0]
+        similarities = embeddings @ l2_normalize(new_embedding)
 
         max_idx = int(np.argmax(similarities))
         max_score = float(similarities[max_idx])
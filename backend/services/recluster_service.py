@@ -0,0 +1,161 @@
+# services/recluster_service.py
+
+import os
+import tempfile
+from typing import Callable, Optional
+
+import numpy as np
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from database.models import Title
+from backend.utils.text_cleaner import clean_text
+from backend.services.embedding_service import l2_normalize
+from backend.services.similarity import cluster_rows
+from backend.services.cluster_service import rebuild_clusters
+
+# Rows read or written per statement.
+RECLUSTER_BATCH_SIZE = int(os.getenv("RECLUSTER_BATCH_SIZE", "2000"))
+
+Progress = Callable[..., None]
+
+
+def _no_progress(phase: str, done: Optional[int] = None, total: Optional[int] = None):
+    pass
+
+
+def recluster_titles(
+    db: Session,
+    threshold: float,
+    progress: Optional[Progress] = None,
+    batch_size: int = RECLUSTER_BATCH_SIZE,
+) -> dict:
+    """
+    Rebuilds every cluster from the stored embeddings, independent of the
+    order rows were inserted in or the threshold in force at the time.
+
+    1. Unit vectors are streamed from the table, oldest first, into a
+       temporary memory-mapped file.
+    2. similar_pairs scores it in fixed-size tiles and union-find merges
+       every pair scoring >= threshold (connected components).
+    3. Each component takes the cleaned title of its oldest member as its
+       normalized_title; that member is the primary. Changed rows are
+       written back in batches, then the clusters table is rebuilt.
+
+    Memory is bounded by the tile size and one int per row; the vectors
+    live in the memory map. Rows inserted while the job runs keep their
+    assignment. progress(phase, done, total) is called along the way.
+    """
+    progress = progress or _no_progress
+
+    total = db.query(Title.id).count()
+    progress("loading", 0, total)
+
+    with tempfile.TemporaryDirectory(prefix="recluster-") as tmp:
+        ids, units = _load_units(db, os.path.join(tmp, "units.f32"), total, batch_size, progress)
+
+        progress("scoring", 0, len(ids))
+        roots = cluster_rows(units, threshold, lambda done, n: progress("scoring", done, n))
+        del units
+
+    changed = _write_back(db, ids, roots, batch_size, progress)
+
+    progress("clusters", None, None)
+    clusters = rebuild_clusters(db)
+
+    progress("done", len(ids), len(ids))
+    return {
+        "titles": len(ids),
+        "clusters": clusters,
+        "changed": changed,
+        "threshold": threshold,
+    }
+
+
+def _load_units(db: Session, path: str, total: int, batch_size: int, progress: Progress):
+    """
+    Writes the L2-normalized embeddings, ordered by (created_at, id), to a
+    float32 memory map. Rows without a usable embedding get a zero vector
+    (they match nothing). Returns (ids, memmap).
+    """
+    query = (
+        db.query(Title.id, Title.embedding)
+        .order_by(Title.created_at.asc(), Title.id.asc())
+        .yield_per(batch_size)
+    )
+
+    ids = np.zeros(total, dtype=np.int64)
+    units = None
+    dim = None
+    n = 0
+
+    for title_id, blob in query:
+        vec = np.frombuffer(blob, dtype=np.float32) if blob else None
+
+        if dim is None and vec is not None and len(vec):
+            dim = len(vec)
+            units = np.memmap(path, dtype=np.float32, mode="w+", shape=(max(total, 1), dim))
+
+        if n == len(ids):
+            # Rows inserted since the count; they are left as they are.
+            break
+
+        ids[n] = title_id
+        if units is not None and vec is not None and len(vec) == dim:
+            units[n] = l2_normalize(vec)
+        n += 1
+
+        if n % batch_size == 0:
+            progress("loading", n, total)
+
+    if units is None:
+        units = np.zeros((n, 1), dtype=np.float32)
+
+    return ids[:n], units[:n]
+
+
+def _write_back(db: Session, ids: np.ndarray, roots: np.ndarray, batch_size: int, progress: Progress) -> int:
+    """
+    Assigns normalized_title / is_duplicate from the components, in
+    batches of ids (position order), updating only rows that change.
+    Commits per batch. Returns the number of rows changed.
+    """
+    sizes = np.bincount(roots, minlength=len(roots))
+    keys = {}
+    changed = 0
+
+    for start in range(0, len(ids), batch_size):
+        batch_ids = ids[start:start + batch_size].tolist()
+        rows = {
+            row.id: row
+            for row in db.query(Title.id, Title.title, Title.normalized_title, Title.is_duplicate)
+            .filter(Title.id.in_(batch_ids))
+        }
+
+        updates = []
+        for pos, title_id in enumerate(batch_ids, start=start):
+            row = rows.get(title_id)
+            if row is None:
+                continue    # deleted meanwhile
+
+            root = int(roots[pos])
+            if sizes[root] == 1:
+                key, is_duplicate = clean_text(row.title), 0
+            elif root in keys:
+                key, is_duplicate = keys[root], 1
+            else:
+                # The oldest surviving member names the component.
+                key, is_duplicate = clean_text(row.title), 0
+                keys[root] = key
+
+            if (key, is_duplicate) != (row.normalized_title, row.is_duplicate):
+                updates.append({"id": title_id, "normalized_title": key, "is_duplicate": is_duplicate})
+
+        if updates:
+            db.execute(update(Title), updates)
+        db.commit()
+
+        changed += len(updates)
+        progress("writing", min(start + batch_size, len(ids)), len(ids))
+
+    return changed
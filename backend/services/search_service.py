@@ -0,0 +1,93 @@
+# services/search_service.py
+
+from typing import List, Optional, Tuple
+
+from sqlalchemy import column, func, inspect, table, text
+from sqlalchemy.orm import Query, Session
+
+from database.models import Title
+
+# Trigram indexes cannot match anything shorter; those queries use LIKE.
+MIN_INDEXED_QUERY = 3
+
+_titles_fts = table("titles_fts", column("rowid"), column("rank"))
+
+# Search backend per engine URL: "fts5", "pg_trgm" or "like".
+_backends = {}
+
+
+def search_backend(db: Session) -> str:
+    engine = db.get_bind()
+    key = str(engine.url)
+
+    if key not in _backends:
+        dialect = engine.dialect.name
+        if dialect == "sqlite" and inspect(engine).has_table("titles_fts"):
+            _backends[key] = "fts5"
+        elif dialect == "postgresql":
+            _backends[key] = "pg_trgm"
+        else:
+            _backends[key] = "like"
+
+    return _backends[key]
+
+
+def _fts_phrase(q: str) -> str:
+    # One quoted phrase: trigram MATCH is then a substring test, and no
+    # user input is parsed as FTS5 query syntax.
+    return '"' + q.replace('"', '""') + '"'
+
+
+def search_query(db: Session, query: Query, q: str) -> Tuple[Query, Optional[list]]:
+    """
+    Restricts a Title query to rows whose title or normalized_title
+    contains q (case-insensitive). Returns (query, ranking) where ranking
+    is the ORDER BY for best matches first, or None for the LIKE fallback.
+
+    - SQLite : FTS5 trigram table titles_fts, ranked by bm25
+    - Postgres: pg_trgm GIN indexes serve ILIKE, ranked by similarity()
+    - otherwise, or q shorter than 3 characters: ILIKE scan
+    """
+    backend = search_backend(db)
+
+    if backend == "fts5" and len(q) >= MIN_INDEXED_QUERY:
+        query = (
+            query.join(_titles_fts, _titles_fts.c.rowid == Title.id)
+            .filter(text("titles_fts MATCH :fts_query").bindparams(fts_query=_fts_phrase(q)))
+        )
+        return query, [_titles_fts.c.rank.asc(), Title.id.desc()]
+
+    pattern = f"%{q}%"
+    query = query.filter(Title.title.ilike(pattern) | Title.normalized_title.ilike(pattern))
+
+    if backend == "pg_trgm" and len(q) >= MIN_INDEXED_QUERY:
+        score = func.greatest(
+            func.similarity(Title.title, q),
+            func.similarity(Title.normalized_title, q),
+        )
+        return query, [score.desc(), Title.id.desc()]
+
+    return query, None
+
+
+def search_titles(
+    db: Session,
+    q: str,
+    duplicates: Optional[bool] = None,
+    offset: int = 0,
+    limit: int = 20,
+) -> Tuple[int, List[Title]]:
+    """
+    One page of ranked search results and the total number of matches.
+    """
+    query = db.query(Title)
+    if duplicates is not None:
+        query = query.filter(Title.is_duplicate == (1 if duplicates else 0))
+
+    query, ranking = search_query(db, query, q)
+
+    total = query.count()
+    if ranking is not None:
+        query = query.order_by(*ranking)
+
+    return total, query.offset(offset).limit(limit).all()
@@ -0,0 +1,130 @@
+# services/similarity.py
+
+import math
+from typing import Callable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+# Upper bound on one block of pairwise scores (~64 MB of float32).
+BLOCK_ELEMENTS = 1 << 24
+
+
+def best_earlier_matches(units: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    For every row i of a unit-vector matrix, the earlier row j < i with
+    the highest cosine score; the first such row wins ties. Scored in
+    blocks of rows, so the full N x N matrix is never materialized.
+
+    Returns (positions, scores); position -1 means no earlier row scored
+    above 0 (row 0 never has a match).
+    """
+    units = np.asarray(units, dtype=np.float32)
+    n = len(units)
+
+    best = np.full(n, -1, dtype=np.int64)
+    scores = np.zeros(n, dtype=np.float32)
+
+    step = max(1, BLOCK_ELEMENTS // max(n, 1))
+    for start in range(1, n, step):
+        stop = min(start + step, n)
+
+        # Rows [start, stop) only ever look at columns [0, stop).
+        block = units[start:stop] @ units[:stop].T
+        later = np.arange(stop)[None, :] >= np.arange(start, stop)[:, None]
+        block[later] = -np.inf
+
+        cols = np.argmax(block, axis=1)
+        best[start:stop] = cols
+        scores[start:stop] = block[np.arange(stop - start), cols]
+
+    none = scores <= 0.0
+    best[none] = -1
+    scores[none] = 0.0
+    return best, scores
+
+
+def similar_pairs(
+    units: np.ndarray,
+    threshold: float,
+    progress: Optional[Callable[[int, int], None]] = None,
+) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Every pair (i, j), i < j, of a unit-vector matrix whose cosine score is
+    at least threshold, yielded as (rows, cols) arrays one tile at a time.
+    Tiles are bands of rows against slices of the columns after them, each
+    at most BLOCK_ELEMENTS scores, so memory does not grow with the number
+    of rows. units may be a np.memmap; each band is read once and the
+    columns are streamed past it.
+
+    progress(rows_done, n) is called after each band.
+    """
+    n = len(units)
+    band = max(1, min(n, math.isqrt(BLOCK_ELEMENTS)))
+    width = max(1, BLOCK_ELEMENTS // band)
+
+    for start in range(0, n - 1, band):
+        stop = min(start + band, n)
+        rows_block = np.asarray(units[start:stop], dtype=np.float32)
+
+        # Columns before start were paired with these rows in earlier bands.
+        for col_start in range(start, n, width):
+            col_stop = min(col_start + width, n)
+            block = rows_block @ np.asarray(units[col_start:col_stop], dtype=np.float32).T
+
+            rows, cols = np.nonzero(block >= threshold)
+            rows += start
+            cols += col_start
+
+            upper = cols > rows
+            if upper.any():
+                yield rows[upper], cols[upper]
+
+        if progress is not None:
+            progress(stop, n)
+
+
+class UnionFind:
+    """
+    Disjoint sets over 0..n-1. The smallest member of a set is its root,
+    so with rows in input order a cluster is named after its first row.
+    """
+
+    def __init__(self, n: int):
+        self.parent: List[int] = list(range(n))
+
+    def find(self, i: int) -> int:
+        parent = self.parent
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(self, a: int, b: int) -> bool:
+        ra, rb = self.find(a), self.find(b)
+        if ra == rb:
+            return False
+        if ra < rb:
+            self.parent[rb] = ra
+        else:
+            self.parent[ra] = rb
+        return True
+
+    def roots(self) -> np.ndarray:
+        return np.array([self.find(i) for i in range(len(self.parent))], dtype=np.int64)
+
+
+def cluster_rows(
+    units: np.ndarray,
+    threshold: float,
+    progress: Optional[Callable[[int, int], None]] = None,
+) -> np.ndarray:
+    """
+    Groups the rows of a unit-vector matrix into connected components of
+    the "score >= threshold" graph. Returns each row's root: the first
+    row of its cluster (a row that matched nothing is its own root).
+    """
+    uf = UnionFind(len(units))
+    for rows, cols in similar_pairs(units, threshold, progress):
+        for a, b in zip(rows.tolist(), cols.tolist()):
+            uf.union(a, b)
+    return uf.roots()
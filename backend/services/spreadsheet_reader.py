@@ -0,0 +1,122 @@
+# services/spreadsheet_reader.py
+
+import os
+from itertools import islice
+from pathlib import Path
+from typing import Iterator, Optional
+
+import pandas as pd
+
+# Rows per chunk handed to the bulk upload pipeline.
+READ_CHUNK_SIZE = int(os.getenv("BULK_READ_CHUNK_SIZE", "10000"))
+
+
+def iter_title_chunks(
+    path: str,
+    chunk_size: int = READ_CHUNK_SIZE,
+    skip_rows: int = 0,
+) -> Iterator[pd.DataFrame]:
+    """
+    Streams the first column of a spreadsheet as DataFrames of at most
+    chunk_size rows, so memory stays bounded by the chunk, not the file.
+
+    skip_rows drops that many leading data rows, counted the same way as
+    the rows yielded, so a consumer can resume from a row offset.
+
+    - .csv  : pandas chunked reader
+    - .xlsx : openpyxl read-only mode (rows parsed lazily from the zip)
+    - .xls  : no streaming reader exists for the legacy format; the file
+              is loaded with pandas and then sliced into chunks
+    """
+    ext = Path(path).suffix.lower()
+
+    if ext == ".csv":
+        yield from _skip(_iter_csv(path, chunk_size), skip_rows)
+    elif ext == ".xls":
+        yield from _skip(_iter_frame(pd.read_excel(path, usecols=[0]), chunk_size), skip_rows)
+    else:
+        yield from _iter_xlsx(path, chunk_size, skip_rows)
+
+
+def estimate_rows(path: str) -> Optional[int]:
+    """
+    Cheap estimate of the data rows in a spreadsheet, for progress
+    reporting only. None when it cannot be known without parsing.
+
+    - .csv  : line count minus the header (quoted newlines overcount)
+    - .xlsx : sheet dimension recorded in the workbook, when present
+    """
+    ext = Path(path).suffix.lower()
+
+    if ext == ".csv":
+        lines = 0
+        last = b"\n"
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                lines += block.count(b"\n")
+                last = block[-1:]
+        if last != b"\n":
+            lines += 1
+        return max(lines - 1, 0)
+
+    if ext == ".xlsx":
+        from openpyxl import load_workbook
+
+        wb = load_workbook(path, read_only=True)
+        try:
+            max_row = wb.active.max_row
+        finally:
+            wb.close()
+        return max(max_row - 1, 0) if max_row else None
+
+    return None
+
+
+def _skip(chunks, skip_rows: int):
+    # pandas' skiprows counts blank lines that the parser otherwise drops,
+    # so skipping is done on the parsed chunks instead.
+    for chunk in chunks:
+        if skip_rows >= len(chunk):
+            skip_rows -= len(chunk)
+            continue
+        if skip_rows:
+            chunk = chunk.iloc[skip_rows:]
+            skip_rows = 0
+        yield chunk
+
+
+def _iter_csv(path: str, chunk_size: int):
+    for chunk in pd.read_csv(path, usecols=[0], chunksize=chunk_size):
+        yield chunk
+
+
+def _iter_frame(df: pd.DataFrame, chunk_size: int):
+    for start in range(0, len(df), chunk_size):
+        yield df.iloc[start:start + chunk_size]
+
+
+def _iter_xlsx(path: str, chunk_size: int, skip_rows: int = 0):
+    from openpyxl import load_workbook
+
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = wb.active.iter_rows(max_col=1, values_only=True)
+
+        header = next(rows, None)
+        if header is None:
+            return
+
+        # Mirror pandas' header handling for a blank first cell.
+        column = header[0] if header[0] is not None else "Unnamed: 0"
+
+        values = []
+        for row in islice(rows, skip_rows, None):
+            values.append(row[0] if row else None)
+            if len(values) >= chunk_size:
+                yield pd.DataFrame({column: values})
+                values = []
+
+        if values:
+            yield pd.DataFrame({column: values})
+    finally:
+        wb.close()
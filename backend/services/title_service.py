@@ -1,56 +1,82 @@
+import os
+
 from sqlalchemy.orm import Session
-from sklearn.metrics.pairwise import cosine_similarity
 import numpy as np
 import pandas as pd
 
-from backend.utils.text_cleaner import clean_text
-from backend.services.embedding_service import get_embedding
+from backend.utils.text_cleaner import clean_text, clean_series
+from backend.services.embedding_service import (
+    get_embedding,
+    get_embeddings,
+    l2_normalize,
+    EMBED_CHUNK_SIZE,
+)
+from backend.services.similarity import best_earlier_matches
+from backend.services.title_writer import insert_titles
+from backend.services.cluster_service import add_member, add_members
+from backend.services.counter_service import read_counters, titles_changed, TITLES, CLUSTERS
+from backend.services.vector_index import get_vector_index
 from database.models import Title
 
 SIMILARITY_THRESHOLD = 0.85
+SIMILAR_THRESHOLD = 0.75
+SIMILAR_TITLES_K = 10
+SIMILAR_TITLES_MAX_K = 200
 
+# Quantized indexes: candidates rescored in full precision, and how far
+# below the threshold an approximate score may fall and still be rescored.
+RESCORE_CANDIDATES = int(os.getenv("RESCORE_CANDIDATES", "32"))
+RESCORE_MARGIN = float(os.getenv("RESCORE_MARGIN", "0.02"))
 
-def _find_best_match(db: Session, vec: np.ndarray):
-    best_score = 0.0
-    best_row = None
 
-    rows = db.query(Title).all()
+def _rescore(db: Session, index, vec: np.ndarray, ids):
+    """
+    Exact cosine scores for candidate ids, computed from the full-precision
+    Title.embedding column. Returns [(row, score)] best first.
+    """
+    rows = db.query(Title).filter(Title.id.in_(list(ids))).all()
+    found = {row.id for row in rows}
+    index.remove_many(i for i in ids if i not in found)
 
-    for row in rows:
-        if not row.embedding:
-            continue
+    query = np.asarray(vec, dtype=np.float32)
+    query_norm = float(np.linalg.norm(query))
 
-        try:
-            stored = np.frombuffer(row.embedding, dtype=np.float32)
-            score = float(cosine_similarity([vec], [stored])[0][0])
-        except Exception:
+    scored = []
+    for row in rows:
+        stored = np.frombuffer(row.embedding, dtype=np.float32)
+        if stored.shape != query.shape:
             continue
+        norm = query_norm * float(np.linalg.norm(stored))
+        score = float(stored @ query) / norm if norm else 0.0
+        scored.append((row, score))
 
-        if score > best_score:
-            best_score = score
-            best_row = row
-
-    return best_row, best_score
+    # Ties go to the oldest id, as with the original row-by-row scan.
+    return sorted(scored, key=lambda x: (-x[1], x[0].id))
 
 
-def enforce_single_primary(db: Session, normalized_title: str):
-    rows = (
-        db.query(Title)
-        .filter(Title.normalized_title == normalized_title)
-        .order_by(Title.created_at.asc())
-        .all()
-    )
+def _find_best_match(db: Session, vec: np.ndarray, exclude_id: int | None = None):
+    index = get_vector_index()
+    index.ensure_loaded(db)
 
-    if not rows:
-        return
+    if index.needs_rescore:
+        ids, _ = index.search(vec, k=RESCORE_CANDIDATES + 1)
+        ids = [i for i in ids.tolist() if i != exclude_id]
+        for row, score in _rescore(db, index, vec, ids)[:1]:
+            if score > 0.0:
+                return row, score
+        return None, 0.0
 
-    primary = rows[0]
-    primary.is_duplicate = 0
+    while True:
+        best_id, best_score = index.best_match(vec, exclude_id=exclude_id)
+        if best_id is None:
+            return None, 0.0
 
-    for r in rows[1:]:
-        r.is_duplicate = 1
+        best_row = db.get(Title, best_id)
+        if best_row is not None:
+            return best_row, best_score
 
-    db.commit()
+        # Row was removed behind the index's back; drop it and retry.
+        index.remove(best_id)
 
 
 def save_title(db: Session, item):
@@ -77,10 +103,15 @@ def save_title(db: Session, item):
     )
 
     db.add(obj)
+    db.flush()
+
+    # The cluster row and counters commit with the insert.
+    add_member(db, obj)
+    titles_changed(db, 1, len(raw))
     db.commit()
     db.refresh(obj)
 
-    enforce_single_primary(db, normalized)
+    get_vector_index().add(obj.id, vec)
 
     return obj
 
@@ -92,6 +123,55 @@ def check_duplicate(db: Session, item, threshold: float = SIMILARITY_THRESHOLD):
     vec = np.array(get_embedding(cleaned), dtype=np.float32)
     best_row, best_score = _find_best_match(db, vec)
 
+    return _duplicate_result(best_row, best_score, threshold)
+
+
+def check_duplicates_batch(db: Session, items, threshold: float = SIMILARITY_THRESHOLD):
+    """
+    check_duplicate for many titles: one batched embedding call and one
+    matrix-matrix scoring pass. Results are in input order.
+    """
+    cleaned = [clean_text(item.title) for item in items]
+    vectors = get_embeddings(cleaned)
+
+    return [
+        _duplicate_result(best_row, best_score, threshold)
+        for best_row, best_score in _find_best_matches(db, vectors)
+    ]
+
+
+def _find_best_matches(db: Session, vectors):
+    """
+    _find_best_match for many vectors: one matrix-matrix scoring pass and
+    one query for the matched rows. Returns [(row | None, score)] in order.
+    """
+    index = get_vector_index()
+    index.ensure_loaded(db)
+
+    if index.needs_rescore:
+        return [_find_best_match(db, vec) for vec in vectors]
+
+    best_ids, best_scores = index.best_matches(vectors)
+    matched = {i for i in best_ids.tolist() if i >= 0}
+    rows = {
+        row.id: row
+        for row in db.query(Title).filter(Title.id.in_(matched)).all()
+    }
+
+    results = []
+    for vec, best_id, best_score in zip(vectors, best_ids.tolist(), best_scores.tolist()):
+        if best_id < 0:
+            results.append((None, 0.0))
+        elif best_id in rows:
+            results.append((rows[best_id], best_score))
+        else:
+            # Stale index entry; the single-title path drops it and retries.
+            results.append(_find_best_match(db, vec))
+
+    return results
+
+
+def _duplicate_result(best_row, best_score: float, threshold: float):
     return {
         "duplicate": bool(best_row and best_score >= threshold),
         "score": round(best_score, 3),
@@ -100,28 +180,66 @@ def check_duplicate(db: Session, item, threshold: float = SIMILARITY_THRESHOLD):
     }
 
 
-def find_similar_titles(db: Session, item, threshold: float = 0.75):
+def find_similar_titles(
+    db: Session,
+    item,
+    threshold: float = SIMILAR_THRESHOLD,
+    k: int | None = SIMILAR_TITLES_K,
+):
+    """
+    Returns the k most similar titles scoring at least threshold,
+    best first. Only the selected rows are loaded from the database.
+    """
     raw = item.title
     cleaned = clean_text(raw)
 
     vec = np.array(get_embedding(cleaned), dtype=np.float32)
-    results = []
 
-    for row in db.query(Title).all():
-        try:
-            stored = np.frombuffer(row.embedding, dtype=np.float32)
-            score = float(cosine_similarity([vec], [stored])[0][0])
-        except Exception:
-            continue
+    index = get_vector_index()
+    index.ensure_loaded(db)
 
-        if score >= threshold:
-            results.append({
-                "id": row.id,
-                "title": row.title,
-                "score": round(score, 3),
-            })
+    if index.needs_rescore:
+        ids, _ = index.search(
+            vec,
+            k=k + RESCORE_CANDIDATES if k else None,
+            threshold=threshold - RESCORE_MARGIN,
+        )
+        scored = [
+            (row, score)
+            for row, score in _rescore(db, index, vec, ids.tolist())
+            if score >= threshold
+        ]
+        return [
+            {"id": row.id, "title": row.title, "score": round(score, 3)}
+            for row, score in scored[:k]
+        ]
+
+    ids, scores = index.search(vec, k=k, threshold=threshold)
+    if ids.size == 0:
+        return []
+
+    rows = {
+        row.id: row
+        for row in (
+            db.query(Title.id, Title.title)
+            .filter(Title.id.in_(ids.tolist()))
+            .all()
+        )
+    }
 
-    return sorted(results, key=lambda x: x["score"], reverse=True)
+    results = []
+    for title_id, score in zip(ids.tolist(), scores.tolist()):
+        row = rows.get(title_id)
+        if row is None:
+            index.remove(title_id)
+            continue
+        results.append({
+            "id": title_id,
+            "title": row.title,
+            "score": round(score, 3),
+        })
+
+    return results
 
 
 def process_bulk_titles(db: Session, df: pd.DataFrame):
@@ -132,41 +250,67 @@ def process_bulk_titles(db: Session, df: pd.DataFrame):
     }
 
     titles = df["title"].dropna().astype(str).tolist()
+    index = get_vector_index()
+
+    for start in range(0, len(titles), EMBED_CHUNK_SIZE):
+        chunk = titles[start:start + EMBED_CHUNK_SIZE]
+        cleaned_chunk = clean_series(pd.Series(chunk, dtype=object)).tolist()
+        vectors = get_embeddings(cleaned_chunk)
+        units = l2_normalize(vectors)
+
+        # Phase 1: the whole chunk against the committed corpus.
+        corpus = _find_best_matches(db, vectors)
+
+        # Phase 2: each row against the earlier rows of the chunk, which
+        # the sequential loop would already have inserted.
+        earlier, earlier_scores = best_earlier_matches(units)
+
+        rows = []
+
+        for pos, (raw, cleaned, vec) in enumerate(zip(chunk, cleaned_chunk, vectors)):
+            summary["processed"] += 1
+
+            best_row, best_score = corpus[pos]
+            normalized = best_row.normalized_title if best_row else None
+
+            # First wins: the corpus sits before the chunk in the index, so
+            # it keeps ties, and j is the first of any tied earlier rows.
+            j = int(earlier[pos])
+            if j >= 0 and earlier_scores[pos] > best_score:
+                best_score = float(earlier_scores[pos])
+                normalized = rows[j]["normalized_title"]
+
+            if normalized is not None and best_score >= SIMILARITY_THRESHOLD:
+                is_duplicate = 1
+                summary["duplicates"] += 1
+            else:
+                normalized = cleaned
+                is_duplicate = 0
+                summary["saved"] += 1
+
+            rows.append({
+                "title": raw,
+                "normalized_title": normalized,
+                "embedding": vec.tobytes(),
+                "is_duplicate": is_duplicate,
+            })
 
-    for raw in titles:
-        summary["processed"] += 1
-        cleaned = clean_text(raw)
-
-        vec = np.array(get_embedding(cleaned), dtype=np.float32)
-        best_row, best_score = _find_best_match(db, vec)
-
-        if best_row and best_score >= SIMILARITY_THRESHOLD:
-            normalized = best_row.normalized_title
-            is_duplicate = 1
-            summary["duplicates"] += 1
-        else:
-            normalized = cleaned
-            is_duplicate = 0
-            summary["saved"] += 1
-
-        obj = Title(
-            title=raw,
-            normalized_title=normalized,
-            embedding=vec.tobytes(),
-            is_duplicate=is_duplicate,
-        )
-
-        db.add(obj)
+        # One transaction per chunk: batched INSERTs, then the touched
+        # clusters and primary flags in bulk.
+        ids = insert_titles(db, rows)
+        add_members(db, [
+            (title_id, row["normalized_title"], row["is_duplicate"])
+            for title_id, row in zip(ids, rows)
+        ])
+        titles_changed(db, len(rows), sum(len(row["title"]) for row in rows))
         db.commit()
 
-        enforce_single_primary(db, normalized)
+        index.add_many(zip(ids, vectors))
 
     return summary
 
 
 def count_duplicates(db: Session):
-    return (
-        db.query(Title)
-        .filter(Title.is_duplicate == 1)
-        .count()
-    )
+    # One non-duplicate (the primary) per cluster.
+    counters = read_counters(db)
+    return counters[TITLES] - counters[CLUSTERS]
@@ -0,0 +1,61 @@
+# services/title_writer.py
+
+import os
+from typing import Iterable, List
+
+from sqlalchemy import case, insert, select, update
+from sqlalchemy.orm import Session, aliased
+
+from database.models import Title
+
+# Rows per INSERT statement on ingest paths.
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "500"))
+
+# normalized_title values per bookkeeping UPDATE; keeps the IN list well
+# under SQLite's bound-parameter limit.
+_KEYS_PER_UPDATE = 500
+
+
+def insert_titles(db: Session, rows: List[dict], batch_size: int = INGEST_BATCH_SIZE) -> List[int]:
+    """
+    Inserts title rows with Core multi-row INSERTs, batch_size rows per
+    statement, inside the caller's transaction (nothing is committed).
+
+    rows: dicts with title, normalized_title, embedding, is_duplicate.
+    Returns the new ids in the same order as rows.
+    """
+    stmt = insert(Title).returning(Title.id, sort_by_parameter_order=True)
+    ids = []
+
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start:start + batch_size]
+        ids.extend(db.execute(stmt, batch).scalars().all())
+
+    return ids
+
+
+def refresh_primaries(db: Session, normalized_titles: Iterable[str]):
+    """
+    Full recompute of the primary flags: for every given cluster the
+    oldest row (created_at, then id) becomes the primary and every other
+    member a duplicate. One UPDATE per batch of clusters, no commit.
+    """
+    keys = list(dict.fromkeys(normalized_titles))
+    first = aliased(Title)
+
+    primary_id = (
+        select(first.id)
+        .where(first.normalized_title == Title.normalized_title)
+        .order_by(first.created_at.asc(), first.id.asc())
+        .limit(1)
+        .scalar_subquery()
+    )
+
+    for start in range(0, len(keys), _KEYS_PER_UPDATE):
+        batch = keys[start:start + _KEYS_PER_UPDATE]
+        db.execute(
+            update(Title)
+            .where(Title.normalized_title.in_(batch))
+            .values(is_duplicate=case((Title.id == primary_id, 0), else_=1))
+            .execution_options(synchronize_session=False)
+        )
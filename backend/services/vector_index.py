@@ -0,0 +1,427 @@
+# services/vector_index.py
+
+import logging
+import os
+from threading import Lock
+from typing import Iterable, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from database.models import Title
+
+logger = logging.getLogger(__name__)
+
+_INITIAL_CAPACITY = 1024
+
+
+def _unit(vec: np.ndarray) -> np.ndarray:
+    vec = np.asarray(vec, dtype=np.float32).ravel()
+    norm = float(np.linalg.norm(vec))
+    if norm == 0.0:
+        return vec
+    return vec / norm
+
+
+def rows_after(db: Session, after_id: int):
+    """
+    (id, vector) for titles with id > after_id, i.e. rows committed since an
+    index last looked - possibly by another process such as a queue worker.
+    """
+    latest = db.query(func.max(Title.id)).scalar() or 0
+    if latest <= after_id:
+        return []
+
+    return [
+        (title_id, np.frombuffer(blob, dtype=np.float32))
+        for title_id, blob in (
+            db.query(Title.id, Title.embedding)
+            .filter(Title.id > after_id)
+            .order_by(Title.id.asc())
+        )
+        if blob
+    ]
+
+
+def top_k(ids: np.ndarray, scores: np.ndarray, k: Optional[int], threshold: Optional[float]):
+    if k is not None and k <= 0:
+        return ids[:0], scores[:0]
+
+    if threshold is not None:
+        mask = scores >= threshold
+        ids, scores = ids[mask], scores[mask]
+
+    if k is not None and scores.size > k:
+        part = np.argpartition(-scores, k - 1)[:k]
+        ids, scores = ids[part], scores[part]
+
+    order = np.argsort(-scores, kind="stable")
+    return ids[order], scores[order]
+
+
+class VectorIndex:
+    """
+    Process-wide exact cosine index over all title embeddings.
+
+    Vectors are kept L2-normalized in one contiguous float32 matrix
+    (row i belongs to ids[i]), so a best-match query is a single
+    matrix-vector product instead of a per-row table scan.
+    """
+
+    dtype = np.float32
+
+    # Scores are exact, so callers never need to rescore candidates.
+    needs_rescore = False
+
+    def __init__(self):
+        self._lock = Lock()
+        self._matrix = np.empty((0, 0), dtype=np.float32)
+        self._ids = np.empty(0, dtype=np.int64)
+        self._positions = {}
+        self._size = 0
+        self._dim = None
+        self._synced_id = 0
+        self.loaded = False
+
+    def __len__(self):
+        return self._size
+
+    # --------------------------
+    # Loading
+    # --------------------------
+    def load(self, db: Session):
+        rows = (
+            db.query(Title.id, Title.embedding)
+            .yield_per(10_000)
+        )
+
+        with self._lock:
+            self._reset()
+            for title_id, blob in rows:
+                self._synced_id = max(self._synced_id, title_id)
+                if blob:
+                    self._add(title_id, np.frombuffer(blob, dtype=np.float32))
+            self.loaded = True
+
+        logger.info("Vector index loaded with %d embeddings", self._size)
+
+    def ensure_loaded(self, db: Session):
+        if not self.loaded:
+            self.load(db)
+        else:
+            self.sync(db)
+
+    def sync(self, db: Session):
+        """
+        Picks up titles inserted by other processes since the last load or
+        sync. Rows this process added itself are simply re-added.
+        """
+        items = rows_after(db, self._synced_id)
+        if not items:
+            return
+
+        with self._lock:
+            for title_id, vec in items:
+                self._add(title_id, vec)
+            self._synced_id = max(self._synced_id, items[-1][0])
+
+    def save(self):
+        # Exact index is rebuilt from the titles table on startup.
+        pass
+
+    def snapshot(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns copies of (ids, unit vectors) currently held.
+        """
+        with self._lock:
+            return self._ids[:self._size].copy(), self._rows(0, self._size)
+
+    def _reset(self):
+        self._matrix = np.empty((0, 0), dtype=np.float32)
+        self._ids = np.empty(0, dtype=np.int64)
+        self._positions = {}
+        self._size = 0
+        self._dim = None
+        self._synced_id = 0
+
+    # --------------------------
+    # Mutations
+    # --------------------------
+    def add(self, title_id: int, vec):
+        with self._lock:
+            self._add(title_id, vec)
+
+    def add_many(self, items: Iterable[Tuple[int, object]]):
+        with self._lock:
+            for title_id, vec in items:
+                self._add(title_id, vec)
+
+    def remove(self, title_id: int):
+        with self._lock:
+            self._remove(title_id)
+
+    def remove_many(self, title_ids: Iterable[int]):
+        with self._lock:
+            for title_id in title_ids:
+                self._remove(title_id)
+
+    def _add(self, title_id: int, vec):
+        # Rows this process adds itself need no re-read on the next sync.
+        self._synced_id = max(self._synced_id, title_id)
+        vec = _unit(vec)
+
+        if title_id in self._positions:
+            self._remove(title_id)
+
+        if self._dim is None or self._size == 0:
+            self._dim = vec.shape[0]
+        elif vec.shape[0] != self._dim:
+            logger.debug(
+                "Skipping embedding for title %s: dim %d != %d",
+                title_id, vec.shape[0], self._dim
+            )
+            return
+
+        if self._size == self._matrix.shape[0] or self._matrix.shape[1] != self._dim:
+            self._grow()
+
+        self._write_row(self._size, vec)
+        self._ids[self._size] = title_id
+        self._positions[title_id] = self._size
+        self._size += 1
+
+    def _grow(self):
+        capacity = max(_INITIAL_CAPACITY, self._matrix.shape[0] * 2)
+        matrix = np.zeros((capacity, self._dim), dtype=self.dtype)
+        ids = np.zeros(capacity, dtype=np.int64)
+
+        if self._size and self._matrix.shape[1] == self._dim:
+            matrix[:self._size] = self._matrix[:self._size]
+            ids[:self._size] = self._ids[:self._size]
+
+        self._matrix = matrix
+        self._ids = ids
+
+    def _remove(self, title_id: int):
+        pos = self._positions.pop(title_id, None)
+        if pos is None:
+            return
+
+        last = self._size - 1
+        if pos != last:
+            # Swap the last row into the hole to keep the matrix dense.
+            moved_id = int(self._ids[last])
+            self._move_row(pos, last)
+            self._ids[pos] = moved_id
+            self._positions[moved_id] = pos
+
+        self._size = last
+
+    # --------------------------
+    # Row storage (overridden by quantized indexes)
+    # --------------------------
+    def _write_row(self, pos: int, vec: np.ndarray):
+        self._matrix[pos] = vec
+
+    def _move_row(self, dst: int, src: int):
+        self._matrix[dst] = self._matrix[src]
+
+    def _rows(self, start: int, stop: int) -> np.ndarray:
+        return self._matrix[start:stop].copy()
+
+    def _row_scores(self, query: np.ndarray) -> np.ndarray:
+        return self._matrix[:self._size] @ query
+
+    # --------------------------
+    # Queries
+    # --------------------------
+    def scores(self, vec) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns (ids, cosine scores) for every indexed title.
+        """
+        query = _unit(vec)
+
+        with self._lock:
+            if self._size == 0 or query.shape[0] != self._dim:
+                return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+            scores = self._row_scores(query)
+            ids = self._ids[:self._size].copy()
+
+        return ids, scores
+
+    def search(
+        self,
+        vec,
+        k: Optional[int] = None,
+        threshold: Optional[float] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns (ids, scores) of the best matches, highest score first.
+        k=None returns every match at or above threshold.
+        """
+        ids, scores = self.scores(vec)
+        return top_k(ids, scores, k, threshold)
+
+    def best_match(self, vec, exclude_id: Optional[int] = None) -> Tuple[Optional[int], float]:
+        ids, scores = self.scores(vec)
+
+        if exclude_id is not None:
+            scores[ids == exclude_id] = -np.inf
+
+        if scores.size == 0:
+            return None, 0.0
+
+        idx = int(np.argmax(scores))
+        best = float(scores[idx])
+
+        if best <= 0.0:
+            return None, 0.0
+
+        return int(ids[idx]), best
+
+    def best_matches(self, vectors) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        best_match for many queries at once: one matrix-matrix product per
+        block of queries. Returns (ids, scores); id -1 means no match.
+        """
+        queries = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries = queries / np.where(norms == 0, 1, norms)
+
+        best_ids = np.full(len(queries), -1, dtype=np.int64)
+        best_scores = np.zeros(len(queries), dtype=np.float32)
+
+        with self._lock:
+            if self._size == 0 or queries.ndim != 2 or queries.shape[1] != self._dim:
+                return best_ids, best_scores
+
+            # Keep each (rows x queries) score block around 64 MB.
+            step = max(1, (1 << 24) // self._size)
+            for start in range(0, len(queries), step):
+                scores = self._row_scores(queries[start:start + step].T)
+                idx = np.argmax(scores, axis=0)
+                best_scores[start:start + step] = scores[idx, np.arange(scores.shape[1])]
+                best_ids[start:start + step] = self._ids[idx]
+
+        none = best_scores <= 0.0
+        best_ids[none] = -1
+        best_scores[none] = 0.0
+        return best_ids, best_scores
+
+
+def best_matches_by_row(index, vectors) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Fallback best_matches for indexes without a batched query path.
+    """
+    matches = [index.best_match(vec) for vec in vectors]
+    ids = np.array([-1 if i is None else i for i, _ in matches], dtype=np.int64)
+    scores = np.array([s for _, s in matches], dtype=np.float32)
+    return ids, scores
+
+
+class QuantizedVectorIndex(VectorIndex):
+    """
+    VectorIndex holding compact rows: float16, or int8 with one float32
+    scale per vector (~2x / ~4x less memory than float32).
+
+    Scores are approximate, so callers rescore the top candidates in
+    full precision from Title.embedding (needs_rescore).
+    """
+
+    needs_rescore = True
+
+    # Rows converted back to float32 per step while scoring.
+    _SCORE_BLOCK = 16_384
+
+    def __init__(self, dtype: str = "int8"):
+        if dtype not in ("float16", "int8"):
+            raise ValueError(f"Unsupported quantized dtype: {dtype}")
+        self.dtype = np.dtype(dtype)
+        self._scales = np.empty(0, dtype=np.float32)
+        super().__init__()
+
+    def _reset(self):
+        super()._reset()
+        self._scales = np.empty(0, dtype=np.float32)
+
+    def _grow(self):
+        super()._grow()
+        scales = np.ones(self._matrix.shape[0], dtype=np.float32)
+        keep = min(self._size, self._scales.shape[0])
+        scales[:keep] = self._scales[:keep]
+        self._scales = scales
+
+    def _write_row(self, pos: int, vec: np.ndarray):
+        if self.dtype == np.int8:
+            peak = float(np.abs(vec).max()) if vec.size else 0.0
+            scale = peak / 127.0 if peak > 0 else 1.0
+            self._matrix[pos] = np.round(vec / scale).astype(np.int8)
+            self._scales[pos] = scale
+        else:
+            self._matrix[pos] = vec.astype(np.float16)
+
+    def _move_row(self, dst: int, src: int):
+        self._matrix[dst] = self._matrix[src]
+        self._scales[dst] = self._scales[src]
+
+    def _rows(self, start: int, stop: int) -> np.ndarray:
+        rows = self._matrix[start:stop].astype(np.float32)
+        if self.dtype == np.int8:
+            rows *= self._scales[start:stop, None]
+        return rows
+
+    def _row_scores(self, query: np.ndarray) -> np.ndarray:
+        scores = np.empty((self._size,) + query.shape[1:], dtype=np.float32)
+        for start in range(0, self._size, self._SCORE_BLOCK):
+            stop = min(start + self._SCORE_BLOCK, self._size)
+            scores[start:stop] = self._matrix[start:stop].astype(np.float32) @ query
+        if self.dtype == np.int8:
+            scales = self._scales[:self._size]
+            scores *= scales.reshape(scales.shape + (1,) * (query.ndim - 1))
+        return scores
+
+
+# ==========================================================
+# Process-wide index
+# ==========================================================
+
+VECTOR_INDEX_BACKEND = os.getenv("VECTOR_INDEX_BACKEND", "exact").lower()
+
+# Row format for the exact backend: float32 | float16 | int8
+VECTOR_INDEX_DTYPE = os.getenv("VECTOR_INDEX_DTYPE", "float32").lower()
+
+_vector_index = None
+_index_lock = Lock()
+
+
+def _create_index():
+    if VECTOR_INDEX_BACKEND == "exact":
+        if VECTOR_INDEX_DTYPE != "float32":
+            return QuantizedVectorIndex(VECTOR_INDEX_DTYPE)
+        return VectorIndex()
+
+    if VECTOR_INDEX_BACKEND == "mmap":
+        from backend.services.vector_store import MemmapVectorStore
+        return MemmapVectorStore()
+
+    from backend.services.ann_index import IVFIndex, HNSWIndex
+
+    if VECTOR_INDEX_BACKEND == "ivf":
+        return IVFIndex()
+    if VECTOR_INDEX_BACKEND == "hnsw":
+        return HNSWIndex()
+
+    raise RuntimeError(f"Unknown VECTOR_INDEX_BACKEND: {VECTOR_INDEX_BACKEND}")
+
+
+def get_vector_index():
+    global _vector_index
+
+    if _vector_index is None:
+        with _index_lock:
+            if _vector_index is None:
+                _vector_index = _create_index()
+
+    return _vector_index
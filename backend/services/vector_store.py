@@ -0,0 +1,309 @@
+# services/vector_store.py
+
+import fcntl
+import json
+import logging
+import os
+from contextlib import contextmanager
+from pathlib import Path
+from threading import Lock
+from typing import Iterable, Optional, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from database.connection import DATA_DIR, DB_STEM
+from database.models import Title
+from backend.services.vector_index import best_matches_by_row, top_k, _unit
+from backend.services.ann_index import _corpus_fingerprint
+
+logger = logging.getLogger(__name__)
+
+# Rewrite the store on startup once this share of slots is tombstoned.
+MMAP_COMPACT_RATIO = float(os.getenv("MMAP_COMPACT_RATIO", "0.5"))
+
+_ID = np.dtype(np.int64)
+_VEC = np.dtype(np.float32)
+
+
+def default_store_path() -> Path:
+    override = os.getenv("VECTOR_STORE_PATH")
+    if override:
+        return Path(override)
+
+    return DATA_DIR / f"{DB_STEM}.vectors"
+
+
+class MemmapVectorStore:
+    """
+    Append-only embedding store shared between processes through the OS
+    page cache.
+
+    Four sidecar files next to the database:
+      <base>.f32   unit float32 vectors, one row per slot
+      <base>.ids   int64 title id per slot (its length commits a slot)
+      <base>.tomb  one byte per slot, 1 = deleted or superseded
+      <base>.json  header ({"dim": ...})
+
+    Every slot is appended under an exclusive flock; deletes only flip
+    tombstone bytes. Searches run over read-only np.memmap views, and
+    each process remaps when the ids file grows or is replaced by a
+    compaction in another worker.
+    """
+
+    backend = "mmap"
+    needs_rescore = False
+
+    def __init__(self, path: Optional[Path] = None):
+        base = Path(path) if path else default_store_path()
+        self._vec_path = base.with_name(base.name + ".f32")
+        self._ids_path = base.with_name(base.name + ".ids")
+        self._tomb_path = base.with_name(base.name + ".tomb")
+        self._meta_path = base.with_name(base.name + ".json")
+        self._lock_path = base.with_name(base.name + ".lock")
+
+        self._lock = Lock()
+        self._dim = None
+        self._size = 0
+        self._stamp = None
+        self._slots = {}
+        self._vectors = None
+        self._ids = None
+        self._tomb = None
+        self.loaded = False
+
+    def __len__(self):
+        return len(self._slots)
+
+    def __contains__(self, title_id):
+        return title_id in self._slots
+
+    # --------------------------
+    # Files and locking
+    # --------------------------
+    @contextmanager
+    def _file_lock(self, mode=fcntl.LOCK_EX):
+        self._lock_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self._lock_path, "a") as f:
+            fcntl.flock(f, mode)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _read_dim(self):
+        if not self._meta_path.exists():
+            return None
+        return json.loads(self._meta_path.read_text())["dim"]
+
+    def _file_stamp(self):
+        try:
+            st = os.stat(self._ids_path)
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_size
+
+    def _refresh(self):
+        """
+        Remap when another process appended rows or compacted the files.
+        Caller holds self._lock.
+        """
+        if self._file_stamp() == self._stamp:
+            return
+
+        with self._file_lock(fcntl.LOCK_SH):
+            self._refresh_locked()
+
+    def _remap(self, replaced: bool):
+        self._stamp = self._file_stamp()
+        self._dim = self._read_dim()
+
+        if self._stamp is None or self._dim is None:
+            self._size = 0
+            self._slots = {}
+            self._vectors = self._ids = self._tomb = None
+            return
+
+        size = min(
+            self._stamp[1] // _ID.itemsize,
+            os.path.getsize(self._tomb_path),
+            os.path.getsize(self._vec_path) // (self._dim * _VEC.itemsize),
+        )
+
+        if replaced:
+            self._slots = {}
+            start = 0
+        else:
+            start = self._size
+
+        if size == 0:
+            self._size = 0
+            self._vectors = self._ids = self._tomb = None
+            return
+
+        self._vectors = np.memmap(self._vec_path, dtype=_VEC, mode="r", shape=(size, self._dim))
+        self._ids = np.memmap(self._ids_path, dtype=_ID, mode="r", shape=(size,))
+        self._tomb = np.memmap(self._tomb_path, dtype=np.uint8, mode="r", shape=(size,))
+
+        new_ids = np.asarray(self._ids[start:size])
+        live = np.asarray(self._tomb[start:size]) == 0
+        for offset in np.flatnonzero(live).tolist():
+            self._slots[int(new_ids[offset])] = start + offset
+
+        # Deletes made by other processes since the last full remap only
+        # show up in the tombstone map; searches mask them there.
+        self._size = size
+
+    # --------------------------
+    # Loading
+    # --------------------------
+    def load(self, db: Session):
+        fingerprint = _corpus_fingerprint(db)
+
+        with self._lock:
+            with self._file_lock():
+                self._remap(replaced=True)
+
+                live_max = max(self._slots, default=0)
+                tombstoned = self._size - len(self._slots)
+                stale = (len(self._slots), live_max) != fingerprint
+                bloated = self._size and tombstoned / self._size > MMAP_COMPACT_RATIO
+
+                if stale or bloated:
+                    self._rewrite(
+                        (title_id, np.frombuffer(blob, dtype=np.float32))
+                        for title_id, blob in db.query(Title.id, Title.embedding).yield_per(10_000)
+                        if blob
+                    )
+                    self._remap(replaced=True)
+
+            self.loaded = True
+
+        logger.info("Vector store mapped with %d live embeddings", len(self._slots))
+
+    def ensure_loaded(self, db: Session):
+        if not self.loaded:
+            self.load(db)
+
+    def save(self):
+        # Every write already lands in the sidecar files.
+        pass
+
+    def _rewrite(self, items):
+        """
+        Replace all files with a compact copy. Caller holds the exclusive flock.
+        """
+        tmp = {p: p.with_name(p.name + ".tmp") for p in (self._vec_path, self._ids_path, self._tomb_path)}
+        dim = None
+
+        with open(tmp[self._vec_path], "wb") as vf, open(tmp[self._ids_path], "wb") as idf, \
+                open(tmp[self._tomb_path], "wb") as tf:
+            for title_id, vec in items:
+                vec = _unit(vec)
+                if dim is None:
+                    dim = vec.shape[0]
+                elif vec.shape[0] != dim:
+                    continue
+                vf.write(vec.tobytes())
+                idf.write(np.int64(title_id).tobytes())
+                tf.write(b"\x00")
+
+        if dim is not None:
+            self._meta_path.write_text(json.dumps({"dim": dim}))
+        else:
+            self._meta_path.unlink(missing_ok=True)
+
+        # ids last: its inode change tells other processes to remap.
+        os.replace(tmp[self._vec_path], self._vec_path)
+        os.replace(tmp[self._tomb_path], self._tomb_path)
+        os.replace(tmp[self._ids_path], self._ids_path)
+
+    # --------------------------
+    # Mutations
+    # --------------------------
+    def add(self, title_id: int, vec):
+        self.add_many([(title_id, vec)])
+
+    def add_many(self, items: Iterable[Tuple[int, object]]):
+        items = [(title_id, _unit(vec)) for title_id, vec in items]
+        if not items:
+            return
+
+        with self._lock, self._file_lock():
+            self._refresh_locked()
+
+            dim = self._dim
+            if dim is None:
+                dim = items[0][1].shape[0]
+                self._meta_path.write_text(json.dumps({"dim": dim}))
+
+            rows = [(i, v) for i, v in items if v.shape[0] == dim]
+            self._tombstone([i for i, _ in rows])
+
+            with open(self._vec_path, "ab") as vf, open(self._tomb_path, "ab") as tf:
+                vf.write(b"".join(v.tobytes() for _, v in rows))
+                tf.write(b"\x00" * len(rows))
+            with open(self._ids_path, "ab") as idf:
+                idf.write(np.array([i for i, _ in rows], dtype=_ID).tobytes())
+
+            self._remap(replaced=False)
+
+    def remove(self, title_id: int):
+        self.remove_many([title_id])
+
+    def remove_many(self, title_ids: Iterable[int]):
+        with self._lock, self._file_lock():
+            self._refresh_locked()
+            self._tombstone(title_ids)
+
+    def _refresh_locked(self):
+        # Caller holds self._lock and a flock.
+        stamp = self._file_stamp()
+        if stamp != self._stamp:
+            replaced = self._stamp is None or stamp is None or stamp[0] != self._stamp[0]
+            self._remap(replaced)
+
+    def _tombstone(self, title_ids: Iterable[int]):
+        slots = [self._slots.pop(i) for i in title_ids if i in self._slots]
+        if not slots:
+            return
+
+        fd = os.open(self._tomb_path, os.O_WRONLY)
+        try:
+            for slot in slots:
+                os.pwrite(fd, b"\x01", slot)
+        finally:
+            os.close(fd)
+
+    # --------------------------
+    # Queries
+    # --------------------------
+    def search(self, vec, k: Optional[int] = None, threshold: Optional[float] = None):
+        query = _unit(vec)
+
+        with self._lock:
+            self._refresh()
+
+            if not self._slots or query.shape[0] != self._dim:
+                return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+            scores = np.asarray(self._vectors @ query)
+            scores[np.asarray(self._tomb) != 0] = -np.inf
+            ids = np.asarray(self._ids)
+
+        return top_k(ids, scores, k, threshold)
+
+    def best_match(self, vec, exclude_id: Optional[int] = None) -> Tuple[Optional[int], float]:
+        ids, scores = self.search(vec, k=2)
+
+        for title_id, score in zip(ids.tolist(), scores.tolist()):
+            if title_id == exclude_id:
+                continue
+            if score <= 0.0:
+                break
+            return title_id, score
+
+        return None, 0.0
+
+    def best_matches(self, vectors):
+        return best_matches_by_row(self, vectors)
@@ -1,15 +1,92 @@
 import re
 import os
 
+import pandas as pd
+
 IGNORE_NUMBERS = os.getenv("IGNORE_NUMBERS", "true").lower() == "true"
 
+_DIGITS = re.compile(r"\d+")
+_PUNCT = re.compile(r"[^\w\s]")
+_SPACES = re.compile(r"\s+")
+
+# Row separator for clean_series. NUL is neither a word, space nor digit
+# character, and is neither cased nor case-ignorable, so no step of
+# clean_text can move text across it.
+_SEP = "\x00"
+
+
 def clean_text(text: str) -> str:
     text = text.lower()
 
     if IGNORE_NUMBERS:
-        text = re.sub(r"\d+", "", text)
+        text = _DIGITS.sub("", text)
 
-    text = re.sub(r"[^\w\s]", " ", text)
-    text = re.sub(r"\s+", " ", text)
+    text = _PUNCT.sub(" ", text)
+    text = _SPACES.sub(" ", text)
 
     return text.strip()
+
+
+def _clean_char(ch: str) -> str:
+    """
+    clean_text's regex passes applied to a single character: digits are
+    dropped, punctuation and whitespace become a plain space.
+    """
+    if IGNORE_NUMBERS and _DIGITS.match(ch):
+        return ""
+    if _PUNCT.match(ch) or _SPACES.match(ch):
+        return " "
+    return ch
+
+
+# UTF-8 never reuses ASCII bytes inside multi-byte sequences, so ASCII
+# characters can be rewritten with one bytes.translate over the buffer.
+_ASCII = bytes(range(128))
+_ASCII_DELETE = bytes(b for b in _ASCII if chr(b) != _SEP and _clean_char(chr(b)) == "")
+_ASCII_SPACES = bytes(b for b in _ASCII if chr(b) != _SEP and _clean_char(chr(b)) == " ")
+_ASCII_TABLE = bytes.maketrans(_ASCII_SPACES, b" " * len(_ASCII_SPACES))
+
+
+def clean_series(series: pd.Series) -> pd.Series:
+    """
+    clean_text for a whole Series of strings, with identical output.
+
+    Every step of clean_text except the final strip is per character, so
+    the rows are joined into one buffer and each step runs once over it
+    in C: str.lower, then on the UTF-8 bytes a translate for ASCII, one
+    replace per distinct non-ASCII character that changes, and a
+    split/join to collapse and strip spaces. The buffer is then split
+    back into rows.
+    """
+    values = series.tolist()
+
+    text = _SEP.join(values)
+
+    # A NUL inside a title would be cleaned to a space; keep those rare
+    # inputs (and empty input) on the row-by-row path.
+    if not values or text.count(_SEP) != len(values) - 1:
+        return series.map(clean_text)
+
+    data = text.lower().encode("utf-8", "surrogatepass")
+    data = data.translate(_ASCII_TABLE, _ASCII_DELETE)
+
+    # UTF-8 is self-synchronizing, so replacing a character's full byte
+    # sequence cannot match inside another character.
+    if not data.isascii():
+        others = data.translate(None, _ASCII).decode("utf-8", "surrogatepass")
+        for ch in set(others):
+            cleaned = _clean_char(ch)
+            if cleaned != ch:
+                data = data.replace(
+                    ch.encode("utf-8", "surrogatepass"),
+                    cleaned.encode("utf-8"),
+                )
+
+    # Only plain spaces are left, so bytes.split() collapses runs and
+    # strips. Padding the separators keeps them as tokens of their own.
+    sep = _SEP.encode()
+    data = b" ".join(data.replace(sep, b" " + sep + b" ").split())
+    data = data.replace(b" " + sep, sep).replace(sep + b" ", sep)
+
+    rows = data.decode("utf-8", "surrogatepass").split(_SEP)
+    return pd.Series(rows, index=series.index, name=series.name)
@@ -0,0 +1 @@
+# Durable job queue and worker processes.
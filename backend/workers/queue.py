@@ -0,0 +1,182 @@
+# workers/queue.py
+
+import json
+import os
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Optional
+
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.orm import Session
+
+from database.models import BulkUploadRun, Job
+
+# Attempts per job before it is marked failed.
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+
+# Delay before the first retry; doubled for every further attempt.
+JOB_RETRY_DELAY = float(os.getenv("JOB_RETRY_DELAY", "30"))
+
+# A running job whose worker has not sent a heartbeat for this long is
+# assumed lost (crash, restart) and handed to another worker.
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "300"))
+
+
+def enqueue(db: Session, kind: str, payload: dict, max_attempts: int = JOB_MAX_ATTEMPTS) -> Job:
+    """
+    Adds a job in the caller's transaction; it becomes visible to the
+    workers when the caller commits.
+    """
+    job = Job(
+        kind=kind,
+        payload=json.dumps(payload),
+        status="queued",
+        max_attempts=max_attempts,
+        run_after=datetime.utcnow(),
+    )
+    db.add(job)
+    db.flush()
+    return job
+
+
+def _claimable(now: datetime):
+    lease_expired = now - timedelta(seconds=JOB_LEASE_SECONDS)
+    return or_(
+        and_(Job.status == "queued", Job.run_after <= now),
+        and_(Job.status == "running", Job.locked_at < lease_expired),
+    )
+
+
+def claim_next(db: Session, worker: str) -> Optional[Job]:
+    """
+    Atomically moves the oldest runnable job to running for this worker.
+    The conditional UPDATE only succeeds for one worker, so concurrent
+    claims never run a job twice; losers simply try the next candidate.
+    """
+    while True:
+        now = datetime.utcnow()
+        job_id = db.execute(
+            select(Job.id).where(_claimable(now)).order_by(Job.id.asc()).limit(1)
+        ).scalar()
+        if job_id is None:
+            return None
+
+        claimed = db.execute(
+            update(Job)
+            .where(Job.id == job_id, _claimable(now))
+            .values(
+                status="running",
+                locked_by=worker,
+                locked_at=now,
+                attempts=Job.attempts + 1,
+                updated_at=now,
+            )
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.commit()
+
+        if not claimed:
+            continue
+
+        job = db.get(Job, job_id)
+        db.refresh(job)
+
+        if job.attempts > job.max_attempts:
+            # Reclaimed after its last attempt's worker was lost.
+            finish(db, job, error=job.last_error or "Worker lost while running the job")
+            continue
+
+        return job
+
+
+def heartbeat(db: Session, job_id: int, worker: str):
+    db.execute(
+        update(Job)
+        .where(Job.id == job_id, Job.locked_by == worker, Job.status == "running")
+        .values(locked_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+
+
+def report_progress(db: Session, job_id: int, phase: str, done: Optional[int] = None, total: Optional[int] = None):
+    db.execute(
+        update(Job)
+        .where(Job.id == job_id)
+        .values(phase=phase, progress_done=done, progress_total=total, updated_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+
+
+def finish(db: Session, job: Job, error: Optional[str] = None):
+    """
+    Records the outcome of an attempt. Failed attempts are queued again
+    with exponential backoff until max_attempts is reached.
+    """
+    now = datetime.utcnow()
+    job.locked_by = None
+    job.locked_at = None
+    job.updated_at = now
+
+    if error is None:
+        job.status = "completed"
+        job.finished_at = now
+    elif job.attempts < job.max_attempts:
+        job.status = "queued"
+        job.last_error = error
+        job.run_after = now + timedelta(seconds=JOB_RETRY_DELAY * 2 ** (job.attempts - 1))
+    else:
+        job.status = "failed"
+        job.last_error = error
+        job.finished_at = now
+        _fail_bulk_upload_run(db, job, error, now)
+
+    db.commit()
+
+
+def _fail_bulk_upload_run(db: Session, job: Job, error: str, now: datetime):
+    """
+    A bulk upload job that fails for good takes its BulkUploadRun with it,
+    in the same transaction. The handler does this itself on its last
+    attempt, but not when its worker was lost and the job is failed on
+    reclaim; the run would otherwise stay "processing" forever.
+    """
+    if job.kind != "bulk_upload":
+        return
+
+    payload = json.loads(job.payload or "{}")
+    run_id = payload.get("run_id")
+    run = db.get(BulkUploadRun, run_id) if run_id is not None else None
+    if run is None or run.status in ("completed", "failed"):
+        return
+
+    run.status = "failed"
+    run.phase = "failed"
+    run.error = error[:500]
+    run.finished_at = now
+    run.updated_at = now
+
+    # Nothing will read the run's upload again.
+    if payload.get("file_path"):
+        Path(payload["file_path"]).unlink(missing_ok=True)
+
+
+def job_to_dict(job: Job) -> dict:
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "payload": json.loads(job.payload or "{}"),
+        "status": job.status,
+        "attempts": job.attempts,
+        "max_attempts": job.max_attempts,
+        "run_after": job.run_after.isoformat() if job.run_after else None,
+        "locked_by": job.locked_by,
+        "last_error": job.last_error,
+        "phase": job.phase,
+        "progress_done": job.progress_done,
+        "progress_total": job.progress_total,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "updated_at": job.updated_at.isoformat() if job.updated_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
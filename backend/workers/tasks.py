@@ -0,0 +1,36 @@
+# workers/tasks.py
+
+import logging
+
+from database.connection import SessionLocal
+from backend.services.bulk_upload_service import run_bulk_upload
+from backend.services.recluster_service import recluster_titles
+
+logger = logging.getLogger("clearoid.worker")
+
+
+def bulk_upload(payload: dict, final_attempt: bool, progress):
+    # Bulk uploads report progress on their BulkUploadRun instead.
+    run_bulk_upload(
+        payload["run_id"],
+        payload["file_path"],
+        file_hash=payload.get("file_hash"),
+        final_attempt=final_attempt,
+    )
+
+
+def recluster(payload: dict, final_attempt: bool, progress):
+    db = SessionLocal()
+    try:
+        summary = recluster_titles(db, payload["threshold"], progress=progress)
+        logger.info("Recluster finished: %s", summary)
+    finally:
+        db.close()
+
+
+# Job kind -> handler(payload, final_attempt, progress). Handlers raise to
+# fail the attempt; progress(phase, done, total) updates the job row.
+TASKS = {
+    "bulk_upload": bulk_upload,
+    "recluster": recluster,
+}
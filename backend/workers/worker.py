@@ -0,0 +1,200 @@
+"""
+Queue worker entry point.
+
+Usage:
+    python -m backend.workers.worker [--workers N] [--poll-interval SECONDS]
+                                     [--embed-workers M]
+
+Runs N worker processes that claim jobs from the jobs table and execute
+them, independently of the API process.
+
+Each worker process would start its own embedding pool (M processes,
+each loading the model), so N x M model copies in total. Workers
+therefore encode in-process unless --embed-workers / JOB_EMBED_WORKERS
+is set.
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import threading
+from pathlib import Path
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from database.connection import Base, engine, SessionLocal
+from database.migrations import run_migrations
+from backend.workers.queue import JOB_LEASE_SECONDS, claim_next, finish, heartbeat, report_progress
+from backend.workers.tasks import TASKS
+from backend.services.embedding_pool import shutdown_embedding_pool
+
+logger = logging.getLogger("clearoid.worker")
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1.0"))
+
+# EMBED_WORKERS for each worker process (the API's setting is not inherited).
+JOB_EMBED_WORKERS = int(os.getenv("JOB_EMBED_WORKERS", "0"))
+
+
+class Worker:
+    """
+    Claims one job at a time and runs its handler. While a job runs, a
+    heartbeat thread keeps its lease fresh so other workers leave it alone.
+    """
+
+    def __init__(self, name: str, poll_interval: float = JOB_POLL_INTERVAL):
+        self.name = name
+        self.poll_interval = poll_interval
+
+    def run(self, stop: threading.Event):
+        logger.info("Worker %s started", self.name)
+        while not stop.is_set():
+            if not self.run_once():
+                stop.wait(self.poll_interval)
+        logger.info("Worker %s stopped", self.name)
+
+    def run_once(self) -> bool:
+        """
+        Runs the next ready job, if any. Returns False when the queue is idle.
+        """
+        db = SessionLocal()
+        try:
+            job = claim_next(db, self.name)
+            if job is None:
+                return False
+
+            handler = TASKS.get(job.kind)
+            if handler is None:
+                job.attempts = job.max_attempts
+                finish(db, job, error=f"Unknown job kind: {job.kind}")
+                return True
+
+            logger.info("Job %s (%s) attempt %d/%d", job.id, job.kind, job.attempts, job.max_attempts)
+
+            done = threading.Event()
+            beat = threading.Thread(target=self._heartbeat, args=(job.id, done), daemon=True)
+            beat.start()
+
+            try:
+                handler(
+                    json.loads(job.payload),
+                    final_attempt=job.attempts >= job.max_attempts,
+                    progress=self._progress(job.id),
+                )
+            except Exception as e:
+                logger.exception("Job %s failed", job.id)
+                error = f"{type(e).__name__}: {e}"
+            else:
+                error = None
+            finally:
+                done.set()
+                beat.join()
+
+            db.refresh(job)
+            finish(db, job, error=error)
+            return True
+        finally:
+            db.close()
+
+    @staticmethod
+    def _progress(job_id: int):
+        def report(phase: str, done=None, total=None):
+            db = SessionLocal()
+            try:
+                report_progress(db, job_id, phase, done, total)
+            finally:
+                db.close()
+        return report
+
+    def _heartbeat(self, job_id: int, done: threading.Event):
+        while not done.wait(JOB_LEASE_SECONDS / 3):
+            db = SessionLocal()
+            try:
+                heartbeat(db, job_id, self.name)
+            except Exception:
+                logger.exception("Heartbeat for job %s failed", job_id)
+            finally:
+                db.close()
+
+
+def run_pending(name: str = "inline") -> int:
+    """
+    Runs every job that is ready now in the current process and returns
+    how many ran. Meant for tests and one-off maintenance.
+    """
+    worker = Worker(name)
+    count = 0
+    while worker.run_once():
+        count += 1
+    return count
+
+
+def _configure_logging():
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s | %(levelname)s | %(processName)s | %(name)s | %(message)s",
+    )
+
+
+def _worker_process(index: int, stop, poll_interval: float):
+    _configure_logging()
+    # The parent handles Ctrl+C and sets the stop event; a SIGTERM sent to
+    # the whole process group also just stops after the current job.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+
+    name = f"{socket.gethostname()}:{os.getpid()}:{index}"
+    try:
+        Worker(name, poll_interval).run(stop)
+    finally:
+        shutdown_embedding_pool()
+
+
+def main(argv=None) -> int:
+    _configure_logging()
+
+    parser = argparse.ArgumentParser(prog="python -m backend.workers.worker")
+    parser.add_argument("--workers", type=int, default=JOB_WORKERS)
+    parser.add_argument("--poll-interval", type=float, default=JOB_POLL_INTERVAL)
+    parser.add_argument("--embed-workers", type=int, default=JOB_EMBED_WORKERS)
+    args = parser.parse_args(argv)
+
+    # Read by embedding_pool when the spawned processes import it.
+    os.environ["EMBED_WORKERS"] = str(max(0, args.embed_workers))
+
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+
+    ctx = multiprocessing.get_context("spawn")
+    stop = ctx.Event()
+
+    def _stop(signum, frame):
+        logger.info("Stopping workers...")
+        stop.set()
+
+    signal.signal(signal.SIGINT, _stop)
+    signal.signal(signal.SIGTERM, _stop)
+
+    processes = [
+        ctx.Process(target=_worker_process, args=(i, stop, args.poll_interval), name=f"worker-{i}")
+        for i in range(max(1, args.workers))
+    ]
+    for p in processes:
+        p.start()
+
+    logger.info("Started %d workers", len(processes))
+
+    for p in processes:
+        p.join()
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""Benchmark: row-by-row clean_text vs batched clean_series
+
+Usage:
+    python bench_text_cleaner.py [ROWS]      (default 1,000,000)
+"""
+
+import random
+import sys
+import time
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent))
+
+import pandas as pd
+
+from backend.utils.text_cleaner import clean_text, clean_series
+
+WORDS = [
+    "Deep", "learning", "for", "Crop", "yield", "prediction", "using",
+    "Satellite", "imagery", "A", "survey", "of", "IoT-based", "Smart",
+    "grid", "security", "(2023)", "Vol.", "12", "—", "Résumé", "naïve",
+    "Bayes", "&", "SVM:", "comparative", "study", "Phase-II", "v2.0",
+]
+
+
+def make_titles(n: int) -> pd.Series:
+    rng = random.Random(42)
+    return pd.Series(
+        [" ".join(rng.choices(WORDS, k=rng.randint(4, 12))) for _ in range(n)],
+        dtype=object,
+    )
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+
+    print(f"Generating {n:,} titles...")
+    titles = make_titles(n)
+
+    start = time.perf_counter()
+    expected = titles.apply(clean_text)
+    row_time = time.perf_counter() - start
+    print(f"  Series.apply(clean_text): {row_time:.2f}s")
+
+    start = time.perf_counter()
+    result = clean_series(titles)
+    batch_time = time.perf_counter() - start
+    print(f"  clean_series:             {batch_time:.2f}s")
+
+    if not result.equals(expected):
+        print("❌ Outputs differ")
+        sys.exit(1)
+
+    print(f"✅ Identical output, {row_time / batch_time:.1f}x faster")
+
+
+if __name__ == "__main__":
+    main()
@@ -17,6 +17,12 @@ DATABASE_URL = os.getenv("DATABASE_URL", f"sqlite:///{DEFAULT_DB_PATH}")
 if DATABASE_URL.startswith("sqlite:///"):
     sqlite_target = Path(DATABASE_URL.replace("sqlite:///", "", 1))
     sqlite_target.parent.mkdir(parents=True, exist_ok=True)
+else:
+    sqlite_target = DEFAULT_DB_PATH
+
+# Sidecar files (vector indexes, caches) live next to the database file.
+DATA_DIR = sqlite_target.parent
+DB_STEM = sqlite_target.stem
 
 engine_kwargs = {}
 if DATABASE_URL.startswith("sqlite"):
@@ -0,0 +1,127 @@
+import logging
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.schema import CreateColumn
+
+from database.connection import Base
+
+logger = logging.getLogger(__name__)
+
+
+def add_missing_columns(engine: Engine):
+    """
+    create_all() only creates missing tables. This adds columns that were
+    added to a model after its table was created, using the column's own
+    DDL (type, server default, nullability).
+    """
+    inspector = inspect(engine)
+
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+
+            existing = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+
+                ddl = CreateColumn(column).compile(dialect=engine.dialect)
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {ddl}"))
+                logger.info("Added column %s.%s", table.name, column.name)
+
+
+def add_missing_indexes(engine: Engine):
+    """
+    Like add_missing_columns, for indexes declared on a model after its
+    table was created.
+    """
+    inspector = inspect(engine)
+
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+
+            existing = {i["name"] for i in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name in existing:
+                    continue
+
+                index.create(conn)
+                logger.info("Added index %s", index.name)
+
+
+# SQLite: external-content FTS5 table over titles, trigram tokenizer so
+# MATCH does case-insensitive substring search like the old ILIKE.
+_SQLITE_SEARCH_DDL = [
+    """
+    CREATE VIRTUAL TABLE titles_fts USING fts5(
+        title, normalized_title,
+        content='titles', content_rowid='id',
+        tokenize='trigram'
+    )
+    """,
+    """
+    CREATE TRIGGER titles_fts_ai AFTER INSERT ON titles BEGIN
+        INSERT INTO titles_fts(rowid, title, normalized_title)
+        VALUES (new.id, new.title, new.normalized_title);
+    END
+    """,
+    """
+    CREATE TRIGGER titles_fts_ad AFTER DELETE ON titles BEGIN
+        INSERT INTO titles_fts(titles_fts, rowid, title, normalized_title)
+        VALUES ('delete', old.id, old.title, old.normalized_title);
+    END
+    """,
+    """
+    CREATE TRIGGER titles_fts_au AFTER UPDATE OF title, normalized_title ON titles BEGIN
+        INSERT INTO titles_fts(titles_fts, rowid, title, normalized_title)
+        VALUES ('delete', old.id, old.title, old.normalized_title);
+        INSERT INTO titles_fts(rowid, title, normalized_title)
+        VALUES (new.id, new.title, new.normalized_title);
+    END
+    """,
+    "INSERT INTO titles_fts(titles_fts) VALUES ('rebuild')",
+]
+
+# Postgres: trigram GIN indexes serve ILIKE '%x%' and similarity().
+_POSTGRES_SEARCH_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_titles_title_trgm ON titles USING gin (title gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_titles_normalized_trgm ON titles USING gin (normalized_title gin_trgm_ops)",
+]
+
+
+def create_search_index(engine: Engine):
+    """
+    Full-text index for title search (see backend/services/search_service.py).
+    SQLite builds without FTS5 or the trigram tokenizer (older than 3.34)
+    are skipped with a warning; search then falls back to LIKE scans.
+    """
+    dialect = engine.dialect.name
+
+    if dialect == "sqlite":
+        if inspect(engine).has_table("titles_fts"):
+            return
+        try:
+            with engine.begin() as conn:
+                for ddl in _SQLITE_SEARCH_DDL:
+                    conn.execute(text(ddl))
+        except OperationalError as e:
+            logger.warning("FTS5 trigram index unavailable, search uses LIKE: %s", e)
+            return
+        logger.info("Created search index titles_fts")
+
+    elif dialect == "postgresql":
+        with engine.begin() as conn:
+            for ddl in _POSTGRES_SEARCH_DDL:
+                conn.execute(text(ddl))
+
+
+def run_migrations(engine: Engine):
+    add_missing_columns(engine)
+    add_missing_indexes(engine)
+    create_search_index(engine)
@@ -1,4 +1,7 @@
 from database.models.title import Title
 from database.models.bulk_upload_run import BulkUploadRun
+from database.models.job import Job
+from database.models.cluster import Cluster
+from database.models.stat_counter import StatCounter
 
-__all__ = ["Title", "BulkUploadRun"]
+__all__ = ["Title", "BulkUploadRun", "Job", "Cluster", "StatCounter"]
@@ -14,4 +14,20 @@ class BulkUploadRun(Base):
     saved = Column(Integer, default=0)
     duplicates = Column(Integer, default=0)
 
+    # Job progress: queued -> processing -> completed | failed.
+    # Runs recorded before progress tracking existed migrate as completed.
+    status = Column(String, nullable=False, default="queued", server_default="completed")
+    phase = Column(String, nullable=True)
+    rows_total = Column(Integer, nullable=True)     # estimate; None if unknown
+    rows_done = Column(Integer, nullable=False, default=0, server_default="0")
+    error = Column(String, nullable=True)
+
+    # Resume point: SHA256 of the file being ingested and the data rows
+    # of it already committed. A retry of the same file starts there.
+    checkpoint_hash = Column(String, nullable=True)
+    checkpoint_offset = Column(Integer, nullable=False, default=0, server_default="0")
+
     created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
@@ -0,0 +1,26 @@
+from sqlalchemy import Column, Integer, String, DateTime, Index
+from database.connection import Base
+from datetime import datetime
+
+
+class Cluster(Base):
+    """
+    One row per distinct Title.normalized_title, maintained incrementally
+    by backend/services/cluster_service.py so inserts and deletes do not
+    rescan the cluster's members.
+    """
+    __tablename__ = "clusters"
+
+    id = Column(Integer, primary_key=True)
+    canonical_key = Column(String, unique=True, nullable=False)   # Title.normalized_title
+
+    # Oldest member (created_at, then id); the only one with is_duplicate = 0.
+    primary_title_id = Column(Integer, nullable=True)
+    member_count = Column(Integer, nullable=False, default=0, server_default="0")
+
+    updated_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        # Largest clusters first (admin stats).
+        Index("ix_clusters_member_count", "member_count"),
+    )
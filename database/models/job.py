@@ -0,0 +1,38 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime, Index
+from database.connection import Base
+from datetime import datetime
+
+
+class Job(Base):
+    """
+    Durable background job, claimed by the worker processes in
+    backend/workers (python -m backend.workers.worker).
+    """
+    __tablename__ = "jobs"
+
+    id = Column(Integer, primary_key=True)
+    kind = Column(String, nullable=False)
+    payload = Column(Text, nullable=False, default="{}")   # JSON arguments
+
+    # queued -> running -> completed | failed (queued again between retries)
+    status = Column(String, nullable=False, default="queued")
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=3)
+    run_after = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    locked_by = Column(String, nullable=True)
+    locked_at = Column(DateTime, nullable=True)      # refreshed by the worker's heartbeat
+    last_error = Column(Text, nullable=True)
+
+    # Optional progress reported by the handler while it runs.
+    phase = Column(String, nullable=True)
+    progress_done = Column(Integer, nullable=True)
+    progress_total = Column(Integer, nullable=True)
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_jobs_status_run_after", "status", "run_after"),
+    )
@@ -0,0 +1,14 @@
+from sqlalchemy import Column, BigInteger, String
+from database.connection import Base
+
+
+class StatCounter(Base):
+    """
+    Running totals behind the stats endpoints, one row per counter name.
+    Updated in the same transaction as the writes they count, by
+    backend/services/counter_service.py.
+    """
+    __tablename__ = "counters"
+
+    name = Column(String, primary_key=True)
+    value = Column(BigInteger, nullable=False, default=0, server_default="0")
@@ -1,5 +1,5 @@
 # models/title.py
-from sqlalchemy import Column, Integer, String, Text, DateTime
+from sqlalchemy import Column, Integer, String, Text, DateTime, Index
 from datetime import datetime
 from database.connection import Base
 
@@ -23,3 +23,10 @@ class Title(Base):
 
     # Timestamp for sorting by newest/oldest
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        # Oldest member of a cluster in one index seek (primary promotion).
+        Index("ix_titles_cluster_order", "normalized_title", "created_at", "id"),
+        # Newest titles without a sort over the table.
+        Index("ix_titles_created_id", "created_at", "id"),
+    )
@@ -23,4 +23,9 @@ echo "   Upload:    http://localhost:8000/pages/upload.html"
 echo "   API Docs:  http://localhost:8000/docs"
 echo ""
 
+# Queue workers run bulk uploads; stop them together with the server
+python -m backend.workers.worker &
+WORKER_PID=$!
+trap "kill $WORKER_PID 2>/dev/null" EXIT
+
 uvicorn backend.main:app --reload --host 0.0.0.0 --port 8000
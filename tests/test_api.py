@@ -1,13 +1,16 @@
+import json
 from uuid import uuid4
 
 import numpy as np
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import delete
+from sqlalchemy import delete, func
 
 from backend.main import app
 from database.connection import SessionLocal
-from database.models import Title
+from database.models import Title, BulkUploadRun, Job, Cluster
+from backend.workers.worker import run_pending
+from backend.services.counter_service import read_counters, reconcile_counters
 from backend.routes.auth_routes import User
 
 
@@ -18,20 +21,30 @@ def client(monkeypatch):
         rng = np.random.default_rng(seed)
         return rng.random(8, dtype=np.float32).tolist()
 
+    def fake_embeddings(texts, batch_size=None):
+        return np.array([fake_embedding(t) for t in texts], dtype=np.float32)
+
     monkeypatch.setattr("backend.services.title_service.get_embedding", fake_embedding)
+    monkeypatch.setattr("backend.services.title_service.get_embeddings", fake_embeddings)
     monkeypatch.setattr("backend.routes.title_routes.get_embedding", fake_embedding)
+    monkeypatch.setattr("backend.services.bulk_upload_service.get_embeddings", fake_embeddings)
     return TestClient(app)
 
 
 @pytest.fixture(autouse=True)
 def cleanup_test_rows():
     db = SessionLocal()
+    last_job = db.query(func.max(Job.id)).scalar() or 0
     try:
         yield
     finally:
+        db.execute(delete(Job).where(Job.id > last_job))
         db.execute(delete(Title).where(Title.title.like("TEST_CASE_%")))
+        db.execute(delete(Cluster).where(Cluster.canonical_key.like("test_case_%")))
         db.execute(delete(User).where(User.email.like("test_case_%")))
+        db.execute(delete(BulkUploadRun).where(BulkUploadRun.filename.like("test_case_%")))
         db.commit()
+        reconcile_counters(db)
         db.close()
 
 
@@ -98,3 +111,440 @@ def test_update_delete_and_export(client):
     deleted = client.delete(f"/api/titles/{row_id}")
     assert deleted.status_code == 200
     assert deleted.json()["deleted"] == 1
+
+
+def test_similar_titles_limits_results(client):
+    for _ in range(3):
+        assert client.post("/api/submit", json={"title": "TEST_CASE_Similar Row"}).status_code == 200
+
+    similar = client.post("/api/similar-titles?k=2&threshold=0.9", json={"title": "TEST_CASE_Similar Row"})
+    assert similar.status_code == 200
+    results = similar.json()["results"]
+    assert len(results) == 2
+    assert all(r["score"] >= 0.9 for r in results)
+    assert results[0]["score"] >= results[1]["score"]
+
+    invalid = client.post("/api/similar-titles?k=0", json={"title": "TEST_CASE_Similar Row"})
+    assert invalid.status_code == 422
+
+
+def test_check_duplicate_batch_matches_single_checks(client):
+    value = "TEST_CASE_Batch Existing"
+    assert client.post("/api/submit", json={"title": value}).status_code == 200
+
+    titles = [value, "TEST_CASE_Batch Other", value]
+    batch = client.post("/api/check-duplicate/batch", json={"titles": titles})
+    assert batch.status_code == 200
+    results = batch.json()["results"]
+    assert len(results) == 3
+
+    for title, result in zip(titles, results):
+        single = client.post("/api/check-duplicate", json={"title": title}).json()
+        assert result == single
+    assert results[0]["duplicate"] is True
+
+    empty = client.post("/api/check-duplicate/batch", json={"titles": []})
+    assert empty.status_code == 400
+
+
+def test_stats_counters_follow_writes(client):
+    def submit(title):
+        return client.post("/api/submit", json={"title": title}).json()
+
+    first = submit("TEST_CASE_Counter Alpha")
+    submit("TEST_CASE_Counter Alpha")
+    other = submit("TEST_CASE_Counter Beta")
+
+    client.put(f"/api/titles/{other['id']}", json={"title": "TEST_CASE_Counter Beta renamed"})
+    client.delete(f"/api/titles/{first['id']}")
+
+    content = "title\n" + "".join(f"TEST_CASE_Counter {uuid4().hex}\n" for _ in range(3))
+    client.post("/excel/bulk-upload", files={"file": ("test_case_counter.csv", content.encode(), "text/csv")})
+    run_pending()
+
+    db = SessionLocal()
+    try:
+        live = read_counters(db)
+        assert live == reconcile_counters(db)
+        flagged = db.query(Title).filter(Title.is_duplicate == 1).count()
+        assert live["titles"] - live["clusters"] == flagged
+    finally:
+        db.close()
+
+    stats = client.get("/api/stats").json()
+    assert stats["total"] == live["titles"]
+    assert stats["duplicates"] == client.get("/api/duplicate-count").json()["duplicate_count"]
+    assert client.get("/admin/stats").json()["total_uploads"] == live["uploads"]
+
+
+def test_history_pages_with_cursor_and_streams(client):
+    ids = [
+        client.post("/api/submit", json={"title": f"TEST_CASE_History {i} {uuid4().hex}"}).json()["id"]
+        for i in range(5)
+    ]
+
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        body = client.get("/api/history", params=params).json()
+        assert len(body["data"]) <= 2
+        seen.extend(row["id"] for row in body["data"])
+        cursor = body["next_cursor"]
+        if cursor is None:
+            break
+
+    assert len(seen) == len(set(seen))
+    assert [i for i in seen if i in ids] == ids[::-1]
+    assert body["total"] >= 5 and body["unique"] + body["duplicates"] == body["total"]
+
+    assert client.get("/api/history", params={"limit": 100000}).status_code == 422
+    assert client.get("/api/history", params={"cursor": "not-a-cursor"}).status_code == 400
+
+    with client.stream("GET", "/api/history/stream") as response:
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        streamed = [json.loads(line)["id"] for line in response.iter_lines() if line]
+    assert streamed == seen
+
+
+def test_title_search_uses_index_and_tracks_changes(client):
+    from backend.services.search_service import search_backend, search_query
+
+    tag = uuid4().hex[:8]
+    exact = client.post("/api/submit", json={"title": f"TEST_CASE_Quantum {tag}"}).json()
+    other = client.post("/api/submit", json={"title": f"TEST_CASE_Classical mechanics {tag}"}).json()
+
+    db = SessionLocal()
+    try:
+        assert search_backend(db) == "fts5"
+    finally:
+        db.close()
+
+    def search(q):
+        body = client.get("/api/titles", params={"search": q, "limit": 50}).json()
+        return body["total"], [row["id"] for row in body["data"]]
+
+    assert search(f"QUANTUM {tag}") == (1, [exact["id"]])
+    assert search(tag)[0] == 2
+
+    # Updates and deletes reach the index through the triggers.
+    client.put(f"/api/titles/{other['id']}", json={"title": f"TEST_CASE_Relativity {tag}"})
+    assert search(f"classical mechanics {tag}") == (0, [])
+    assert search(f"relativity {tag}")[1] == [other["id"]]
+
+    client.delete(f"/api/titles/{exact['id']}")
+    assert search(f"quantum {tag}") == (0, [])
+
+    # Shorter than a trigram: unranked LIKE fallback.
+    db = SessionLocal()
+    try:
+        query, ranking = search_query(db, db.query(Title), "Re")
+        assert ranking is None
+        assert other["id"] in {row.id for row in query}
+    finally:
+        db.close()
+
+
+def test_bulk_upload_hashes_streamed_file(client, monkeypatch):
+    import hashlib
+    import backend.routes.excel_routes as excel_routes
+
+    monkeypatch.setattr(excel_routes, "UPLOAD_CHUNK_SIZE", 16)
+    content = "title\n" + "".join(f"TEST_CASE_Bulk {uuid4().hex}\n" for _ in range(5))
+    files = {"file": ("test_case_bulk.csv", content.encode(), "text/csv")}
+
+    first = client.post("/excel/bulk-upload", files=files)
+    assert first.status_code == 200
+    assert first.json()["status"] == "processing"
+    job_id = first.json()["job_id"]
+
+    queued = client.get(f"/jobs/{first.json()['queue_job_id']}").json()
+    assert queued["status"] == "queued"
+    assert run_pending() == 1
+    assert client.get(f"/jobs/{queued['id']}").json()["status"] == "completed"
+
+    job = client.get(f"/excel/jobs/{job_id}").json()
+    assert job["status"] == "completed"
+    assert job["phase"] == "done"
+    assert job["rows_total"] == job["rows_done"] == 5
+
+    again = client.post("/excel/bulk-upload", files=files)
+    body = again.json()
+    assert body["status"] == "already_processed"
+    assert body["saved"] == 5
+
+    db = SessionLocal()
+    try:
+        run = db.query(BulkUploadRun).filter(BulkUploadRun.filename == "test_case_bulk.csv").one()
+        assert run.file_hash == hashlib.sha256(content.encode()).hexdigest()
+    finally:
+        db.close()
+
+
+def test_bulk_upload_skips_titles_already_stored(client, monkeypatch):
+    import backend.services.bulk_upload_service as bulk_upload_service
+
+    monkeypatch.setattr(bulk_upload_service, "READ_CHUNK_SIZE", 2)
+    monkeypatch.setattr(bulk_upload_service, "_KEYS_PER_QUERY", 1)
+
+    names = [f"TEST_CASE_Stored {chr(97 + i)} {uuid4().hex}" for i in range(5)]
+    client.post("/api/submit", json={"title": names[3]})
+
+    # names[0] repeats in a later chunk, names[3] is already in the table.
+    content = "title\n" + "".join(f"{t}\n" for t in names + [names[0].upper()])
+    files = {"file": ("test_case_stored.csv", content.encode(), "text/csv")}
+    body = client.post("/excel/bulk-upload", files=files).json()
+    run_pending()
+
+    job = client.get(f"/excel/jobs/{body['job_id']}").json()
+    assert (job["processed"], job["saved"], job["duplicates"]) == (6, 4, 2)
+
+
+def test_bulk_upload_runs_keep_their_own_files(client):
+    from pathlib import Path
+
+    content = "title\n" + "".join(f"TEST_CASE_Own {uuid4().hex}\n" for _ in range(3))
+    files = {"file": ("test_case_own.csv", content.encode(), "text/csv")}
+
+    client.post("/excel/bulk-upload", files=files)
+    run_pending()
+
+    forced = client.post("/excel/bulk-upload?force_reprocess=true", files=files).json()
+    db = SessionLocal()
+    try:
+        path = Path(json.loads(db.get(Job, forced["queue_job_id"]).payload)["file_path"])
+    finally:
+        db.close()
+
+    # A plain re-upload of the completed file must not delete the queued run's input.
+    assert client.post("/excel/bulk-upload", files=files).json()["status"] == "already_processed"
+    assert path.exists()
+
+    run_pending()
+    assert client.get(f"/excel/jobs/{forced['job_id']}").json()["status"] == "completed"
+    assert not path.exists()
+
+
+def test_bulk_upload_resumes_from_checkpoint(client, monkeypatch):
+    import backend.services.bulk_upload_service as bulk_upload_service
+    import backend.workers.queue as queue
+
+    monkeypatch.setattr(bulk_upload_service, "READ_CHUNK_SIZE", 4)
+    monkeypatch.setattr(queue, "JOB_RETRY_DELAY", 0)
+
+    embedded = []
+    real_embeddings = bulk_upload_service.get_embeddings
+
+    def flaky_embeddings(texts, batch_size=None):
+        if len(embedded) == 4:
+            embedded.append(None)
+            raise RuntimeError("worker died")
+        embedded.extend(texts)
+        return real_embeddings(texts)
+
+    monkeypatch.setattr(bulk_upload_service, "get_embeddings", flaky_embeddings)
+
+    content = "title\n" + "".join(f"TEST_CASE_Resume {uuid4().hex}\n" for _ in range(12))
+    files = {"file": ("test_case_resume.csv", content.encode(), "text/csv")}
+    body = client.post("/excel/bulk-upload", files=files).json()
+    run_pending()
+
+    # The first chunk committed before the failure and was not embedded again.
+    texts = [t for t in embedded if t is not None]
+    assert len(texts) == len(set(texts)) == 12
+
+    assert client.get(f"/jobs/{body['queue_job_id']}").json()["attempts"] == 2
+    job = client.get(f"/excel/jobs/{body['job_id']}").json()
+    assert job["status"] == "completed"
+    assert job["saved"] == 12 and job["duplicates"] == 0
+    assert job["checkpoint_offset"] == job["rows_done"] == 12
+
+
+def test_bulk_semantic_dedupe_spans_chunks(client, monkeypatch):
+    import backend.services.bulk_upload_service as bulk_upload_service
+    import backend.services.excel_deduper as excel_deduper
+    from backend.utils.text_cleaner import clean_text
+
+    tag = uuid4().hex[:8]
+    titles = [
+        f"TEST_CASE_Crop yield {tag} deep learning",
+        f"TEST_CASE_Soil survey {tag}",
+        f"TEST_CASE_Deep learning for crop yield {tag}",
+        f"TEST_CASE_Harbour logistics {tag}",
+    ]
+    rng = np.random.default_rng(4)
+    base = {clean_text(t): rng.normal(size=8) for t in titles}
+    # The first and third titles land in different chunks but mean the same.
+    base[clean_text(titles[2])] = base[clean_text(titles[0])] + rng.normal(scale=0.01, size=8)
+
+    def embeddings(texts, batch_size=None):
+        return np.array([base[t] for t in texts], dtype=np.float32)
+
+    monkeypatch.setattr(bulk_upload_service, "get_embeddings", embeddings)
+    monkeypatch.setattr(excel_deduper, "get_embeddings", embeddings)
+    monkeypatch.setattr(bulk_upload_service, "READ_CHUNK_SIZE", 2)
+    monkeypatch.setattr(bulk_upload_service, "BULK_SEMANTIC_DEDUPE", True)
+
+    content = "title\n" + "".join(f"{t}\n" for t in titles)
+    files = {"file": ("test_case_semantic.csv", content.encode(), "text/csv")}
+    body = client.post("/excel/bulk-upload", files=files).json()
+    run_pending()
+
+    job = client.get(f"/excel/jobs/{body['job_id']}").json()
+    assert (job["status"], job["saved"], job["duplicates"]) == ("completed", 3, 1)
+
+    db = SessionLocal()
+    try:
+        stored = {t for (t,) in db.query(Title.title).filter(Title.title.like(f"%{tag}%"))}
+    finally:
+        db.close()
+    assert stored == {titles[0], titles[1], titles[3]}
+
+
+def test_bulk_semantic_dedupe_survives_resume(client, monkeypatch):
+    import backend.services.bulk_upload_service as bulk_upload_service
+    import backend.services.excel_deduper as excel_deduper
+    import backend.workers.queue as queue
+    from backend.utils.text_cleaner import clean_text
+
+    tag = uuid4().hex[:8]
+    titles = [
+        f"TEST_CASE_Crop yield {tag} deep learning",
+        f"TEST_CASE_Soil survey {tag}",
+        f"TEST_CASE_Harbour logistics {tag}",
+        f"TEST_CASE_Deep learning for crop yield {tag}",
+    ]
+    rng = np.random.default_rng(6)
+    base = {clean_text(t): rng.normal(size=8) for t in titles}
+    base[clean_text(titles[3])] = base[clean_text(titles[0])] + rng.normal(scale=0.01, size=8)
+
+    def embeddings(texts, batch_size=None):
+        return np.array([base[t] for t in texts], dtype=np.float32)
+
+    calls = []
+
+    def flaky_embeddings(texts, batch_size=None):
+        calls.append(texts)
+        if len(calls) == 2:
+            raise RuntimeError("worker died")
+        return embeddings(texts)
+
+    monkeypatch.setattr(bulk_upload_service, "get_embeddings", flaky_embeddings)
+    monkeypatch.setattr(excel_deduper, "get_embeddings", embeddings)
+    monkeypatch.setattr(bulk_upload_service, "READ_CHUNK_SIZE", 2)
+    monkeypatch.setattr(bulk_upload_service, "BULK_SEMANTIC_DEDUPE", True)
+    monkeypatch.setattr(queue, "JOB_RETRY_DELAY", 0)
+
+    # The first chunk commits, the second fails; the retry resumes at row 2
+    # and must still match the last title against the first.
+    content = "title\n" + "".join(f"{t}\n" for t in titles)
+    files = {"file": ("test_case_semantic_resume.csv", content.encode(), "text/csv")}
+    body = client.post("/excel/bulk-upload", files=files).json()
+    run_pending()
+
+    assert client.get(f"/jobs/{body['queue_job_id']}").json()["attempts"] == 2
+    job = client.get(f"/excel/jobs/{body['job_id']}").json()
+    assert (job["status"], job["saved"], job["duplicates"]) == ("completed", 3, 1)
+
+
+def test_bulk_upload_run_fails_when_worker_is_lost(client, monkeypatch):
+    from pathlib import Path
+    import backend.services.bulk_upload_service as bulk_upload_service
+    import backend.workers.queue as queue
+
+    class Killed(BaseException):
+        pass
+
+    def dies(texts, batch_size=None):
+        raise Killed()
+
+    monkeypatch.setattr(bulk_upload_service, "get_embeddings", dies)
+
+    content = "title\n" + "".join(f"TEST_CASE_Lost {uuid4().hex}\n" for _ in range(3))
+    files = {"file": ("test_case_lost.csv", content.encode(), "text/csv")}
+    body = client.post("/excel/bulk-upload", files=files).json()
+
+    db = SessionLocal()
+    try:
+        job = db.get(Job, body["queue_job_id"])
+        assert json.loads(job.payload)["file_hash"]
+        job.max_attempts = 1
+        db.commit()
+    finally:
+        db.close()
+
+    # The worker process dies mid-run: no finish(), the run is left behind.
+    with pytest.raises(Killed):
+        run_pending()
+    assert client.get(f"/excel/jobs/{body['job_id']}").json()["status"] == "processing"
+
+    # Its lease expires and the reclaim finds no attempts left.
+    monkeypatch.setattr(queue, "JOB_LEASE_SECONDS", 0)
+    assert run_pending() == 0
+
+    queued = client.get(f"/jobs/{body['queue_job_id']}").json()
+    assert queued["status"] == "failed"
+    assert not Path(queued["payload"]["file_path"]).exists()
+    run = client.get(f"/excel/jobs/{body['job_id']}").json()
+    assert (run["status"], run["phase"]) == ("failed", "failed")
+    assert run["error"] and run["finished_at"]
+
+    with client.stream("GET", f"/excel/jobs/{body['job_id']}/events") as response:
+        assert '"status": "failed"' in "".join(response.iter_text())
+
+    # A re-upload retries the failed run instead of calling it in progress.
+    again = client.post("/excel/bulk-upload", files=files).json()
+    assert again["job_id"] == body["job_id"] and "queue_job_id" in again
+
+
+def test_job_events_stream_ends_with_final_state(client):
+    content = "title\n" + "".join(f"TEST_CASE_Events {uuid4().hex}\n" for _ in range(3))
+    files = {"file": ("test_case_events.csv", content.encode(), "text/csv")}
+    job_id = client.post("/excel/bulk-upload", files=files).json()["job_id"]
+    run_pending()
+
+    with client.stream("GET", f"/excel/jobs/{job_id}/events") as response:
+        assert response.headers["content-type"].startswith("text/event-stream")
+        body = "".join(response.iter_text())
+
+    events = [block for block in body.split("\n\n") if block.startswith("event: progress")]
+    assert events
+    final = json.loads(events[-1].split("data: ", 1)[1])
+    assert final["status"] == "completed"
+    assert final["saved"] == 3
+
+    assert client.get("/excel/jobs/999999999/events").status_code == 404
+
+
+def test_admin_recluster_runs_as_queue_job(client, monkeypatch, tmp_path):
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    import backend.workers.tasks as tasks
+    from database.connection import Base
+    from database.migrations import run_migrations
+
+    # The job itself re-clusters a scratch database, not the shared one.
+    engine = create_engine(f"sqlite:///{tmp_path / 'titles.db'}")
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+    scratch = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    monkeypatch.setattr(tasks, "SessionLocal", scratch)
+
+    db = scratch()
+    db.add(Title(title="TEST_CASE_Recluster", normalized_title="test_case_recluster",
+                 embedding=np.ones(8, dtype=np.float32).tobytes(), is_duplicate=0))
+    db.commit()
+    db.close()
+
+    queued = client.post("/admin/recluster?threshold=0.9")
+    assert queued.status_code == 200
+    assert queued.json()["kind"] == "recluster"
+    assert client.post("/admin/recluster").status_code == 409
+
+    run_pending()
+
+    job = client.get(f"/jobs/{queued.json()['id']}").json()
+    assert job["status"] == "completed"
+    assert job["phase"] == "done"
+    assert job["progress_done"] == job["progress_total"] >= 1
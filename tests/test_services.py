@@ -1,11 +1,23 @@
+import os
 import numpy as np
+import pandas as pd
 import pytest
-from sqlalchemy import delete
+from sqlalchemy import create_engine, delete
+from sqlalchemy.orm import sessionmaker
 
 from backend.schemas.title_schema import TitleCreate
-from backend.services.title_service import check_duplicate, count_duplicates, save_title
-from database.connection import SessionLocal
-from database.models import Title
+from backend.services.title_service import (
+    SIMILARITY_THRESHOLD,
+    check_duplicate,
+    count_duplicates,
+    process_bulk_titles,
+    save_title,
+)
+from backend.utils.text_cleaner import clean_text
+from database.connection import Base, SessionLocal
+from database.migrations import run_migrations
+from database.models import Title, Cluster
+from backend.services.counter_service import reconcile_counters
 
 
 @pytest.fixture(autouse=True)
@@ -15,7 +27,9 @@ def cleanup_test_rows():
         yield
     finally:
         db.execute(delete(Title).where(Title.title.like("TEST_CASE_%")))
+        db.execute(delete(Cluster).where(Cluster.canonical_key.like("test_case_%")))
         db.commit()
+        reconcile_counters(db)
         db.close()
 
 
@@ -28,6 +42,21 @@ def db_session():
         db.close()
 
 
+@pytest.fixture()
+def isolated_db(tmp_path):
+    """A session on a fresh database file, for tests that rewrite whole tables."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'titles.db'}")
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+
+    db = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    try:
+        yield db
+    finally:
+        db.close()
+        engine.dispose()
+
+
 @pytest.fixture()
 def fake_embedding(monkeypatch):
     def _embed(text: str):
@@ -35,7 +64,11 @@ def fake_embedding(monkeypatch):
         rng = np.random.default_rng(seed)
         return rng.random(8, dtype=np.float32).tolist()
 
+    def _embed_many(texts, batch_size=None):
+        return np.array([_embed(t) for t in texts], dtype=np.float32)
+
     monkeypatch.setattr("backend.services.title_service.get_embedding", _embed)
+    monkeypatch.setattr("backend.services.title_service.get_embeddings", _embed_many)
 
 
 def test_save_title_duplicate_flag(db_session, fake_embedding):
@@ -57,3 +90,542 @@ def test_check_duplicate_and_count(db_session, fake_embedding):
     assert result["score"] >= 0
 
     assert count_duplicates(db_session) >= 1
+
+
+def test_process_bulk_titles_flags_repeats(db_session, monkeypatch):
+    axes = {"test_case_bulk alpha": 0, "test_case_bulk beta": 1}
+
+    def _embed_many(texts, batch_size=None):
+        return np.eye(8, dtype=np.float32)[[axes[t] for t in texts]]
+
+    monkeypatch.setattr("backend.services.title_service.get_embeddings", _embed_many)
+
+    df = pd.DataFrame({"title": [
+        "TEST_CASE_Bulk Alpha",
+        "TEST_CASE_Bulk Beta",
+        "TEST_CASE_Bulk Alpha",
+        None,
+    ]})
+
+    summary = process_bulk_titles(db_session, df)
+    assert summary == {"processed": 3, "duplicates": 1, "saved": 2}
+
+
+def test_best_earlier_matches_blocks_agree_with_loop(monkeypatch):
+    from backend.services import similarity
+
+    rng = np.random.default_rng(7)
+    units = rng.normal(size=(40, 6)).astype(np.float32)
+    units[10] = units[3]
+    units[25] = units[3]
+    units /= np.linalg.norm(units, axis=1, keepdims=True)
+
+    monkeypatch.setattr(similarity, "BLOCK_ELEMENTS", 50)
+    best, scores = similarity.best_earlier_matches(units)
+
+    for i in range(len(units)):
+        expected, top = -1, 0.0
+        for j in range(i):
+            score = float(units[j] @ units[i])
+            if score > top + 1e-6:
+                expected, top = j, score
+        assert best[i] == expected
+    assert best[25] == 3
+
+
+def test_cluster_rows_blocks_agree_with_dense(monkeypatch):
+    from backend.services import similarity
+
+    rng = np.random.default_rng(5)
+    centers = rng.normal(size=(5, 8))
+    units = centers[rng.integers(0, 5, size=60)] + rng.normal(scale=0.3, size=(60, 8))
+    units = (units / np.linalg.norm(units, axis=1, keepdims=True)).astype(np.float32)
+
+    monkeypatch.setattr(similarity, "BLOCK_ELEMENTS", 100)
+    pairs = {
+        (a, b)
+        for rows, cols in similarity.similar_pairs(units, 0.9)
+        for a, b in zip(rows.tolist(), cols.tolist())
+    }
+
+    dense = units @ units.T
+    assert pairs == {(a, b) for a in range(60) for b in range(a + 1, 60) if dense[a, b] >= 0.9}
+
+    roots = similarity.cluster_rows(units, 0.9)
+    for a, b in pairs:
+        assert roots[a] == roots[b]
+    assert all(roots[r] == r and r <= i for i, r in enumerate(roots))
+
+
+def test_dedupe_excel_semantic_merges_near_duplicates(monkeypatch):
+    from backend.services import excel_deduper
+
+    base = {"deep learning for crops": [1, 0, 0], "machine vision survey": [0, 1, 0]}
+
+    def _embed_many(texts, batch_size=None):
+        vectors = []
+        for t in texts:
+            if t == "deep learning for crop":
+                vectors.append([0.98, 0.2, 0])
+            else:
+                vectors.append(base.get(t, [0, 0, 1]))
+        return np.array(vectors, dtype=np.float32)
+
+    monkeypatch.setattr(excel_deduper, "get_embeddings", _embed_many)
+    df = pd.DataFrame({"title": [
+        "Deep learning for crops", "Machine vision survey",
+        "Deep Learning for Crop", "deep learning for crops!",
+    ]})
+
+    plain, _ = excel_deduper.dedupe_excel(df)
+    unique_df, clusters = excel_deduper.dedupe_excel(df, semantic=True)
+
+    assert len(plain) == 3
+    assert unique_df["title"].tolist() == ["Deep learning for crops", "Machine vision survey"]
+    assert clusters["deep learning for crops"] == [
+        "Deep learning for crops", "deep learning for crops!", "Deep Learning for Crop",
+    ]
+
+
+def test_process_bulk_titles_matches_sequential_loop(db_session, monkeypatch):
+    from backend.services import title_service
+
+    rng = np.random.default_rng(11)
+    centers = rng.normal(size=(6, 8)).astype(np.float32)
+    raw = [f"TEST_CASE_Seq {i}" for i in range(60)]
+    vectors = {
+        clean_text(t): centers[i % 6] + rng.normal(scale=0.35, size=8).astype(np.float32)
+        for i, t in enumerate(raw)
+    }
+
+    def _embed_many(texts, batch_size=None):
+        return np.array([vectors[t] for t in texts], dtype=np.float32)
+
+    monkeypatch.setattr(title_service, "get_embeddings", _embed_many)
+    monkeypatch.setattr(title_service, "EMBED_CHUNK_SIZE", 16)
+
+    # Reference: the original row-by-row loop over everything stored so far.
+    seen = [
+        (norm, np.frombuffer(blob, dtype=np.float32))
+        for norm, blob in db_session.query(Title.normalized_title, Title.embedding)
+        .order_by(Title.id)
+        if blob and len(blob) == 8 * 4
+    ]
+    expected = []
+    for t in raw:
+        vec = vectors[clean_text(t)]
+        best, top = None, 0.0
+        for norm, stored in seen:
+            score = float(stored @ vec / (np.linalg.norm(stored) * np.linalg.norm(vec)))
+            if score > top:
+                best, top = norm, score
+        norm = best if best is not None and top >= SIMILARITY_THRESHOLD else clean_text(t)
+        expected.append(norm)
+        seen.append((norm, vec))
+
+    process_bulk_titles(db_session, pd.DataFrame({"title": raw}))
+
+    stored = dict(
+        db_session.query(Title.title, Title.normalized_title)
+        .filter(Title.title.like("TEST_CASE_Seq %"))
+    )
+    assert [stored[t] for t in raw] == expected
+    assert len(set(expected)) < len(raw)
+
+
+def test_get_embeddings_batches_misses_only(monkeypatch, tmp_path):
+    from backend.services import embedding_service
+    from backend.services.embedding_cache import EmbeddingCache
+
+    calls = []
+
+    def fake_encode(texts, batch_size=None):
+        calls.append(list(texts))
+        return np.array([[len(t), 1.0] for t in texts], dtype=np.float32)
+
+    cache = EmbeddingCache(path=str(tmp_path / "cache.db"))
+    monkeypatch.setattr(embedding_service, "USE_OPENAI", False)
+    monkeypatch.setattr(embedding_service, "get_embedding_cache", lambda: cache)
+    monkeypatch.setattr(embedding_service, "get_minilm_embeddings", fake_encode)
+
+    first = embedding_service.get_embeddings(["a", "bb", "a"])
+    assert first.shape == (3, 2)
+    assert first[:, 0].tolist() == [1.0, 2.0, 1.0]
+    assert calls == [["a", "bb"]]
+
+    embedding_service.get_embeddings(["bb", "ccc"])
+    assert calls[-1] == ["ccc"]
+
+
+def test_embedding_cache_layers_and_eviction(tmp_path):
+    from backend.services.embedding_cache import EmbeddingCache
+
+    path = str(tmp_path / "cache.db")
+    cache = EmbeddingCache(max_items=2, path=path)
+    assert cache.get("m", "alpha") is None
+
+    cache.put("m", "alpha", [1.0, 2.0])
+    cache.put("m", "beta", [3.0, 4.0])
+    cache.put("m", "gamma", [5.0, 6.0])
+    assert np.allclose(cache.get("m", "gamma"), [5.0, 6.0])
+
+    # "alpha" fell out of the LRU but is still on disk.
+    assert np.allclose(cache.get("m", "alpha"), [1.0, 2.0])
+    assert cache.get("other-model", "alpha") is None
+
+    stats = cache.stats()
+    assert stats["memory_hits"] == 1
+    assert stats["disk_hits"] == 1
+    assert stats["misses"] == 2
+    assert stats["evictions"] >= 1
+
+    # A fresh process sees the persisted entries.
+    restarted = EmbeddingCache(max_items=2, path=path)
+    assert np.allclose(restarted.get("m", "beta"), [3.0, 4.0])
+    assert restarted.stats()["disk_hits"] == 1
+
+
+def test_embedding_batcher_coalesces_concurrent_calls():
+    from concurrent.futures import ThreadPoolExecutor
+    from backend.services.embedding_batcher import EmbeddingBatcher
+
+    batch_sizes = []
+
+    def fake_encode(texts):
+        batch_sizes.append(len(texts))
+        return np.array([[float(t)] for t in texts], dtype=np.float32)
+
+    batcher = EmbeddingBatcher(fake_encode, max_batch=16, max_wait_ms=50)
+    texts = [str(i % 20) for i in range(40)]
+
+    with ThreadPoolExecutor(max_workers=40) as pool:
+        results = list(pool.map(batcher.embed, texts))
+
+    assert [float(r[0]) for r in results] == [float(t) for t in texts]
+    assert batcher.requests == 40
+    assert len(batch_sizes) < 40
+
+
+def test_normalize_embeddings_keeps_cosine_scores(isolated_db):
+    from backend.manage import normalize_embeddings
+    from backend.services.vector_index import VectorIndex
+
+    rng = np.random.default_rng(2)
+    vectors = rng.random((5, 8), dtype=np.float32) * 3
+    rows = [
+        Title(title=f"TEST_CASE_Norm {i}", normalized_title=f"test_case_norm {i}",
+              embedding=vec.tobytes(), is_duplicate=0)
+        for i, vec in enumerate(vectors)
+    ]
+    isolated_db.add_all(rows)
+    isolated_db.commit()
+
+    probe = rng.random(8, dtype=np.float32)
+    before = VectorIndex()
+    before.load(isolated_db)
+
+    assert normalize_embeddings(isolated_db, batch_size=2) == 5
+
+    for row in rows:
+        isolated_db.refresh(row)
+        stored = np.frombuffer(row.embedding, dtype=np.float32)
+        assert np.isclose(np.linalg.norm(stored), 1.0, atol=1e-6)
+    assert normalize_embeddings(isolated_db) == 0
+
+    after = VectorIndex()
+    after.load(isolated_db)
+    assert after.best_match(probe)[0] == before.best_match(probe)[0]
+    assert np.isclose(after.best_match(probe)[1], before.best_match(probe)[1], atol=1e-6)
+
+
+@pytest.mark.parametrize("dtype", ["int8", "float16"])
+def test_quantized_index_rescoring_matches_float32(isolated_db, monkeypatch, dtype):
+    from backend.schemas.title_schema import TitleCreate
+    from backend.services import title_service
+    from backend.services.title_service import SIMILAR_THRESHOLD
+    from backend.services.vector_index import QuantizedVectorIndex, VectorIndex
+
+    rng = np.random.default_rng(9)
+    dim = 32
+
+    def unit(v):
+        return (v / np.linalg.norm(v)).astype(np.float32)
+
+    # Per query: stored rows just above and just below both thresholds,
+    # where quantization error could flip a decision or the order. The
+    # best match is clearly above, just above or just below the threshold.
+    near = [SIMILARITY_THRESHOLD + 0.003, SIMILARITY_THRESHOLD - 0.003,
+            SIMILAR_THRESHOLD + 0.002, SIMILAR_THRESHOLD - 0.002]
+    cosines = [[0.903] + near, near, near[1:]]
+
+    queries = {}
+    stored = []
+    for q in range(9):
+        query = unit(rng.normal(size=dim))
+        queries[clean_text(f"TEST_CASE_Query {chr(97 + q)}")] = query
+        for cos in cosines[q % 3]:
+            other = rng.normal(size=dim)
+            other = unit(other - (other @ query) * query)
+            # Stored at arbitrary length, as un-normalized embeddings are.
+            stored.append((cos * query + np.sqrt(1 - cos ** 2) * other) * rng.uniform(0.5, 3))
+    stored.extend(rng.normal(size=(200, dim)))
+    order = rng.permutation(len(stored))
+
+    isolated_db.add_all(
+        Title(title=f"TEST_CASE_Row {i}", normalized_title=f"test_case_row {i}",
+              embedding=np.asarray(stored[i], dtype=np.float32).tobytes(), is_duplicate=0)
+        for i in order
+    )
+    isolated_db.commit()
+
+    monkeypatch.setattr(title_service, "get_embedding", lambda text: queries[text])
+    monkeypatch.setattr(title_service, "get_embeddings", lambda texts, batch_size=None: np.array([queries[t] for t in texts]))
+    items = [TitleCreate(title=f"TEST_CASE_Query {chr(97 + q)}") for q in range(9)]
+
+    def run(index):
+        monkeypatch.setattr(title_service, "get_vector_index", lambda: index)
+        return (
+            [title_service.check_duplicate(isolated_db, item) for item in items],
+            title_service.check_duplicates_batch(isolated_db, items),
+            [title_service.find_similar_titles(isolated_db, item, k=None) for item in items],
+            [title_service.find_similar_titles(isolated_db, item, k=3) for item in items],
+        )
+
+    exact = run(VectorIndex())
+    quantized_index = QuantizedVectorIndex(dtype)
+    quantized = run(quantized_index)
+
+    assert quantized_index.needs_rescore
+    assert quantized == exact
+
+    singles, _, similar, _ = exact
+    expected = [[round(c, 3) for c in cos if c >= SIMILAR_THRESHOLD] for cos in cosines]
+    assert [(r["duplicate"], r["score"]) for r in singles] == [
+        (True, 0.903), (True, expected[1][0]), (False, expected[2][0]),
+    ] * 3
+    assert [[hit["score"] for hit in hits] for hits in similar] == expected * 3
+
+
+@pytest.mark.parametrize("ext", [".csv", ".xlsx"])
+def test_iter_title_chunks_streams_first_column(tmp_path, ext):
+    from backend.services.spreadsheet_reader import iter_title_chunks
+
+    df = pd.DataFrame({
+        "title": [f"Title {i}" for i in range(25)],
+        "other": list(range(25)),
+    })
+    path = tmp_path / f"upload{ext}"
+    if ext == ".csv":
+        df.to_csv(path, index=False)
+    else:
+        df.to_excel(path, index=False)
+
+    chunks = list(iter_title_chunks(str(path), chunk_size=10))
+    resumed = list(iter_title_chunks(str(path), chunk_size=10, skip_rows=13))
+
+    assert [len(c) for c in chunks] == [10, 10, 5]
+    assert all(list(c.columns) == ["title"] for c in chunks)
+    assert pd.concat(chunks)["title"].tolist() == df["title"].tolist()
+    assert pd.concat(resumed)["title"].tolist() == df["title"].tolist()[13:]
+
+
+class _LengthModel:
+    def encode(self, texts, batch_size=32, convert_to_numpy=True, show_progress_bar=False):
+        return np.array([[len(t), os.getpid()] for t in texts], dtype=np.float32)
+
+
+def _length_model_loader(model_name):
+    return _LengthModel()
+
+
+def test_embedding_pool_keeps_order_across_jobs():
+    from backend.services.embedding_pool import EmbeddingPool
+
+    pool = EmbeddingPool("fake", workers=2, threads=1, loader=_length_model_loader)
+    try:
+        for n in (7, 130):
+            texts = ["x" * (i % 17 + 1) for i in range(n)]
+            vectors = pool.encode(texts, batch_size=4)
+            assert vectors[:, 0].tolist() == [len(t) for t in texts]
+        assert os.getpid() not in set(vectors[:, 1].tolist())
+    finally:
+        pool.shutdown()
+
+
+def test_insert_titles_and_refresh_primaries(db_session):
+    from backend.services.title_writer import insert_titles, refresh_primaries
+
+    rows = [
+        {"title": f"TEST_CASE_Writer {i}", "normalized_title": "test_case_writer",
+         "embedding": np.zeros(4, dtype=np.float32).tobytes(), "is_duplicate": 0}
+        for i in range(5)
+    ]
+    ids = insert_titles(db_session, rows, batch_size=2)
+    refresh_primaries(db_session, ["test_case_writer"])
+    db_session.commit()
+
+    stored = (
+        db_session.query(Title.id, Title.title, Title.is_duplicate)
+        .filter(Title.id.in_(ids))
+        .order_by(Title.id)
+        .all()
+    )
+    assert [t for _, t, _ in stored] == [r["title"] for r in rows]
+    assert [i for i, _, _ in stored] == ids
+    assert [d for _, _, d in stored] == [0, 1, 1, 1, 1]
+
+
+def test_clean_series_matches_clean_text():
+    from backend.utils.text_cleaner import clean_series
+
+    samples = [
+        "", " ", "Deep Learning (2023): A Survey!", "  IoT-based\tSmart Grid  ",
+        "Résumé — naïve Bayes", "ΟΔΟΣ ΟΔΟΣ", "İstanbul 42nd", "v2.0 ’quoted’",
+        "emoji 😀 title", "\x1cgroup\x1dsep", "null\x00byte",
+    ]
+    series = pd.Series(samples * 3)
+
+    assert clean_series(series).tolist() == [clean_text(s) for s in samples * 3]
+    assert clean_series(series.iloc[:10]).tolist() == [clean_text(s) for s in samples[:10]]
+
+
+def test_job_queue_retries_then_fails(db_session, monkeypatch):
+    from backend.workers import queue, tasks
+    from backend.workers.worker import run_pending
+    from database.models import Job
+
+    calls = []
+
+    def flaky(payload, final_attempt, progress):
+        calls.append((payload["n"], final_attempt))
+        if payload["n"] == 0 and len(calls) == 1:
+            raise RuntimeError("transient")
+        if payload["n"] == 1:
+            raise RuntimeError("permanent")
+
+    monkeypatch.setitem(tasks.TASKS, "test_case_flaky", flaky)
+    monkeypatch.setattr(queue, "JOB_RETRY_DELAY", 0)
+
+    ok = queue.enqueue(db_session, "test_case_flaky", {"n": 0}, max_attempts=3)
+    bad = queue.enqueue(db_session, "test_case_flaky", {"n": 1}, max_attempts=2)
+    db_session.commit()
+
+    try:
+        run_pending()
+
+        db_session.refresh(ok)
+        db_session.refresh(bad)
+        assert (ok.status, ok.attempts) == ("completed", 2)
+        assert (bad.status, bad.attempts) == ("failed", 2)
+        assert "permanent" in bad.last_error
+        assert (1, True) in calls and (0, False) in calls
+    finally:
+        db_session.query(Job).filter(Job.kind == "test_case_flaky").delete()
+        db_session.commit()
+
+
+def test_clusters_track_primary_incrementally(isolated_db):
+    from datetime import datetime, timedelta
+    from backend.services import cluster_service
+
+    key = "test_case_cluster"
+    start = datetime(2020, 1, 1)
+
+    def add(name, minutes, normalized=key):
+        row = Title(
+            title=f"TEST_CASE_{name}",
+            normalized_title=normalized,
+            embedding=b"",
+            is_duplicate=0,
+            created_at=start + timedelta(minutes=minutes),
+        )
+        isolated_db.add(row)
+        isolated_db.flush()
+        cluster_service.add_member(isolated_db, row)
+        isolated_db.commit()
+        return row
+
+    def cluster(k=key):
+        return isolated_db.query(Cluster).filter(Cluster.canonical_key == k).one()
+
+    t1, t2, t3 = add("one", 10), add("two", 20), add("three", 30)
+    assert (cluster().primary_title_id, cluster().member_count) == (t1.id, 3)
+    assert [t.is_duplicate for t in (t1, t2, t3)] == [0, 1, 1]
+
+    # An older row takes over as primary.
+    t0 = add("zero", 0)
+    isolated_db.refresh(t1)
+    assert (cluster().primary_title_id, t0.is_duplicate, t1.is_duplicate) == (t0.id, 0, 1)
+
+    # Deleting the primary promotes the next-oldest member.
+    isolated_db.delete(t0)
+    isolated_db.flush()
+    cluster_service.remove_members(isolated_db, [(t0.id, key)])
+    isolated_db.commit()
+    isolated_db.refresh(t1)
+    assert (cluster().primary_title_id, cluster().member_count, t1.is_duplicate) == (t1.id, 3, 0)
+
+    # Moving a member updates both clusters.
+    t1.normalized_title = "test_case_other"
+    cluster_service.move_member(isolated_db, t1, key)
+    isolated_db.commit()
+    isolated_db.refresh(t2)
+    assert (cluster().primary_title_id, cluster().member_count, t2.is_duplicate) == (t2.id, 2, 0)
+    assert (cluster("test_case_other").primary_title_id, t1.is_duplicate) == (t1.id, 0)
+
+    # A primary deleted behind the table's back is healed on the next insert.
+    isolated_db.execute(delete(Title).where(Title.id == t2.id))
+    isolated_db.commit()
+    t4 = add("four", 40)
+    isolated_db.refresh(t3)
+    assert (cluster().primary_title_id, cluster().member_count) == (t3.id, 2)
+    assert (t3.is_duplicate, t4.is_duplicate) == (0, 1)
+
+    cluster_service.rebuild_clusters(isolated_db)
+    assert (cluster().primary_title_id, cluster().member_count) == (t3.id, 2)
+
+
+def test_recluster_titles_rebuilds_components(isolated_db, monkeypatch):
+    from datetime import datetime, timedelta
+    from backend.services import similarity
+    from backend.services.recluster_service import recluster_titles
+
+    monkeypatch.setattr(similarity, "BLOCK_ELEMENTS", 4)
+
+    rng = np.random.default_rng(3)
+    a, b, c = rng.normal(size=(3, 8)).astype(np.float32)
+    vectors = [a, b, a + 0.05, c, b + 0.05, a - 0.05]
+    names = ["Alpha one", "Beta one", "Alpha two", "Gamma", "Beta two", "Alpha three"]
+
+    start = datetime(2020, 1, 1)
+    rows = []
+    for i, (name, vec) in enumerate(zip(names, vectors)):
+        rows.append(Title(
+            title=f"TEST_CASE_{name}",
+            normalized_title=f"test_case_stale {i}",
+            embedding=vec.astype(np.float32).tobytes(),
+            is_duplicate=0,
+            created_at=start + timedelta(minutes=i),
+        ))
+    isolated_db.add_all(rows)
+    isolated_db.commit()
+
+    phases = []
+    summary = recluster_titles(isolated_db, 0.95, progress=lambda phase, done=None, total=None: phases.append(phase))
+
+    for row in rows:
+        isolated_db.refresh(row)
+    keys = [row.normalized_title for row in rows]
+    flags = [row.is_duplicate for row in rows]
+
+    assert keys == [
+        clean_text("TEST_CASE_Alpha one"), clean_text("TEST_CASE_Beta one"),
+        clean_text("TEST_CASE_Alpha one"), clean_text("TEST_CASE_Gamma"),
+        clean_text("TEST_CASE_Beta one"), clean_text("TEST_CASE_Alpha one"),
+    ]
+    assert flags == [0, 0, 1, 0, 1, 1]
+    assert (summary["titles"], summary["clusters"], summary["changed"]) == (6, 3, 6)
+
+    alpha = isolated_db.query(Cluster).filter(Cluster.canonical_key == keys[0]).one()
+    assert (alpha.primary_title_id, alpha.member_count) == (rows[0].id, 3)
+    assert {"loading", "scoring", "writing", "done"} <= set(phases)
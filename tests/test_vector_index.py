@@ -0,0 +1,179 @@
+import numpy as np
+import pytest
+from sklearn.metrics.pairwise import cosine_similarity
+
+from backend.services.vector_index import VectorIndex
+
+
+def _vectors(n, dim=8, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.random((n, dim), dtype=np.float32) - 0.5
+
+
+def test_best_match_matches_cosine_similarity():
+    vectors = _vectors(50)
+    index = VectorIndex()
+    index.add_many((i + 1, v) for i, v in enumerate(vectors))
+
+    query = _vectors(1, seed=1)[0]
+    expected = cosine_similarity([query], vectors)[0]
+
+    best_id, best_score = index.best_match(query)
+    assert best_id == int(np.argmax(expected)) + 1
+    assert np.isclose(best_score, expected.max(), atol=1e-6)
+
+
+def test_remove_and_exclude_keep_index_consistent():
+    vectors = _vectors(10)
+    index = VectorIndex()
+    index.add_many((i + 1, v) for i, v in enumerate(vectors))
+
+    index.remove(3)
+    index.remove_many([1, 10])
+    assert len(index) == 7
+
+    best_id, _ = index.best_match(vectors[4])
+    assert best_id == 5
+
+    other_id, _ = index.best_match(vectors[4], exclude_id=5)
+    assert other_id not in (1, 3, 5, 10)
+
+    # Re-adding an id replaces its vector instead of duplicating it.
+    index.add(5, vectors[0])
+    assert len(index) == 7
+    assert index.best_match(vectors[0])[0] == 5
+
+
+def test_sync_skips_rows_added_in_process(monkeypatch):
+    from backend.services import vector_index
+
+    seen = []
+
+    def rows_after(db, after_id):
+        seen.append(after_id)
+        return []
+
+    monkeypatch.setattr(vector_index, "rows_after", rows_after)
+
+    index = VectorIndex()
+    index.loaded = True
+    index.add_many((i + 1, v) for i, v in enumerate(_vectors(5)))
+    index.add(9, _vectors(1)[0])
+    index.ensure_loaded(db=None)
+
+    assert seen == [9]
+
+
+def test_ivf_index_round_trips_through_disk(tmp_path, monkeypatch):
+    from backend.services import ann_index
+
+    monkeypatch.setattr(ann_index, "IVF_MIN_TRAIN_SIZE", 200)
+    vectors = _vectors(500, dim=16)
+
+    index = ann_index.IVFIndex(path=tmp_path / "titles.ivf.idx", nprobe=4)
+    index._build((i + 1, v) for i, v in enumerate(vectors))
+    index._fingerprint = (500, 500)
+    index.loaded = True
+    index.remove(7)
+    index.save()
+
+    restored = ann_index.IVFIndex(path=tmp_path / "titles.ivf.idx", nprobe=4)
+    assert restored._restore((499, 500))
+    assert len(restored) == 499
+    assert 7 not in restored
+
+    ids, scores = restored.search(vectors[41], k=3)
+    assert ids[0] == 42
+    assert np.isclose(scores[0], 1.0, atol=1e-5)
+
+
+def test_ann_sync_skips_rows_added_in_process(tmp_path, monkeypatch):
+    from backend.services import ann_index
+
+    seen = []
+    monkeypatch.setattr(ann_index, "rows_after", lambda db, after_id: seen.append(after_id) or [])
+
+    index = ann_index.IVFIndex(path=tmp_path / "titles.ivf.idx")
+    index._build([])
+    index.loaded = True
+    index.add_many((i + 1, v) for i, v in enumerate(_vectors(5)))
+    index.ensure_loaded(db=None)
+
+    assert seen == [5]
+
+
+def test_ivf_retrains_in_background(tmp_path, monkeypatch):
+    from backend.services import ann_index
+
+    monkeypatch.setattr(ann_index, "IVF_MIN_TRAIN_SIZE", 200)
+    vectors = _vectors(400, dim=16)
+
+    index = ann_index.IVFIndex(path=tmp_path / "titles.ivf.idx", nprobe=4)
+    index._build([])
+    index.loaded = True
+    index.add_many((i + 1, v) for i, v in enumerate(vectors[:250]))
+    index.add_many((i + 251, v) for i, v in enumerate(vectors[250:]))
+    index.wait_for_training()
+
+    assert index._centroids is not None
+    assert len(index) == 400
+    assert sorted(index._assignments) == list(range(1, 401))
+    ids, scores = index.search(vectors[300], k=1)
+    assert ids[0] == 301 and np.isclose(scores[0], 1.0, atol=1e-5)
+
+
+def test_hnsw_threshold_search_is_not_capped_at_ef(tmp_path):
+    pytest.importorskip("hnswlib")
+    from backend.services import ann_index
+
+    base = _vectors(1, dim=16)[0]
+    vectors = base + _vectors(200, dim=16, seed=2) * 0.05
+
+    index = ann_index.HNSWIndex(path=tmp_path / "titles.hnsw.idx", ef=10)
+    index._build((i + 1, v) for i, v in enumerate(vectors))
+
+    expected = cosine_similarity([base], vectors)[0]
+    ids, scores = index.search(base, threshold=0.9)
+    assert len(ids) == int((expected >= 0.9).sum()) > 10
+    assert np.all(np.diff(scores) <= 0)
+
+
+def test_memmap_store_is_shared_between_instances(tmp_path):
+    from backend.services.vector_store import MemmapVectorStore
+
+    vectors = _vectors(100, dim=16)
+    writer = MemmapVectorStore(tmp_path / "titles.vectors")
+    reader = MemmapVectorStore(tmp_path / "titles.vectors")
+
+    writer.add_many((i + 1, v) for i, v in enumerate(vectors))
+    assert reader.best_match(vectors[9])[0] == 10
+
+    # Deletes are tombstones visible to the other mapping.
+    writer.remove(10)
+    assert reader.best_match(vectors[9])[0] != 10
+
+    # Updates append a new slot and retire the old one.
+    reader.add(20, vectors[9])
+    assert writer.best_match(vectors[9])[0] == 20
+    assert writer.best_match(vectors[19])[0] != 20
+
+
+@pytest.mark.parametrize("dtype", ["float16", "int8"])
+def test_quantized_index_keeps_true_best_in_candidates(dtype):
+    from backend.services.vector_index import QuantizedVectorIndex
+
+    vectors = _vectors(300, dim=32)
+    exact = VectorIndex()
+    quantized = QuantizedVectorIndex(dtype)
+    exact.add_many((i + 1, v) for i, v in enumerate(vectors))
+    quantized.add_many((i + 1, v) for i, v in enumerate(vectors))
+    quantized.remove(5)
+    exact.remove(5)
+
+    for query in _vectors(20, dim=32, seed=3):
+        exact_ids, exact_scores = exact.search(query, k=1)
+        approx_ids, approx_scores = quantized.search(query, k=8)
+        assert exact_ids[0] in approx_ids
+        assert np.isclose(approx_scores[0], exact_scores[0], atol=0.02)
+
+    assert quantized.snapshot()[1].dtype == np.float32